@@ -0,0 +1,80 @@
+"""Cold versus warm Streamlit rerun times with the shared resource cache.
+
+Builds a synthetic rental dataset and a small model in a temporary directory,
+then runs the app script headlessly with Streamlit's AppTest: the first run
+of the process loads everything, later reruns and new sessions reuse it.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_app_reruns [n_rental_rows] [n_reruns]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_PATH = os.path.join(ROOT_DIR, "streamlit.py")
+
+
+def import_app_test():
+    """Imports AppTest from the streamlit package rather than the repo's streamlit.py."""
+    saved_path = sys.path[:]
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != ROOT_DIR]
+    try:
+        from streamlit.testing.v1 import AppTest
+    finally:
+        sys.path[:] = saved_path
+    return AppTest
+
+
+def write_fixtures(rental_path: str, model_path: str, n_rows: int) -> None:
+    """Writes a synthetic rental CSV and a model fitted on it."""
+    from benchmarks.synthetic import rental_frame, write_model
+
+    rental = rental_frame(n_rows)
+    write_model(model_path, rental)
+    rental.to_csv(rental_path, index=False)
+
+
+def main(n_rows=200_000, n_reruns=5):
+    AppTest = import_app_test()
+    with tempfile.TemporaryDirectory() as tmp:
+        # the resource paths are read when utils is first imported
+        rental_path = os.environ["HDB_RENTAL_PATH"] = os.path.join(tmp, "rental.csv")
+        model_path = os.environ["HDB_MODEL_PATH"] = os.path.join(tmp, "model.pkl")
+        write_fixtures(rental_path, model_path, n_rows)
+
+        # what every rerun paid when the script loaded these at module level
+        start = time.perf_counter()
+        pd.read_csv(rental_path)
+        joblib.load(model_path)
+        per_rerun_load = time.perf_counter() - start
+
+        def run(app):
+            start = time.perf_counter()
+            app.run()
+            assert not app.exception, app.exception
+            return time.perf_counter() - start
+
+        app = AppTest.from_file(APP_PATH, default_timeout=120)
+        app.secrets["token"] = "benchmark"
+        cold = run(app)
+        warm = [run(app) for _ in range(n_reruns)]
+
+        new_session = AppTest.from_file(APP_PATH, default_timeout=120)
+        new_session.secrets["token"] = "benchmark"
+        other_session = run(new_session)
+
+    print(f"{n_rows} rental rows")
+    print(f"dataset + model load (paid per rerun before) {per_rerun_load * 1e3:8.1f} ms")
+    print(f"cold run (first in process)                  {cold * 1e3:8.1f} ms")
+    print(f"warm rerun (median)                          {sorted(warm)[len(warm) // 2] * 1e3:8.1f} ms")
+    print(f"new session, warm process                    {other_session * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,57 @@
+"""Throughput of the bulk scoring pipeline against the worker count.
+
+Scores a synthetic listings file of postal codes with OneMap replaced by
+the local stub, whose ``delay`` stands in for the network round trip.
+Every run uses postal codes not seen before, so each is geocoded. Also
+reports the parent process's peak memory, which should not depend on the
+input size.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bulk_score [n_listings] [worker counts ...]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def main(n_listings=20_000, worker_counts=(1, 2, 4)):
+    with tempfile.TemporaryDirectory() as tmp:
+        # the resource paths are read when utils is first imported
+        os.environ["HDB_MODEL_PATH"] = os.path.join(tmp, "model.pkl")
+        from benchmarks.stub_onemap import StubOneMap
+        from benchmarks.synthetic import rental_frame, write_model
+        from utils.bulk_score import bulk_score
+
+        write_model(os.environ["HDB_MODEL_PATH"], rental_frame(20_000))
+        os.environ["GEOCODE_CACHE_PATH"] = os.path.join(tmp, "geocode.sqlite3")
+
+        print(f"{n_listings} listings")
+        with StubOneMap(delay=0.002):
+            for run, workers in enumerate(worker_counts):
+                # postal codes no earlier run has put in the geocoding cache
+                codes = np.arange(n_listings) * len(worker_counts) + run + 10000
+                input_path = os.path.join(tmp, f"listings_{workers}.csv")
+                pd.DataFrame(
+                    {
+                        "address": [f"{code:06d}" for code in codes],
+                        "flat_type": np.resize(["3-ROOM", "4-ROOM", "5-ROOM"], n_listings),
+                    }
+                ).to_csv(input_path, index=False)
+
+                start = time.perf_counter()
+                bulk_score(input_path, os.path.join(tmp, f"scored_{workers}.csv"), workers, 500)
+                elapsed = time.perf_counter() - start
+                print(f"{workers} workers {n_listings / elapsed:10.0f} listings/s")
+        peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"parent peak RSS {peak_mib:.0f} MiB")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args[:1], *([args[1:]] if len(args) > 1 else []))
@@ -0,0 +1,98 @@
+"""Speed and accuracy of each distance backend against the exact geodesic.
+
+Times the map_utils distance functions over the real facility tables in
+``data/`` with every backend in utils.distance, and reports the largest
+difference from the geodesic backend: in meters for distances, and as the
+number of locations whose nearest facility, facility counts or neighbour
+set came out different.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_distance_backends [n_locations]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import random_locations, rental_frame
+from utils import features, map_utils
+from utils.distance import BACKENDS, set_default_backend
+from utils.facilities import FACILITY_FILES, get_facility_index
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run(backend, lats, lons, rental):
+    index = get_facility_index()
+    results = {}
+    for facilities in FACILITY_FILES:
+        results[f"nearest {facilities}"] = timed(
+            lambda: index.table(facilities).nearest_many(lats, lons, backend=backend)
+        )
+    results["counts within 1, 2 km"] = timed(
+        lambda: map_utils.count_facilities_within_distances(lats, lons, [1, 2], backend=backend)
+        .to_numpy()
+    )
+    results["distance to CBD"] = timed(lambda: map_utils.distances_to_cbd(lats, lons, backend))
+    results["neighbours within 1 km"] = timed(
+        lambda: [
+            set(map_utils.find_neighbours((lat, lon), "4-ROOM", 1000, rental, backend).index)
+            for lat, lon in zip(lats[:200], lons[:200])
+        ]
+    )
+    return results
+
+
+def error(reference, result):
+    """Largest distance difference in meters, and the number of differing locations."""
+    if isinstance(reference, tuple):
+        (distances, nearest), (other_distances, other_nearest) = reference, result
+        differing = np.count_nonzero(nearest != other_nearest)
+        return np.max(np.abs(distances - other_distances)), differing
+    if isinstance(reference, list):
+        return None, sum(a != b for a, b in zip(reference, result))
+    if reference.dtype.kind == "f":
+        return np.max(np.abs(reference - result)), None
+    return None, np.count_nonzero((reference != result).any(axis=1))
+
+
+def main(n_locations=2000):
+    lats, lons = random_locations(n_locations)
+    rental = rental_frame(100_000)
+    # load the facility tables and build the neighbour index outside the timings
+    map_utils.find_neighbours((lats[0], lons[0]), "4-ROOM", 1000, rental)
+    for backend in BACKENDS:
+        get_facility_index().nearest_distances(lats[:1], lons[:1], "stations", backend=backend)
+
+    reference = run("geodesic", lats, lons, rental)
+    print(f"{n_locations} locations")
+    print(
+        f"{'':32}{'backend':>10}{'time (ms)':>11}{'speedup':>9}"
+        f"{'max error (m)':>15}{'differ':>8}"
+    )
+    for backend in BACKENDS:
+        results = reference if backend == "geodesic" else run(backend, lats, lons, rental)
+        for name, (elapsed, result) in results.items():
+            max_error, differing = error(reference[name][1], result)
+            print(
+                f"{name:32}{backend:>10}{elapsed * 1e3:11.1f}"
+                f"{reference[name][0] / elapsed:8.0f}x"
+                f"{'' if max_error is None else f'{max_error:.3g}':>15}"
+                f"{'' if differing is None else differing:>8}"
+            )
+
+    # the feature pipeline uses the process default, as set by HDB_DISTANCE_BACKEND
+    for backend in BACKENDS:
+        set_default_backend(backend)
+        elapsed, _ = timed(lambda: features.compute_location_features(lats, lons))
+        print(f"location features, {backend:>9}: {elapsed / n_locations * 1e6:8.1f} us/location")
+    set_default_backend("geodesic")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""Latency of find_neighbours radius queries as the rental history grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_find_neighbours [n_queries]
+
+The original iterrows implementation is only timed on the smallest frame,
+where its results are also checked against the indexed version.
+"""
+import sys
+import time
+
+import pandas as pd
+from geopy.distance import geodesic
+
+from benchmarks.synthetic import random_locations, rental_frame
+from utils.neighbours import NeighbourIndex
+
+SIZES = [10_000, 100_000, 1_000_000]
+RADIUS = 1000
+
+
+def legacy_find_neighbours(lat_lon, flat_type, radius, df):
+    """The original implementation: reverse iterrows with a list of seen addresses."""
+    df = df.copy()
+    indices = []
+    buildings = []
+    dfslice = df[df["flat_type"] == flat_type].reset_index(drop=True)
+    for index, row in dfslice[::-1].iterrows():
+        if row["address"] not in buildings:
+            distance = geodesic(lat_lon, (row["lat"], row["lon"])).meters
+            if distance <= radius:
+                indices.append(index)
+                buildings.append(row["address"])
+    return dfslice.loc[indices]
+
+
+def main(n_queries=20):
+    lats, lons = random_locations(n_queries, seed=1)
+    queries = list(zip(lats, lons))
+    print(f"{'rows':>10}{'build (s)':>12}{'query (ms)':>12}{'legacy (ms)':>13}")
+    for n_rows in SIZES:
+        df = rental_frame(n_rows)
+
+        start = time.perf_counter()
+        index = NeighbourIndex(df)
+        index.query(queries[0], "4-ROOM", RADIUS)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [index.query(lat_lon, "4-ROOM", RADIUS) for lat_lon in queries]
+        query = (time.perf_counter() - start) / n_queries
+
+        legacy = float("nan")
+        if n_rows == SIZES[0]:
+            start = time.perf_counter()
+            expected = [
+                legacy_find_neighbours(lat_lon, "4-ROOM", RADIUS, df) for lat_lon in queries
+            ]
+            legacy = (time.perf_counter() - start) / n_queries
+            for old, new in zip(expected, results):
+                pd.testing.assert_frame_equal(old, new, check_index_type=False)
+
+        print(f"{n_rows:>10}{build:>12.2f}{query * 1e3:>12.3f}{legacy * 1e3:>13.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,50 @@
+"""Cold versus cached geocoding latency against the local OneMap stub.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_geocode_cache [n_postal_codes] [delay_seconds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_onemap import StubOneMap
+from utils import map_utils
+from utils.geocode_cache import GeocodeCache
+
+
+def time_lookups(queries, cache):
+    start = time.perf_counter()
+    # local=False so blocks in a local rental dataset do not skip the cache
+    results = [map_utils.lookup_address(query, cache=cache, local=False)[0] for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main(n_postal_codes=50, delay=0.05):
+    queries = [f"{560000 + i:06d}" for i in range(n_postal_codes)] + ["NO SUCH PLACE"]
+    with tempfile.TemporaryDirectory() as tmp, StubOneMap(delay=delay) as stub:
+        path = os.path.join(tmp, "geocode.sqlite3")
+        cache = GeocodeCache(path=path)
+
+        cold, expected = time_lookups(queries, cache)
+        network_calls = stub.request_count
+        warm, memory_results = time_lookups([f"  {q.lower()} " for q in queries], cache)
+
+        # a fresh process only has the SQLite tier to go on
+        reopened = GeocodeCache(path=path)
+        disk, disk_results = time_lookups(queries, reopened)
+
+        assert expected == memory_results == disk_results
+        assert stub.request_count == network_calls == len(queries)
+        assert expected[-1] == ("", "", "", "", "")
+
+    print(f"cold (network)   {cold * 1e3:9.3f} ms/query")
+    print(f"memory tier      {warm * 1e3:9.3f} ms/query")
+    print(f"sqlite tier      {disk * 1e3:9.3f} ms/query")
+    print(f"counters         {cache.stats()}")
+    print(f"after reopen     {reopened.stats()}")
+
+
+if __name__ == "__main__":
+    main(*(type_(arg) for type_, arg in zip((int, float), sys.argv[1:])))
@@ -0,0 +1,70 @@
+"""Cold import cost of the app's modules, measured with ``python -X importtime``.
+
+Each module is imported in a fresh interpreter a few times and the fastest
+cumulative time is kept. With --budget-ms the script exits non-zero when a
+module exceeds its budget, so CI can track cold-start regressions; --json
+writes the results for comparison between commits.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import_time [--budget-ms 1000] [--json import_times.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+MODULES = [
+    "utils.facilities",
+    "utils.map_utils",
+    "utils.features",
+    "utils.prediction_service",
+]
+
+
+def import_time_us(module: str) -> int:
+    """Cumulative import time of ``module`` in microseconds, in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module and fields[2].startswith(" " + module):
+            return int(fields[1])
+    raise RuntimeError(f"No importtime entry for {module}:\n{result.stderr[-2000:]}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, help="fail if any module takes longer")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        module: min(import_time_us(module) for _ in range(args.repeat)) / 1000
+        for module in MODULES
+    }
+    for module, ms in results.items():
+        print(f"{module:<28}{ms:>9.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"import_time_ms": results}, f, indent=2)
+
+    over = {m: ms for m, ms in results.items() if args.budget_ms and ms > args.budget_ms}
+    if over:
+        print(f"Over the {args.budget_ms:g} ms budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
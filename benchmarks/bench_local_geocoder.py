@@ -0,0 +1,73 @@
+"""Local geocoder latency and hit rate against OneMap through the stub.
+
+Searches every block of a synthetic rental dataset by address, by postal
+code, with street words spelt out and by a partial address, then a set of
+postal codes outside the dataset that fall through to the stub, whose
+``delay`` stands in for the network round trip.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_local_geocoder [n_rows] [delay_seconds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+
+def time_lookups(lookup_address, queries, cache):
+    start = time.perf_counter()
+    results = [lookup_address(query, cache=cache) for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main(n_rows=200_000, delay=0.05):
+    with tempfile.TemporaryDirectory() as tmp:
+        # the resource paths are read when utils is first imported
+        os.environ["HDB_RENTAL_PATH"] = os.path.join(tmp, "rental.csv")
+        os.environ["HDB_RENTAL_STORE"] = os.path.join(tmp, "store")
+        from benchmarks.stub_onemap import StubOneMap
+        from benchmarks.synthetic import rental_frame
+        from utils import map_utils, resources
+        from utils.geocode_cache import GeocodeCache
+        from utils.local_geocoder import get_local_geocoder
+
+        df = rental_frame(n_rows)
+        df.to_csv(os.environ["HDB_RENTAL_PATH"], index=False)
+        start = time.perf_counter()
+        geocoder = get_local_geocoder(resources.get_rental_frame())
+        print(f"{len(geocoder)} blocks indexed in {time.perf_counter() - start:.3f} s")
+
+        blocks = df.drop_duplicates("address")
+        searches = {
+            "address": blocks["address"].tolist(),
+            "postal code": [f"{postal:06d}" for postal in blocks["postal"]],
+            "spelt out": [
+                "BLK " + address.replace(" AVE ", " AVENUE ").replace(" ST ", " STREET ").lower()
+                for address in blocks["address"]
+            ],
+            # block and the first word of the street, usually enough
+            "partial": [" ".join(address.split()[:2]) for address in blocks["address"]],
+        }
+        known = {f"{postal:06d}" for postal in blocks["postal"]}
+        unknown = [code for code in (f"{560000 + i:06d}" for i in range(200)) if code not in known]
+
+        cache = GeocodeCache(path=os.path.join(tmp, "geocode.sqlite3"))
+        with StubOneMap(delay=delay) as stub:
+            misses = 0
+            for name, queries in searches.items():
+                per_query, results = time_lookups(map_utils.lookup_address, queries, cache)
+                hits = sum(source == map_utils.SOURCE_LOCAL for _, source in results)
+                misses += len(queries) - hits
+                print(f"{name:12s} {per_query * 1e6:9.1f} us/query  {hits / len(queries):6.1%} local")
+            assert stub.request_count <= misses
+
+            requests_before = stub.request_count
+            per_query, results = time_lookups(map_utils.lookup_address, unknown, cache)
+            assert all(source == map_utils.SOURCE_ONEMAP for _, source in results)
+            assert stub.request_count - requests_before == len(unknown)
+            print(f"{'onemap':12s} {per_query * 1e6:9.1f} us/query")
+
+
+if __name__ == "__main__":
+    main(*(type_(arg) for type_, arg in zip((int, float), sys.argv[1:])))
@@ -0,0 +1,61 @@
+"""Per-query latency of get_nearest_facility before and after the preloaded index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_nearest_facility [n_queries]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+from geopy.distance import geodesic
+
+from benchmarks.synthetic import random_locations
+from utils import map_utils
+from utils.facilities import DATA_DIR, FACILITY_FILES
+
+
+def legacy_nearest_facility(location_latitude, location_longitude, facilities):
+    """The original implementation: re-read the CSV and loop with geodesic."""
+    file_name, reference_column = FACILITY_FILES[facilities]
+    df = pd.read_csv(os.path.join(DATA_DIR, file_name))
+    location_coords = (location_latitude, location_longitude)
+    min_distance, nearest_facility = float("inf"), None
+    nearest_facility_lat, nearest_facility_long = "", ""
+    for _, facility in df.iterrows():
+        facility_coords = (facility["Latitude"], facility["Longitude"])
+        distance = geodesic(location_coords, facility_coords).meters
+        if distance < min_distance:
+            min_distance = distance
+            nearest_facility = facility[reference_column]
+            nearest_facility_lat = facility["Latitude"]
+            nearest_facility_long = facility["Longitude"]
+    return min_distance, nearest_facility, nearest_facility_lat, nearest_facility_long
+
+
+def time_per_query(func, lats, lons, facilities):
+    start = time.perf_counter()
+    results = [func(lat, lon, facilities) for lat, lon in zip(lats, lons)]
+    return (time.perf_counter() - start) / len(lats), results
+
+
+def main(n_queries=50):
+    lats, lons = random_locations(n_queries)
+    print(f"{'facilities':<24}{'before (ms)':>12}{'after (ms)':>12}{'speedup':>10}")
+    for facilities in FACILITY_FILES:
+        map_utils.get_nearest_facility(lats[0], lons[0], facilities)  # warm the index
+        before, expected = time_per_query(legacy_nearest_facility, lats, lons, facilities)
+        after, actual = time_per_query(
+            map_utils.get_nearest_facility, lats, lons, facilities
+        )
+        for old, new in zip(expected, actual):
+            assert old[1] == new[1] and abs(old[0] - new[0]) < 1e-6, (old, new)
+        print(
+            f"{facilities:<24}{before * 1e3:>12.3f}{after * 1e3:>12.3f}"
+            f"{before / after:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
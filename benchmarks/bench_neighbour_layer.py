@@ -0,0 +1,83 @@
+"""Map HTML size and render time for neighbour markers versus one GeoJSON layer.
+
+Draws n synthetic neighbours around a location the way the "Get advice"
+handler used to (a folium Marker, Icon and Popup per record, each inserted
+at the front of the marker list) and with map_layers.neighbour_layer, then
+renders the map to HTML as every Streamlit rerun does.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_neighbour_layer [n ...]
+"""
+import sys
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import rental_frame
+from utils.map_layers import neighbour_layer
+
+CENTER = (1.35, 103.82)
+PREDICTED_RENT = 3000
+
+
+def neighbours_frame(n: int) -> pd.DataFrame:
+    """n rental records scattered within ~1 km of CENTER."""
+    rng = np.random.default_rng(0)
+    neighbours = rental_frame(n, n_blocks=max(n, 1)).copy()
+    neighbours["lat"] = CENTER[0] + rng.uniform(-0.009, 0.009, n)
+    neighbours["lon"] = CENTER[1] + rng.uniform(-0.009, 0.009, n)
+    return neighbours
+
+
+def marker_list(neighbours: pd.DataFrame) -> list:
+    markers = []
+    for nblat, nblong, nbrental, nbloc, nbflat, nbdate in neighbours[
+        ["lat", "lon", "monthly_rent", "address", "flat_type", "rent_approval_date"]
+    ].values:
+        nbpopup = folium.Popup(
+            f"{nbloc}<br>"
+            f"Type: {nbflat}<br>"
+            f"Lease Start: {nbdate}<br>"
+            f"Monthly Rental: <b>{nbrental}</b>",
+            max_width=len(nbloc) * 10,
+        )
+        color = "red" if nbrental > PREDICTED_RENT else "green"
+        nbicon = folium.Icon(icon="user", prefix="fa", color=color)
+        markers.insert(0, folium.Marker(location=(nblat, nblong), popup=nbpopup, icon=nbicon))
+    return markers
+
+
+def render(children: list) -> int:
+    """Renders a map holding ``children`` and returns the HTML size in bytes."""
+    sg_map = folium.Map(location=CENTER, zoom_start=15)
+    group = folium.FeatureGroup(name="Markers")
+    for child in children:
+        group.add_child(child)
+    group.add_to(sg_map)
+    return len(sg_map.get_root().render().encode())
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def main(sizes=(100, 1000, 5000, 20000)):
+    print(f"{'neighbours':>10}{'':>3}{'build ms':>10}{'render ms':>11}{'HTML KiB':>10}")
+    for n in sizes:
+        neighbours = neighbours_frame(n)
+        for label, build in (
+            ("markers", lambda: marker_list(neighbours)),
+            ("layer", lambda: [neighbour_layer(neighbours, CENTER, PREDICTED_RENT)]),
+        ):
+            children, build_ms = timed(build)
+            size, render_ms = timed(lambda: render(children))
+            print(f"{n:>10} {label:<8}{build_ms:>8.1f}{render_ms:>11.1f}{size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or (100, 1000, 5000, 20000))
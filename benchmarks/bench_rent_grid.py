@@ -0,0 +1,85 @@
+"""Rent grid build cost, and interpolated against exact predictions.
+
+Builds a grid over the real facility data with a model fitted on a
+synthetic rental dataset, then compares interpolating the grid with
+computing the features and calling model.predict, in latency and in rent,
+at random blocks. Also times drawing the heatmap layer.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rent_grid [cell_size_m] [n_queries]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def main(cell_size=200.0, n_queries=500):
+    with tempfile.TemporaryDirectory() as tmp:
+        # the resource paths are read when utils is first imported
+        os.environ["HDB_MODEL_PATH"] = os.path.join(tmp, "model.pkl")
+        from benchmarks.synthetic import rental_frame, write_model
+        from utils import features, map_layers
+        from utils.rent_grid import RentGrid
+
+        rental = rental_frame(50_000)
+        model = write_model(os.environ["HDB_MODEL_PATH"], rental)
+        months = [features.months_since_data_start(0)]
+
+        start = time.perf_counter()
+        grid = RentGrid.build(
+            model, rental["lat"], rental["lon"], months, cell_size_m=cell_size
+        )
+        build = time.perf_counter() - start
+        grid.save(os.path.join(tmp, "grid"))
+        grid = RentGrid.load(os.path.join(tmp, "grid"))
+        size = os.path.getsize(os.path.join(tmp, "grid", "rents.npy"))
+        n_rows, n_cols = grid.shape
+        filled = np.count_nonzero(~np.isnan(grid.rents[0, 0]))
+        print(f"{n_rows} x {n_cols} cells of {cell_size:.0f} m, {filled} filled")
+        print(f"built in {build:.1f} s, {size / 2**20:.1f} MiB on disk")
+
+        blocks = rental.sample(n_queries, random_state=1)
+        lats = blocks["lat"].to_numpy()
+        lons = blocks["lon"].to_numpy()
+        flat_types = blocks["flat_type"].to_numpy()
+
+        start = time.perf_counter()
+        approx = np.array(
+            [grid.approximate(lat, lon, ft, 0) for lat, lon, ft in zip(lats, lons, flat_types)]
+        )
+        interpolated = (time.perf_counter() - start) / n_queries
+
+        start = time.perf_counter()
+        exact = np.array(
+            [
+                model.predict(features.build_prediction_input(lat, lon, ft, 0))[0]
+                for lat, lon, ft in zip(lats, lons, flat_types)
+            ]
+        )
+        predicted = (time.perf_counter() - start) / n_queries
+
+        error = np.abs(approx - exact)
+        print(f"interpolated {interpolated * 1e6:10.1f} us/query")
+        print(f"predicted    {predicted * 1e6:10.1f} us/query")
+        print(
+            f"abs error    mean ${np.mean(error):.0f}  p95 ${np.percentile(error, 95):.0f}"
+            f"  max ${np.max(error):.0f}  (mean rent ${np.mean(exact):.0f})"
+        )
+
+        # importing folium is not part of drawing a layer
+        import folium  # noqa: F401
+
+        start = time.perf_counter()
+        layer = map_layers.rent_heatmap_layer(grid.raster("4-ROOM", 0), grid.bounds)
+        print(
+            f"heatmap layer {(time.perf_counter() - start) * 1e3:.0f} ms, "
+            f"{len(layer.url) / 1024:.0f} KiB image"
+        )
+
+
+if __name__ == "__main__":
+    main(*(type_(arg) for type_, arg in zip((float, int), sys.argv[1:])))
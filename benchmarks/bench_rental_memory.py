@@ -0,0 +1,105 @@
+"""Resident memory per worker process with the rental CSV versus the memory-mapped store.
+
+Starts several worker processes at once, as a multi-worker Streamlit or
+prediction service deployment would, and has each load the synthetic rental
+dataset, run a neighbour query and a rent summary, then report its memory
+while the others are still alive. RSS counts every page a process touches;
+PSS splits shared pages between the processes mapping them, so it shows what
+each worker really adds. Linux only, as it reads /proc/self/smaps_rollup.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rental_memory [n_rental_rows] [n_workers]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+def memory_mib() -> dict:
+    """Resident and proportional set size of this process in MiB."""
+    sizes = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            fields = line.split()
+            if fields[0] in ("Rss:", "Pss:"):
+                sizes[fields[0][:-1].lower()] = int(fields[1]) / 1024
+    return sizes
+
+
+def worker(csv_path, store_dir, use_store, barrier, results):
+    import pandas as pd
+
+    from utils.neighbours import NeighbourIndex
+    from utils.rental_store import read_store
+    from utils.rent_stats import get_rent_statistics
+
+    # imported up front so only the data shows up in the difference
+    import sklearn.neighbors  # noqa: F401
+    import utils.map_utils  # noqa: F401
+
+    before = memory_mib()
+    start = time.perf_counter()
+    hdb = read_store(store_dir) if use_store else pd.read_csv(csv_path)
+    load_ms = (time.perf_counter() - start) * 1e3
+    # the work the app does on the frame for one "Get advice"
+    NeighbourIndex(hdb).query((1.35, 103.82), "4-ROOM", 1000)
+    get_rent_statistics(hdb).lookup("4-ROOM")
+    # every worker holds its frame while the others are measured
+    barrier.wait()
+    after = memory_mib()
+    results.put(
+        {
+            "load_ms": load_ms,
+            "rss": after["rss"] - before["rss"],
+            "pss": after["pss"] - before["pss"],
+            "frame": hdb.memory_usage(deep=True).sum() / 2**20,
+        }
+    )
+    barrier.wait()
+
+
+def run_workers(csv_path, store_dir, use_store, n_workers) -> list:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(n_workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(csv_path, store_dir, use_store, barrier, results))
+        for _ in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+
+def main(n_rows=1_000_000, n_workers=4):
+    from benchmarks.synthetic import rental_frame
+    from utils.rental_store import source_version, write_store
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "rental.csv")
+        store_dir = os.path.join(tmp, "rental_store")
+        rental = rental_frame(n_rows)
+        rental.to_csv(csv_path, index=False)
+        write_store(rental, store_dir, source_version(csv_path))
+        del rental
+
+        print(f"{n_rows} rental rows, {n_workers} workers")
+        print(f"{'':<8}{'load ms':>10}{'frame MiB':>12}{'RSS MiB':>10}{'PSS MiB':>10}")
+        for label, use_store in (("csv", False), ("store", True)):
+            measured = run_workers(csv_path, store_dir, use_store, n_workers)
+            mean = {key: sum(m[key] for m in measured) / len(measured) for key in measured[0]}
+            print(
+                f"{label:<8}{mean['load_ms']:>10.1f}{mean['frame']:>12.1f}"
+                f"{mean['rss']:>10.1f}{mean['pss']:>10.1f}"
+            )
+        print("RSS and PSS are per worker, on top of its imports")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""Latency of fetching the four facility walking routes against the local OneMap stub.
+
+Compares the original sequential fetches (a fresh connection per route) with
+the pooled concurrent fetcher, cold and memoized, and shows a partial result
+when one route is slower than the batch timeout.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_routing [delay_seconds]
+"""
+import sys
+import time
+
+import requests
+
+from benchmarks.stub_onemap import StubOneMap
+from utils import map_utils
+from utils.facilities import FACILITY_FILES
+from utils.routing import RouteFetcher
+
+TOKEN = "stub-token"
+HOME = (1.3521, 103.8198)
+
+
+def legacy_getwalkingdetails(start_coordinates, end_coordinates, token):
+    """The original implementation: one unpooled request per route."""
+    req = requests.get(
+        map_utils.ONEMAP_ROUTE_URL
+        + "?start=" + start_coordinates
+        + "&end=" + end_coordinates
+        + "&routeType=walk&token=" + token
+    )
+    resultsdict = req.json()
+    return (
+        resultsdict["route_summary"]["total_distance"],
+        resultsdict["route_summary"]["total_time"],
+        resultsdict["route_geometry"],
+    )
+
+
+def facility_pairs():
+    start = f"{HOME[0]},{HOME[1]}"
+    pairs = []
+    for facility in FACILITY_FILES:
+        _, _, lat, lon = map_utils.get_nearest_facility(*HOME, facility)
+        pairs.append((start, f"{lat},{lon}"))
+    return pairs
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main(delay=0.1):
+    pairs = facility_pairs()
+    with StubOneMap(delay=delay, route_delays={pairs[-1][1]: 5 * delay}) as stub:
+        sequential, expected = timed(
+            lambda: [legacy_getwalkingdetails(start, end, TOKEN) for start, end in pairs[:-1]]
+        )
+
+        fetcher = RouteFetcher(timeout=3 * delay)
+        url = map_utils.ONEMAP_ROUTE_URL
+        cold, routes = timed(fetcher.fetch_many, url, pairs[:-1], TOKEN)
+        warm, cached = timed(fetcher.fetch_many, url, pairs[:-1], TOKEN)
+        partial_time, partial = timed(fetcher.fetch_many, url, pairs, TOKEN)
+        assert expected == routes == cached == partial[:-1]
+        assert partial[-1] is None
+
+    print(f"{len(pairs) - 1} routes, stub delay {delay * 1e3:.0f} ms")
+    print(f"sequential (original)   {sequential * 1e3:8.1f} ms")
+    print(f"concurrent, cold        {cold * 1e3:8.1f} ms")
+    print(f"concurrent, memoized    {warm * 1e3:8.1f} ms")
+    print(f"one slow route (partial){partial_time * 1e3:8.1f} ms -> {sum(r is None for r in partial)} missing")
+    print(f"stub requests served    {stub.request_count}")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:]))
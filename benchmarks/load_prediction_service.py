@@ -0,0 +1,113 @@
+"""Load generator for the headless prediction service.
+
+Fires concurrent POST /predict requests and reports throughput and p50/p99
+latency. Without --url it starts the service in-process on a synthetic model,
+once without batching (--max-batch-size 1) and once with micro-batching.
+
+Run from the repository root:
+
+    python -m benchmarks.load_prediction_service [--url URL] [--requests 2000] [--concurrency 32]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+
+def generate_load(url: str, n_requests: int, concurrency: int, seed: int = 0) -> dict:
+    """Sends ``n_requests`` listings from ``concurrency`` threads and summarises latency."""
+    from benchmarks.synthetic import random_locations
+    from utils.features import FLAT_TYPE
+
+    lats, lons = random_locations(n_requests, seed)
+    rng = np.random.default_rng(seed)
+    listings = [
+        {
+            "lat": float(lat),
+            "lon": float(lon),
+            "flat_type": FLAT_TYPE[rng.integers(2, 6)],
+            "months_ahead": int(rng.choice([0, 3, 6])),
+        }
+        for lat, lon in zip(lats, lons)
+    ]
+    latencies = np.zeros(n_requests)
+    errors = []
+
+    def worker(offset: int) -> None:
+        session = requests.Session()
+        for i in range(offset, n_requests, concurrency):
+            start = time.perf_counter()
+            response = session.post(url + "/predict", json=listings[i], timeout=60)
+            latencies[i] = time.perf_counter() - start
+            if response.status_code != 200:
+                errors.append(response.text)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "throughput": n_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "p99_ms": float(np.percentile(latencies, 99) * 1e3),
+        "errors": len(errors),
+    }
+
+
+def run_local(n_requests: int, concurrency: int, max_batch_size: int, max_wait: float) -> dict:
+    """Starts the service in-process, generates load against it and stops it."""
+    from utils.prediction_service import make_server
+
+    server = make_server(port=0, max_batch_size=max_batch_size, max_wait=max_wait)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        generate_load(url, concurrency, concurrency, seed=1)  # warm up
+        result = generate_load(url, n_requests, concurrency)
+        result["mean_batch"] = server.batcher.items / max(server.batcher.batches, 1)
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="existing service to load, e.g. http://127.0.0.1:8502")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    if args.url:
+        print(generate_load(args.url, args.requests, args.concurrency))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # the model path is read when utils is first imported
+        model_path = os.environ["HDB_MODEL_PATH"] = os.path.join(tmp, "model.pkl")
+        from benchmarks.synthetic import rental_frame, write_model
+
+        write_model(model_path, rental_frame(20_000))
+        print(f"{'mode':<22}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'batch':>7}{'errors':>8}")
+        for mode, max_batch_size, max_wait in [
+            ("unbatched", 1, 0.0),
+            ("micro-batched (64,5ms)", 64, 0.005),
+        ]:
+            result = run_local(args.requests, args.concurrency, max_batch_size, max_wait)
+            print(
+                f"{mode:<22}{result['throughput']:>8.0f}{result['p50_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}{result['mean_batch']:>7.1f}{result['errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
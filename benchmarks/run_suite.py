@@ -0,0 +1,271 @@
+"""Benchmark suite for map_utils and the advice pipeline at realistic data scales.
+
+Times the hot paths on synthetic rental datasets and facility tables of
+several sizes, plus the end-to-end "Get advice" flow with OneMap replaced by
+the local stub, and writes the results as JSON so runs from different
+commits can be compared.
+
+Run from the repository root:
+
+    python -m benchmarks.run_suite [--rental-sizes 10000 100000 1000000]
+        [--facility-sizes 200 2000 20000] [--output bench.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.stub_onemap import StubOneMap
+from benchmarks.synthetic import (
+    random_locations,
+    rental_frame,
+    write_facility_tables,
+    write_model,
+)
+from utils import features, map_utils
+from utils.facilities import FacilityIndex
+from utils.geocode_cache import GeocodeCache
+from utils.neighbours import NeighbourIndex
+from utils.rent_stats import get_rent_statistics
+from utils.routing import get_route_fetcher
+from utils.sweep import get_sweep_cache
+
+RADIUS = 1000
+TOKEN = "benchmark"
+
+
+def measure(func, calls, warmup=None) -> dict:
+    """Times ``func(*args)`` for every args tuple in ``calls`` after one warm-up call.
+
+    The warm-up uses ``warmup`` args if given, otherwise the first call's.
+    """
+    func(*(warmup if warmup is not None else calls[0]))
+    timings = []
+    for args in calls:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1e3
+    return {
+        "calls": len(timings),
+        "mean_ms": float(timings.mean()),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+    }
+
+
+def advice_flow(postal, flat_type, months_ahead, hdb, model, geocode_cache):
+    """The work address_updated and the "Get advice" handler do for one search."""
+    lat, lon, _, _, _ = map_utils.get_address_details(postal, cache=geocode_cache)
+    lat, lon = float(lat), float(lon)
+    nearest = [
+        map_utils.get_nearest_facility(lat, lon, facility)
+        for facility in ["stations", "shopping_malls", "hawker_centres_markets", "schools"]
+    ]
+    map_utils.getwalkingdetails_many(
+        [(f"{lat},{lon}", f"{faclat},{faclong}") for _, _, faclat, faclong in nearest], TOKEN
+    )
+    get_sweep_cache().predict(model, lat, lon, [0, 3, 6]).loc[flat_type, months_ahead]
+    map_utils.find_neighbours((lat, lon), flat_type, RADIUS, hdb)
+    get_rent_statistics(hdb).lookup(flat_type).std
+
+
+def facility_benchmarks(sizes, n_queries) -> list:
+    lats, lons = random_locations(n_queries, seed=1)
+    points = [(lat, lon) for lat, lon in zip(lats, lons)]
+    results = [
+        {
+            "name": "get_nearest_facility",
+            "params": {"facilities": "stations", "facility_rows": "real"},
+            **measure(lambda a, o: map_utils.get_nearest_facility(a, o, "stations"), points),
+        },
+        {
+            "name": "count_primary_schools_within_distance",
+            "params": {"distance_km": 1, "facility_rows": "real"},
+            **measure(lambda a, o: map_utils.count_primary_schools_within_distance(a, o, 1), points),
+        },
+    ]
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_facility_tables(tmp, size)
+            index = FacilityIndex(tmp).load_all()
+        results.append(
+            {
+                "name": "FacilityIndex.nearest",
+                "params": {"facilities": "stations", "facility_rows": size},
+                **measure(lambda a, o: index.nearest(a, o, "stations"), points),
+            }
+        )
+        results.append(
+            {
+                "name": "FacilityIndex.count_within",
+                "params": {"radii_m": [500, 1000, 2000], "facility_rows": size},
+                **measure(lambda a, o: index.count_within(a, o, [500, 1000, 2000], "schools"), points),
+            }
+        )
+    return results
+
+
+def lookup_benchmarks(n_queries) -> list:
+    import pandas as pd
+
+    postals = [f"{code:06d}" for code in np.random.default_rng(0).integers(10000, 829999, n_queries)]
+    lats, lons = random_locations(1000, seed=2)
+    return [
+        {
+            "name": "get_district_and_zone",
+            "params": {},
+            **measure(map_utils.get_district_and_zone, [(p,) for p in postals]),
+        },
+        {
+            "name": "get_districts_and_zones",
+            "params": {"batch": 100_000},
+            **measure(
+                map_utils.get_districts_and_zones,
+                [(pd.Series(postals * (100_000 // len(postals))),)] * 5,
+            ),
+        },
+        {
+            "name": "get_prediction_input",
+            "params": {"batch": 1},
+            **measure(
+                lambda a, o: features.get_prediction_input(a, o, 2, 0),
+                list(zip(lats[:n_queries], lons[:n_queries])),
+            ),
+        },
+        {
+            "name": "build_prediction_input",
+            "params": {"batch": len(lats)},
+            **measure(lambda: features.build_prediction_input(lats, lons, 2, 0), [()] * 5),
+        },
+    ]
+
+
+def rental_benchmarks(sizes, n_queries, stub_delay) -> list:
+    results = []
+    lats, lons = random_locations(n_queries, seed=3)
+    with tempfile.TemporaryDirectory() as tmp, StubOneMap(delay=stub_delay):
+        for size in sizes:
+            hdb = rental_frame(size)
+            start = time.perf_counter()
+            NeighbourIndex(hdb).query((lats[0], lons[0]), "4-ROOM", RADIUS)
+            build_ms = (time.perf_counter() - start) * 1e3
+            results.append(
+                {
+                    "name": "find_neighbours",
+                    "params": {"rental_rows": size, "radius_m": RADIUS},
+                    "index_build_ms": build_ms,
+                    **measure(
+                        lambda a, o: map_utils.find_neighbours((a, o), "4-ROOM", RADIUS, hdb),
+                        list(zip(lats, lons)),
+                    ),
+                }
+            )
+
+            model = write_model(os.path.join(tmp, "model.pkl"), hdb)
+            geocode_cache = GeocodeCache(path=None)
+            get_route_fetcher().clear()
+            # distinct postal codes so every search misses the caches
+            postals = [f"{560000 + size % 1000 + i:06d}" for i in range(n_queries)]
+            results.append(
+                {
+                    "name": "advice_flow",
+                    "params": {"rental_rows": size, "stub_delay_ms": stub_delay * 1e3},
+                    **measure(
+                        lambda postal: advice_flow(
+                            postal, "4-ROOM", 3, hdb, model, geocode_cache
+                        ),
+                        [(postal,) for postal in postals],
+                        warmup=("559999",),
+                    ),
+                }
+            )
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def result_key(result: dict) -> str:
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: list, config: dict, baseline_path: str, threshold: float) -> int:
+    """Prints mean time ratios against a baseline run; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline_run = json.load(f)
+    if baseline_run.get("config") != config:
+        print("Warning: the baseline was run with different settings", file=sys.stderr)
+    baseline = {result_key(r): r for r in baseline_run["results"]}
+    regressions = 0
+    for result in results:
+        before = baseline.get(result_key(result))
+        if before is None:
+            continue
+        ratio = result["mean_ms"] / before["mean_ms"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{result['name']:<40}{json.dumps(result['params']):<50}{ratio:>7.2f}x {flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rental-sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--facility-sizes", type=int, nargs="+", default=[200, 2000, 20000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--stub-delay-ms", type=float, default=20.0)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.2, help="regression ratio")
+    args = parser.parse_args(argv)
+
+    config = {
+        "rental_sizes": args.rental_sizes,
+        "facility_sizes": args.facility_sizes,
+        "queries": args.queries,
+        "stub_delay_ms": args.stub_delay_ms,
+    }
+    results = (
+        facility_benchmarks(args.facility_sizes, args.queries)
+        + lookup_benchmarks(args.queries)
+        + rental_benchmarks(args.rental_sizes, args.queries, args.stub_delay_ms / 1000)
+    )
+    for result in results:
+        print(f"{result['name']:<40}{json.dumps(result['params']):<50}{result['mean_ms']:>10.3f} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "config": config,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, config, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
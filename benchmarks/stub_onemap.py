@@ -0,0 +1,134 @@
+"""Local HTTP server standing in for the OneMap API in benchmarks.
+
+Any six digit postal code geocodes to a deterministic point inside Singapore;
+other search strings return no results. Walking routes are straight lines at
+walking pace. ``delay`` adds a fixed latency to every response to mimic the
+network round trip, and ``route_delays`` adds more for routes ending at given
+"lat,lon" strings, to exercise timeouts.
+
+    with StubOneMap(delay=0.05) as stub:
+        map_utils.get_address_details("560123")
+        print(stub.request_count)
+"""
+import json
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import polyline
+from geopy.distance import geodesic
+
+from benchmarks.synthetic import LAT_RANGE, LON_RANGE
+from utils import map_utils
+
+
+def postal_to_point(postal: str):
+    """Deterministic (lat, lon) inside Singapore's bounding box for a postal code."""
+    seed = zlib.crc32(postal.encode())
+    lat = LAT_RANGE[0] + (seed % 10_000) / 10_000 * (LAT_RANGE[1] - LAT_RANGE[0])
+    lon = LON_RANGE[0] + (seed // 10_000 % 10_000) / 10_000 * (LON_RANGE[1] - LON_RANGE[0])
+    return lat, lon
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.count_request()
+        if stub.delay:
+            stub.sleep(stub.delay)
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/commonapi/search":
+            self._send_json(stub.search(query.get("searchVal", "")))
+        elif url.path == "/privateapi/routingsvc/route":
+            stub.sleep(stub.route_delays.get(query.get("end"), 0.0))
+            self._send_json(stub.route(query["start"], query["end"]))
+        else:
+            self.send_error(404)
+
+
+class StubOneMap:
+    """Runs the stub on a free local port and points map_utils at it while active."""
+
+    def __init__(self, delay: float = 0.0, route_delays: dict = None):
+        self.delay = delay
+        self.route_delays = route_delays or {}
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._saved_urls = {}
+
+    def count_request(self) -> None:
+        with self._count_lock:
+            self.request_count += 1
+
+    def sleep(self, seconds: float) -> None:
+        self._stopped.wait(seconds)
+
+    def search(self, search_val: str) -> dict:
+        search_val = search_val.strip()
+        if not (len(search_val) == 6 and search_val.isdigit()):
+            return {"found": 0, "totalNumPages": 0, "pageNum": 1, "results": []}
+        lat, lon = postal_to_point(search_val)
+        result = {
+            "SEARCHVAL": f"BLK {int(search_val[3:])}",
+            "BLK_NO": str(int(search_val[3:])),
+            "ROAD_NAME": "STUB AVENUE",
+            "BUILDING": "NIL",
+            "ADDRESS": f"{int(search_val[3:])} STUB AVENUE SINGAPORE {search_val}",
+            "POSTAL": search_val,
+            "LATITUDE": f"{lat:.10f}",
+            "LONGITUDE": f"{lon:.10f}",
+        }
+        return {"found": 1, "totalNumPages": 1, "pageNum": 1, "results": [result]}
+
+    def route(self, start: str, end: str) -> dict:
+        start_point = tuple(float(value) for value in start.split(","))
+        end_point = tuple(float(value) for value in end.split(","))
+        distance = geodesic(start_point, end_point).meters
+        return {
+            "status": 0,
+            "route_geometry": polyline.encode([start_point, end_point]),
+            "route_summary": {
+                "total_distance": round(distance),
+                "total_time": round(distance / 1.3),
+            },
+        }
+
+    def _patch(self, **urls) -> None:
+        for name, value in urls.items():
+            self._saved_urls[name] = getattr(map_utils, name)
+            setattr(map_utils, name, value)
+
+    def __enter__(self) -> "StubOneMap":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._patch(
+            ONEMAP_URL=self.url,
+            ONEMAP_SEARCH_URL=self.url + "/commonapi/search",
+            ONEMAP_ROUTE_URL=self.url + "/privateapi/routingsvc/route",
+        )
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for name, value in self._saved_urls.items():
+            setattr(map_utils, name, value)
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,91 @@
+"""Synthetic rental datasets shaped like rental_with_engineered_features_cleaned.csv"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from utils.facilities import FACILITY_FILES
+from utils.features import FLAT_TYPE, build_prediction_input
+
+# Rough bounding box of Singapore's HDB estates
+LAT_RANGE = (1.27, 1.45)
+LON_RANGE = (103.65, 103.98)
+
+STREETS = [
+    "ANG MO KIO AVE 3",
+    "BEDOK NORTH RD",
+    "BUKIT BATOK ST 21",
+    "CLEMENTI AVE 4",
+    "HOUGANG AVE 8",
+    "JURONG WEST ST 42",
+    "PASIR RIS DR 6",
+    "PUNGGOL FIELD",
+    "SENGKANG EAST WAY",
+    "TAMPINES ST 81",
+    "TOA PAYOH LOR 1",
+    "WOODLANDS DR 14",
+    "YISHUN RING RD",
+]
+
+
+def random_locations(n: int, seed: int = 0):
+    """Uniformly random (lat, lon) arrays inside Singapore's bounding box."""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(*LAT_RANGE, n), rng.uniform(*LON_RANGE, n)
+
+
+def rental_frame(n_rows: int, n_blocks: int = 9000, seed: int = 0) -> pd.DataFrame:
+    """Random rental approvals over ``n_blocks`` blocks, oldest approval first."""
+    rng = np.random.default_rng(seed)
+    block_lat, block_lon = random_locations(n_blocks, seed)
+    block_no = rng.integers(1, 999, n_blocks).astype(str)
+    street = np.asarray(STREETS, dtype=object)[rng.integers(0, len(STREETS), n_blocks)]
+    # block numbers can repeat on a street, the block id keeps addresses unique
+    address = [f"{no}{chr(65 + i % 26)} {st}" for i, (no, st) in enumerate(zip(block_no, street))]
+    postal = rng.integers(10000, 829999, n_blocks)
+
+    blocks = rng.integers(0, n_blocks, n_rows)
+    months = np.sort(rng.integers(0, 36, n_rows))
+    flat_type = np.asarray(FLAT_TYPE, dtype=object)[
+        rng.choice(len(FLAT_TYPE), n_rows, p=[0.01, 0.04, 0.3, 0.35, 0.25, 0.05])
+    ]
+    return pd.DataFrame(
+        {
+            "rent_approval_date": [f"{2021 + m // 12}-{m % 12 + 1:02d}" for m in months],
+            "block": block_no[blocks],
+            "street_name": street[blocks],
+            "address": np.asarray(address, dtype=object)[blocks],
+            "flat_type": flat_type,
+            "monthly_rent": rng.integers(8, 60, n_rows) * 100,
+            "lat": block_lat[blocks],
+            "lon": block_lon[blocks],
+            "postal": postal[blocks],
+        }
+    )
+
+
+def write_facility_tables(directory: str, n_per_type: int, seed: int = 0) -> None:
+    """Writes a random CSV of ``n_per_type`` rows for every facility type into ``directory``."""
+    for offset, (file_name, reference_column) in enumerate(FACILITY_FILES.values()):
+        lat, lon = random_locations(n_per_type, seed + offset)
+        pd.DataFrame(
+            {
+                reference_column: [f"{file_name[:-4]} {i}" for i in range(n_per_type)],
+                "Latitude": lat,
+                "Longitude": lon,
+            }
+        ).to_csv(os.path.join(directory, file_name), index=False)
+
+
+def write_model(model_path: str, rental: pd.DataFrame, n_samples: int = 2000):
+    """Fits a small random forest on a sample of ``rental`` and pickles it like the finalized model."""
+    sample = rental.sample(min(len(rental), n_samples), random_state=0)
+    features = build_prediction_input(
+        sample["lat"], sample["lon"], sample["flat_type"], 0
+    )
+    model = RandomForestRegressor(n_estimators=50, random_state=0)
+    model.fit(features, sample["monthly_rent"])
+    joblib.dump(model, model_path)
+    return model
@@ -2,18 +2,27 @@ import os
 import folium
 import polyline
 import math
-import pandas as pd
-import joblib
 import streamlit as st
 
+import utils.features as features
+import utils.map_layers as map_layers
 import utils.map_utils as map_utils
+import utils.rent_grid as rent_grid
+import utils.rent_stats as rent_stats
+import utils.resources as resources
+import utils.sweep as sweep
+from utils import tracing
 
 from streamlit_folium import st_folium
-from datetime import datetime, timedelta
 
 ONEMAP_TOKEN = st.secrets["token"]
 
-hdb = pd.read_csv("data/rental_with_engineered_features_cleaned.csv")
+if tracing.ENABLED:
+    # Streamlit does not set up logging for the app, so the span logs would be dropped
+    tracing.configure_logging()
+
+# Loaded once per server process and shared by every session and rerun
+hdb = resources.get_rental_frame()
 # std_dev = hdb['monthly_rent'].describe()["std"]
 
 LAT_START = 1.3521
@@ -29,45 +38,13 @@ if "zoom" not in st.session_state:
     st.session_state["zoom"] = ZOOM_START
 if "markers" not in st.session_state:
     st.session_state["markers"] = []
+if "neighbour_layer" not in st.session_state:
+    st.session_state["neighbour_layer"] = None
 
-FLAT_TYPE = ["1-ROOM", "2-ROOM", "3-ROOM", "4-ROOM", "5-ROOM", "EXECUTIVE"]
+FLAT_TYPE = features.FLAT_TYPE
 RENTAL_DATE = {"Immediate": 0, "3 Months": 3, "6 Months": 6}
 
 
-def get_prediction_input(lat: float, long: float, flat_type: int, future_rental_date: int) -> dict:
-    
-    distance_to_station, _, _, _ = map_utils.get_nearest_facility(lat, long, "stations")
-    distance_to_hawker, _, _, _ = map_utils.get_nearest_facility(lat, long, 
-                                                                 "hawker_centres_markets")
-    distance_to_mall, _, _, _ = map_utils.get_nearest_facility(lat, long, "shopping_malls")
-    distance_to_cbd = map_utils.calculate_distance_to_cbd(lat, long)
-
-    # Get the current date
-    current_date = datetime.now()
-
-    # Add 'future_rental_date' months to the current date
-    future_date = current_date + timedelta(days=(future_rental_date * 30))
-
-    data_start_date = datetime.strptime('2021-01', '%Y-%m')
-    months_difference = (future_date.year - data_start_date.year) * 12 \
-        + (future_date.month - data_start_date.month)
-
-    data = {
-        "rent_approval_date":[months_difference],
-        "flat_type":[flat_type],
-        "lat":[lat],
-        "lon":[long],
-        "min_geodisic_distance_to_station":[distance_to_station],
-        "min_geodisic_distance_to_hawker_market":[distance_to_hawker],
-        "min_geodisic_distance_to_shopping_mall":[distance_to_mall],
-        "geodesic_distance_to_cbd":[distance_to_cbd],
-    }
-    print(data)
-    input_df = pd.DataFrame(data)
-
-    return input_df
-
-
 def address_updated():
     """
     Callback function that streamlit calls when user enters an address
@@ -76,18 +53,27 @@ def address_updated():
     2. displays a marker at the rental location
     3. centers map at the rental location
     """
+    with tracing.span("app.address_updated"):
+        _address_updated()
+
+
+def _address_updated():
     st.session_state["markers"] = []
+    st.session_state["neighbour_layer"] = None
     TOKEN = ONEMAP_TOKEN
     address = st.session_state["address"]
     flat_type = st.session_state["flat"]
 
     (
-        latrental,
-        longrental,
-        postal,
-        address,
-        buildingname,
-    ) = map_utils.get_address_details(address)
+        (
+            latrental,
+            longrental,
+            postal,
+            address,
+            buildingname,
+        ),
+        st.session_state["geocode_source"],
+    ) = map_utils.lookup_address(address)
 
     # dynamically update marker on map
     # folium.Marker(location=(lat, long), popup=samplepopup).add_to(mapfolium)
@@ -108,11 +94,26 @@ def address_updated():
         "hawker_centres_markets": {"icon": "cutlery", "colour": "orange"},
         "schools": {"icon": "book", "colour": "purple"},
     }
-    for facility in ["stations", "shopping_malls", "hawker_centres_markets", "schools"]:
-        # Add markers to the map for nearest train station
-        _, facloc, faclat, faclong = map_utils.get_nearest_facility(
-            latrental, longrental, facility
+    facilities = ["stations", "shopping_malls", "hawker_centres_markets", "schools"]
+    nearest = {
+        facility: map_utils.get_nearest_facility(latrental, longrental, facility)
+        for facility in facilities
+    }
+
+    # Fetch all walking routes at once; a route that fails or times out is
+    # returned as None and only its polyline is left off the map
+    with tracing.span("app.walking_routes"):
+        routes = map_utils.getwalkingdetails_many(
+            [
+                (str(latrental) + "," + str(longrental), str(faclat) + "," + str(faclong))
+                for _, _, faclat, faclong in nearest.values()
+            ],
+            TOKEN,
         )
+
+    for facility, route in zip(facilities, routes):
+        # Add markers to the map for nearest train station
+        _, facloc, faclat, faclong = nearest[facility]
         # print(facloc)
 
         facicon = folium.Icon(
@@ -127,14 +128,13 @@ def address_updated():
 
         st.session_state["markers"].append(facmarker)
 
+        if route is None:
+            continue
+
         # Add polyline from house to nearest facility
         # facsecs in the time to walk to facility, in seconds.
         # Divide by 60 to get minutes.
-        facsecs, facdist, encoded_polyline = map_utils.getwalkingdetails(
-            str(latrental) + "," + str(longrental),
-            str(faclat) + "," + str(faclong),
-            TOKEN,
-        )
+        facsecs, facdist, encoded_polyline = route
         facpath = polyline.decode(encoded_polyline)
         facpathpopup = folium.Popup(
             f"{facloc}<br>Total Walking Distance: <b>{facdist}m</b><br> ETA: {math.ceil(facsecs)}mins",
@@ -170,6 +170,9 @@ def address_updated():
     st.session_state["center"] = [latrental, longrental]
     st.session_state["lat"] = latrental
     st.session_state["long"] = longrental
+    st.session_state["zone"], st.session_state["district"] = map_utils.get_district_and_zone(
+        postal
+    )
 
     # dynamically zoom in map
     st.session_state["zoom"] = 15
@@ -177,7 +180,7 @@ def address_updated():
     # print("update address:", st.session_state["lat"], st.session_state["long"], postal)
 
 
-model = joblib.load("./model/finalized_model.pkl")
+model = resources.get_model()
 
 st.set_page_config(layout="wide")
 
@@ -189,6 +192,10 @@ with col_left:
     st.text_input(
         "Enter your address or postal code", on_change=address_updated, key="address"
     )
+    if st.session_state.get("geocode_source") == map_utils.SOURCE_LOCAL:
+        st.caption("Location found in the rental records")
+    elif st.session_state.get("geocode_source"):
+        st.caption("Location found by OneMap")
 
     flat_option = st.selectbox(
         "What is your flat type?", FLAT_TYPE, index=2, key="flat"
@@ -201,17 +208,27 @@ with col_left:
         key="rentaldate",
     )
 
+    # None until `python -m utils.rent_grid` has been run for the current model
+    grid = rent_grid.get_rent_grid()
+    show_heatmap = grid is not None and st.checkbox("Show predicted rent heatmap", key="heatmap")
+    if grid is not None and st.session_state.get("geocode_source") and st.session_state["lat"] != "":
+        # read off the precomputed grid, so it updates instantly with the options
+        approx_rent = grid.approximate(
+            float(st.session_state["lat"]), float(st.session_state["long"]),
+            flat_option, RENTAL_DATE[rental_date_option],
+        )
+        if not math.isnan(approx_rent):
+            st.caption(f"Around \${approx_rent:,.0f} a month for a {flat_option} flat here")
+
     if st.button("Get advice"):
-        with st.spinner('Retrieving rental data...'):
-            flat_type = FLAT_TYPE.index(flat_option)
-            print(rental_date_option)
+        with st.spinner('Retrieving rental data...'), tracing.span("app.get_advice"):
             rental_approval_date = RENTAL_DATE[rental_date_option]
-            inference_input = get_prediction_input(st.session_state["lat"],
-                                                    st.session_state["long"],
-                                                    flat_type,
-                                                    rental_approval_date)
-            print(rental_approval_date)
-            curr_pred_result = model.predict(inference_input)
+            # Every flat type and rental start is scored in one batch and cached
+            # for the location, so changing either option is a lookup
+            rent_sweep = sweep.get_sweep_cache().predict(
+                model, st.session_state["lat"], st.session_state["long"], list(RENTAL_DATE.values())
+            )
+            curr_pred_result = [rent_sweep.loc[flat_option, rental_approval_date]]
 
             # print(hdb.head(3))
             neighbours = map_utils.find_neighbours(
@@ -219,46 +236,29 @@ with col_left:
                 flat_option, RADIUS, hdb
             )
 
-            # print(neighbours.head(3))
-            for nblat, nblong, nbrental, nbloc, nbflat, nbdate in neighbours[
-                [
-                    "lat",
-                    "lon",
-                    "monthly_rent",
-                    "address",
-                    "flat_type",
-                    "rent_approval_date",
-                ]
-            ].values:
-                nbpopup = folium.Popup(
-                    f"{nbloc}<br>"
-                    f"Type: {nbflat}<br>"
-                    f"Lease Start: {nbdate}<br>"
-                    f"Monthly Rental: <b>{nbrental}</b>",
-                    max_width=len(nbloc) * 10,
-                )
-
-                # print(nbpopup)
-                if nbrental > curr_pred_result:
-                    nbicon = folium.Icon(icon="user", prefix="fa", color="red")
-                else:
-                    nbicon = folium.Icon(icon="user", prefix="fa", color="green")
-                # , icon=nbicon
-                nbmarker = folium.Marker(
-                    location=(nblat, nblong), popup=nbpopup, icon=nbicon
+            # One layer for every neighbour, capped at the closest few hundred,
+            # instead of a Marker, Icon and Popup per record
+            with tracing.span("app.neighbour_layer", neighbours=len(neighbours)):
+                st.session_state["neighbour_layer"] = map_layers.neighbour_layer(
+                    neighbours,
+                    (st.session_state["lat"], st.session_state["long"]),
+                    curr_pred_result[0],
                 )
 
-                # Using insert to place the neighbourhood rentals before the
-                # input house, displays the markers in order
-                st.session_state["markers"].insert(0, nbmarker)
-
         pred_rental_price = curr_pred_result[0]
         # lb_rental_price = pred_rental_price - std_dev
         # ub_rental_price = pred_rental_price + std_dev
 
-        flat_type_name_input = FLAT_TYPE[inference_input['flat_type'][0]]
-        flat_std_dev = hdb[hdb['flat_type']==flat_type_name_input]['monthly_rent'].describe()['std']
-
+        flat_type_name_input = flat_option
+        with tracing.span("app.rent_std"):
+            # precomputed once per dataset, so this is a dictionary lookup
+            stats = rent_stats.get_rent_statistics(hdb)
+            flat_stats = stats.lookup(flat_type_name_input)
+            flat_std_dev = flat_stats.std if flat_stats is not None else float("nan")
+            district = st.session_state.get("district")
+            area_stats = (
+                stats.lookup(flat_type_name_input, district=district) if district else None
+            )
 
         if rental_approval_date == 0:
             # st.write(f"The property at your given location has a predicted rental of "
@@ -271,10 +271,30 @@ with col_left:
             st.write(f"The property at your given location has a predicted rental of "
                         f"\${pred_rental_price:.0f} +/- \${flat_std_dev:.0f} in {rental_approval_date} months time")
 
+        if area_stats is not None:
+            st.write(f"{flat_type_name_input} flats in district {district} "
+                     f"({st.session_state['zone']}) have rented for \${area_stats.mean:.0f} "
+                     f"+/- \${area_stats.std:.0f} over {area_stats.count} approvals")
+
+        st.caption("Predicted monthly rent by flat type and rental start")
+        st.dataframe(
+            rent_sweep.rename(columns={months: label for label, months in RENTAL_DATE.items()})
+            .map(lambda rent: f"${rent:,.0f}")
+        )
+
 # Map column
 with col_right:
     sg_map = folium.Map(location=st.session_state["center"], zoom_start=ZOOM_START)
     marker_group = folium.FeatureGroup(name="Markers")
+    heatmap = grid.raster(flat_option, RENTAL_DATE[rental_date_option]) if show_heatmap else None
+    if heatmap is not None:
+        rent_range = map_layers.heatmap_range(heatmap)
+        marker_group.add_child(map_layers.rent_heatmap_layer(heatmap, grid.bounds, rent_range))
+        st.caption(f"Predicted {flat_option} rent from \${rent_range[0]:,.0f} (green) "
+                   f"to \${rent_range[1]:,.0f} (red) a month")
+    # neighbours go first so the searched flat and facilities are drawn over them
+    if st.session_state["neighbour_layer"] is not None:
+        marker_group.add_child(st.session_state["neighbour_layer"])
     for marker in st.session_state["markers"]:
         marker_group.add_child(marker)
 
@@ -289,6 +309,10 @@ with col_right:
         returned_objects=[],
     )
 
+if tracing.ENABLED:
+    with st.expander("Stage latencies"):
+        st.json(tracing.snapshot())
+
 st.info("Disclaimer: this app is meant as proof of concept only, \
     and not for any actual real world prediction of property rentals")
 st.info("Disclaimer: this app may not work as intended after July 7 2023, \
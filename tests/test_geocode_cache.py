@@ -0,0 +1,170 @@
+"""GeocodeCache and lookup_address against the local OneMap stub."""
+import json
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+from benchmarks.stub_onemap import StubOneMap
+from utils import geocode_cache, map_utils
+from utils.geocode_cache import GeocodeCache
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+NOT_FOUND = ("", "", "", "", "")
+
+
+@pytest.fixture
+def stub():
+    with StubOneMap() as stub:
+        yield stub
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the cache's wall clock with one the test advances by hand."""
+    now = types.SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(geocode_cache, "time", types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "geocode.sqlite3")
+
+
+def lookup(query, cache):
+    return map_utils.lookup_address(query, cache=cache, local=False)
+
+
+def test_miss_goes_to_onemap_and_hit_does_not(stub, cache_path):
+    cache = GeocodeCache(path=cache_path)
+
+    details, source = lookup("560123", cache)
+    assert source == map_utils.SOURCE_ONEMAP
+    assert details[2] == "560123"
+    assert stub.request_count == 1
+
+    # the normalized query shares the entry
+    assert lookup("  560123 ", cache) == (details, map_utils.SOURCE_CACHE)
+    assert stub.request_count == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_no_match_is_cached(stub, cache_path):
+    cache = GeocodeCache(path=cache_path)
+
+    assert lookup("NO SUCH PLACE", cache) == (NOT_FOUND, map_utils.SOURCE_ONEMAP)
+    assert lookup("no such place", cache) == (NOT_FOUND, map_utils.SOURCE_CACHE)
+    assert stub.request_count == 1
+    assert cache.get("NO SUCH PLACE") == (True, None)
+
+
+def test_found_address_expires_after_ttl(stub, cache_path, clock):
+    cache = GeocodeCache(path=cache_path, ttl=60, negative_ttl=3600)
+    lookup("560123", cache)
+
+    clock.value += 59
+    assert lookup("560123", cache)[1] == map_utils.SOURCE_CACHE
+    clock.value += 2
+    assert lookup("560123", cache)[1] == map_utils.SOURCE_ONEMAP
+    assert stub.request_count == 2
+
+
+def test_no_match_expires_after_negative_ttl(stub, cache_path, clock):
+    cache = GeocodeCache(path=cache_path, ttl=3600, negative_ttl=60)
+    lookup("NO SUCH PLACE", cache)
+    lookup("560123", cache)
+
+    clock.value += 61
+    assert lookup("NO SUCH PLACE", cache)[1] == map_utils.SOURCE_ONEMAP
+    # found addresses keep the longer TTL
+    assert lookup("560123", cache)[1] == map_utils.SOURCE_CACHE
+    assert stub.request_count == 3
+
+
+def test_expired_entry_is_dropped_from_sqlite(cache_path, clock):
+    cache = GeocodeCache(path=cache_path, ttl=60)
+    cache.put("560123", ("1.3", "103.8", "560123", "", ""))
+
+    clock.value += 61
+    assert GeocodeCache(path=cache_path, ttl=60).get("560123") == (False, None)
+    clock.value -= 61
+    assert GeocodeCache(path=cache_path, ttl=60).get("560123") == (False, None)
+
+
+def test_evicted_entries_fall_through_to_sqlite(stub, cache_path):
+    cache = GeocodeCache(path=cache_path, maxsize=2)
+    expected = {query: lookup(query, cache)[0] for query in ("560001", "560002", "560003")}
+    assert cache.stats()["memory_entries"] == 2
+
+    assert lookup("560001", cache) == (expected["560001"], map_utils.SOURCE_CACHE)
+    assert cache.stats()["disk_hits"] == 1
+    # the disk hit was promoted, so it is now served from memory
+    assert lookup("560001", cache)[1] == map_utils.SOURCE_CACHE
+    assert cache.stats()["memory_hits"] == 1
+    assert stub.request_count == 3
+
+
+def test_memory_only_cache_forgets_evicted_entries(stub):
+    cache = GeocodeCache(path=None, maxsize=1)
+    lookup("560001", cache)
+    lookup("560002", cache)
+
+    assert lookup("560001", cache)[1] == map_utils.SOURCE_ONEMAP
+    assert stub.request_count == 3
+
+
+def run_python(code, *args):
+    return subprocess.run(
+        [sys.executable, "-c", code, *args],
+        cwd=ROOT_DIR,
+        env=dict(os.environ, PYTHONPATH=ROOT_DIR),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def test_entries_persist_across_processes(stub, cache_path):
+    details, _ = lookup("560123", GeocodeCache(path=cache_path))
+    lookup("NO SUCH PLACE", GeocodeCache(path=cache_path))
+
+    output = run_python(
+        "import json, sys\n"
+        "from utils.geocode_cache import GeocodeCache\n"
+        "cache = GeocodeCache(path=sys.argv[1])\n"
+        "print(json.dumps([cache.get(q) for q in ('560123', 'no such place', '560124')]))",
+        cache_path,
+    )
+    assert json.loads(output) == [[True, list(details)], [True, None], [False, None]]
+    assert stub.request_count == 2
+
+
+def test_concurrent_writers_share_the_file(cache_path):
+    writer = (
+        "import sys\n"
+        "from utils.geocode_cache import GeocodeCache\n"
+        "cache = GeocodeCache(path=sys.argv[1])\n"
+        "offset = int(sys.argv[2])\n"
+        "for i in range(200):\n"
+        "    cache.put(f'{offset + i:06d}', (str(i), str(i), f'{offset + i:06d}', '', ''))\n"
+    )
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", writer, cache_path, str(offset)],
+            cwd=ROOT_DIR,
+            env=dict(os.environ, PYTHONPATH=ROOT_DIR),
+        )
+        for offset in (100000, 200000, 300000)
+    ]
+    assert [process.wait(timeout=120) for process in processes] == [0, 0, 0]
+
+    cache = GeocodeCache(path=cache_path)
+    for offset in (100000, 200000, 300000):
+        for i in (0, 199):
+            assert cache.get(f"{offset + i:06d}") == (
+                True, (str(i), str(i), f"{offset + i:06d}", "", "")
+            )
@@ -0,0 +1,97 @@
+"""Walking routes from map_utils against the local OneMap stub."""
+import time
+
+import pytest
+import requests
+
+from benchmarks.stub_onemap import StubOneMap
+from utils import map_utils, routing
+
+TOKEN = "token"
+START = "1.35000,103.80000"
+ENDS = [f"1.3{i}000,103.8{i}000" for i in range(1, 7)]
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    """A fresh process-wide RouteFetcher, so no test sees another's memo."""
+    fetcher = routing.RouteFetcher(max_workers=8, timeout=5.0)
+    monkeypatch.setattr(routing, "_ROUTE_FETCHER", fetcher)
+    return fetcher
+
+
+def test_routes_are_memoized_by_rounded_coordinates(fetcher):
+    with StubOneMap() as stub:
+        route = map_utils.getwalkingdetails(START, ENDS[0], TOKEN)
+        assert route[0] > 0
+
+        # within ~1 m of the first request
+        nearby_start = "1.350001,103.800004"
+        assert map_utils.getwalkingdetails(nearby_start, ENDS[0], TOKEN) == route
+        assert stub.request_count == 1
+
+        map_utils.getwalkingdetails("1.35010,103.80000", ENDS[0], TOKEN)
+        assert stub.request_count == 2
+
+        fetcher.clear()
+        map_utils.getwalkingdetails(START, ENDS[0], TOKEN)
+        assert stub.request_count == 3
+
+
+def test_one_pooled_session_is_reused(fetcher, monkeypatch):
+    sessions = []
+    original_get = requests.Session.get
+
+    def recording_get(session, *args, **kwargs):
+        sessions.append(session)
+        return original_get(session, *args, **kwargs)
+
+    monkeypatch.setattr(requests.Session, "get", recording_get)
+    with StubOneMap() as stub:
+        for end in ENDS[:3]:
+            map_utils.getwalkingdetails(START, end, TOKEN)
+        map_utils.getwalkingdetails_many([(START, end) for end in ENDS[3:]], TOKEN)
+        url = stub.url
+
+    assert len(sessions) == len(ENDS)
+    assert all(session is fetcher.session for session in sessions)
+    # every request went through the one connection pool for the stub's host
+    assert len(fetcher.session.get_adapter(url).poolmanager.pools) == 1
+
+
+def test_routes_are_fetched_concurrently(fetcher):
+    delay = 0.3
+    with StubOneMap(delay=delay) as stub:
+        start = time.perf_counter()
+        routes = map_utils.getwalkingdetails_many([(START, end) for end in ENDS], TOKEN)
+        elapsed = time.perf_counter() - start
+
+    assert all(route is not None for route in routes)
+    assert stub.request_count == len(ENDS)
+    assert elapsed < delay * len(ENDS) / 2
+
+
+def test_slow_route_is_none_and_others_arrive(fetcher):
+    pairs = [(START, end) for end in ENDS[:3]]
+    with StubOneMap(route_delays={ENDS[1]: 2.0}):
+        start = time.perf_counter()
+        routes = map_utils.getwalkingdetails_many(pairs, TOKEN, timeout=0.5)
+        elapsed = time.perf_counter() - start
+
+    assert routes[1] is None
+    assert routes[0] is not None and routes[2] is not None
+    assert elapsed < 1.5
+
+
+def test_failed_route_is_none_and_others_arrive(monkeypatch):
+    # the request itself times out, well before the batch does
+    monkeypatch.setattr(routing, "_ROUTE_FETCHER", routing.RouteFetcher(timeout=0.3))
+    pairs = [(START, end) for end in ENDS[:3]]
+    with StubOneMap(route_delays={ENDS[2]: 2.0}):
+        routes = map_utils.getwalkingdetails_many(pairs, TOKEN, timeout=5.0)
+        assert map_utils.getwalkingdetails(START, ENDS[0], TOKEN) == routes[0]
+        with pytest.raises(requests.RequestException):
+            map_utils.getwalkingdetails(START, ENDS[2], TOKEN)
+
+    assert routes[2] is None
+    assert routes[0] is not None and routes[1] is not None
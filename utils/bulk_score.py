@@ -0,0 +1,280 @@
+"""Resumable, multi-process rent scoring of large listing files.
+
+Reads a CSV of listings in chunks, geocodes each chunk's addresses with
+get_address_details (locally for known blocks, else through the shared
+geocoding cache), computes the facility distance features and scores the
+chunk with the finalized model in a pool of worker processes. Results are
+appended to the output CSV in input order as chunks finish, and a checkpoint
+file next to the output records how far the run got, so an interrupted run
+picks up from the last written chunk. Only a bounded number of chunks is in
+flight at a time, so memory use does not grow with the input.
+
+    python -m utils.bulk_score listings.csv scored.csv [--workers 4] [--chunk-size 1000]
+
+The input needs an address (or postal code) column and a flat_type column,
+and optionally a months_ahead column of whole months from 0 to
+features.MAX_MONTHS_AHEAD; listings that already have lat and lon columns
+are not geocoded.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1000
+# Chunks queued per worker, enough to keep every worker busy
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+RESULT_COLUMNS = ["lat", "lon", "postal", "predicted_rent"]
+
+logger = logging.getLogger(__name__)
+
+
+def score_chunk(chunk: pd.DataFrame, address_column: str, months_ahead: int) -> pd.DataFrame:
+    """Geocodes and scores one chunk of listings.
+
+    Listings whose address cannot be geocoded, whose flat type is unknown or
+    whose months_ahead is not a whole number of months in range get an empty
+    predicted_rent rather than failing the chunk.
+
+    Args:
+        chunk (pd.DataFrame): Listings with ``address_column`` and "flat_type"
+            columns, and optionally "months_ahead", "lat" and "lon".
+        address_column (str): Column to geocode.
+        months_ahead (int): Months ahead for listings without a months_ahead column.
+
+    Returns:
+        pd.DataFrame: ``chunk`` with RESULT_COLUMNS added.
+    """
+    # imported in the worker processes, which do all the heavy lifting
+    from utils import features, resources
+    from utils.map_utils import get_address_details
+
+    result = chunk.copy()
+    if "lat" in chunk.columns and "lon" in chunk.columns:
+        lat = chunk["lat"].to_numpy(dtype=float)
+        lon = chunk["lon"].to_numpy(dtype=float)
+        postal = chunk["postal"] if "postal" in chunk.columns else pd.Series("", index=chunk.index)
+    else:
+        located = {}
+        for address in chunk[address_column].dropna().astype(str).unique():
+            found_lat, found_lon, found_postal, _, _ = get_address_details(address, logger=logger)
+            located[address] = (
+                (float(found_lat), float(found_lon), found_postal)
+                if found_lat != ""
+                else (np.nan, np.nan, "")
+            )
+        rows = [
+            located.get(str(address), (np.nan, np.nan, "")) if pd.notna(address) else (np.nan, np.nan, "")
+            for address in chunk[address_column]
+        ]
+        lat = np.array([row[0] for row in rows], dtype=float)
+        lon = np.array([row[1] for row in rows], dtype=float)
+        postal = pd.Series([row[2] for row in rows], index=chunk.index)
+
+    flat_type = chunk["flat_type"].astype(str).str.strip().str.upper()
+    horizons = (
+        pd.to_numeric(chunk["months_ahead"], errors="coerce")
+        .where(chunk["months_ahead"].notna(), months_ahead)
+        .to_numpy(dtype=float)
+        if "months_ahead" in chunk.columns
+        else np.full(len(chunk), months_ahead, dtype=float)
+    )
+    # NaN, fractional and out of range horizons would fail the date arithmetic
+    valid_horizons = (
+        (horizons >= 0) & (horizons <= features.MAX_MONTHS_AHEAD) & (horizons == np.round(horizons))
+    )
+    horizons = np.where(valid_horizons, horizons, 0).astype(np.int64)
+    scorable = (
+        ~np.isnan(lat)
+        & ~np.isnan(lon)
+        & flat_type.isin(features.FLAT_TYPE).to_numpy()
+        & valid_horizons
+    )
+
+    predicted = np.full(len(chunk), np.nan)
+    if scorable.any():
+        inference_input = features.build_prediction_input(
+            lat[scorable], lon[scorable], flat_type[scorable].to_numpy(), horizons[scorable],
+            postals=postal.to_numpy(dtype=object)[scorable],
+        )
+        predicted[scorable] = resources.get_model().predict(inference_input)
+
+    result["lat"] = lat
+    result["lon"] = lon
+    result["postal"] = postal
+    result["predicted_rent"] = predicted
+    return result
+
+
+class Checkpoint:
+    """Progress of a run, stored as JSON next to the output file.
+
+    Args:
+        path (str): The checkpoint file.
+        run (dict): Settings identifying the run; a checkpoint from a run with
+            different settings is not resumed.
+    """
+
+    def __init__(self, path: str, run: dict):
+        self.path = path
+        self.run = run
+        self.chunks_done = 0
+        self.rows_done = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        """Reads the saved progress; returns False if there is none for this run."""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return False
+        if saved["run"] != self.run:
+            raise ValueError(
+                f"{self.path} belongs to a run with different settings or input, "
+                "delete it or pass --restart to start over"
+            )
+        self.chunks_done = saved["chunks_done"]
+        self.rows_done = saved["rows_done"]
+        self.output_bytes = saved["output_bytes"]
+        return True
+
+    def save(self) -> None:
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "run": self.run,
+                    "chunks_done": self.chunks_done,
+                    "rows_done": self.rows_done,
+                    "output_bytes": self.output_bytes,
+                },
+                f,
+            )
+        os.replace(self.path + ".tmp", self.path)
+
+
+def _input_version(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def bulk_score(
+    input_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    address_column: str = "address",
+    months_ahead: int = 0,
+    restart: bool = False,
+) -> int:
+    """Scores every listing in ``input_path`` into ``output_path``, resuming an earlier run.
+
+    Args:
+        input_path (str): CSV of listings.
+        output_path (str): CSV to write; the input columns plus RESULT_COLUMNS.
+        workers (Optional[int]): Worker processes. Defaults to the number of CPUs.
+        chunk_size (int): Listings per chunk, the unit of work and of checkpointing.
+        address_column (str): Column to geocode.
+        months_ahead (int): Months ahead for listings without a months_ahead column.
+        restart (bool): Ignore any checkpoint and start from the first listing.
+
+    Returns:
+        int: The number of listings scored by this call.
+
+    Raises:
+        ValueError: If ``months_ahead`` is out of range, or a checkpoint from a different
+            run exists and ``restart`` is False.
+    """
+    from utils.features import MAX_MONTHS_AHEAD
+
+    if not 0 <= months_ahead <= MAX_MONTHS_AHEAD:
+        raise ValueError(f"months_ahead must be between 0 and {MAX_MONTHS_AHEAD}")
+    workers = workers or os.cpu_count() or 1
+    checkpoint = Checkpoint(
+        output_path + ".checkpoint",
+        {
+            "input": os.path.abspath(input_path),
+            "input_version": _input_version(input_path),
+            "chunk_size": chunk_size,
+            "address_column": address_column,
+            "months_ahead": months_ahead,
+        },
+    )
+    if restart or not checkpoint.load():
+        checkpoint.save()
+    # drop anything written after the last checkpoint
+    with open(output_path, "ab") as f:
+        f.truncate(checkpoint.output_bytes)
+    if checkpoint.chunks_done:
+        logger.info("Resuming after %d listings", checkpoint.rows_done)
+
+    chunks = pd.read_csv(input_path, chunksize=chunk_size, dtype={address_column: str})
+    for _ in range(checkpoint.chunks_done):
+        next(chunks, None)
+
+    scored = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(output_path, "ab") as output:
+        pending = []
+
+        def write_oldest():
+            nonlocal scored
+            result = pending.pop(0).result()
+            result.to_csv(output, header=checkpoint.output_bytes == 0, index=False)
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint.chunks_done += 1
+            checkpoint.rows_done += len(result)
+            checkpoint.output_bytes = output.tell()
+            checkpoint.save()
+            scored += len(result)
+            logger.info(
+                "%d listings written, %.0f per second",
+                checkpoint.rows_done,
+                scored / (time.perf_counter() - start),
+            )
+
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk, address_column, months_ahead))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                write_oldest()
+        while pending:
+            write_oldest()
+    return scored
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="CSV of listings to score")
+    parser.add_argument("output", help="CSV to write the scored listings to")
+    parser.add_argument("--workers", type=int, help="worker processes, default one per CPU")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--address-column", default="address")
+    parser.add_argument(
+        "--months-ahead", type=int, default=0, help="for listings without a months_ahead column"
+    )
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    scored = bulk_score(
+        args.input,
+        args.output,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        address_column=args.address_column,
+        months_ahead=args.months_ahead,
+        restart=args.restart,
+    )
+    print(f"Scored {scored} listings into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Distance backends trading accuracy for speed.
+
+Every distance in map_utils, the facility index and the neighbour index is
+measured by one of these backends:
+
+- "geodesic": the exact WGS84 geodesic, one pure Python call per pair. To
+  keep that affordable, callers screen candidates with haversine first and
+  only measure the few that can matter exactly.
+- "haversine": great-circle distance on a sphere, vectorized. Within about
+  0.6% of the geodesic at Singapore's latitude.
+- "svy21": straight-line distance between SVY21 grid coordinates, the
+  Transverse Mercator projection Singapore surveys in, vectorized. Points
+  are projected once and can be stored projected. With the projection's
+  scale error corrected, within a millimetre of the geodesic anywhere on
+  the island.
+
+The default is "geodesic", the distances the model was trained on; set
+HDB_DISTANCE_BACKEND to change it for the whole process.
+"""
+import math
+import os
+from typing import Dict
+
+import numpy as np
+from geographiclib.geodesic import Geodesic as _Geodesic
+
+# Mean Earth radius, used by the spherical haversine formula
+EARTH_RADIUS_M = 6371008.8
+
+# WGS84 ellipsoid, which SVY21 is defined on
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+# SVY21 projection origin, scale factor and false origin
+SVY21_ORIGIN_LAT = 1 + 22 / 60 + 2.9154 / 3600
+SVY21_ORIGIN_LON = 103 + 50 / 60
+SVY21_SCALE = 1.0
+SVY21_FALSE_EASTING = 28001.642
+SVY21_FALSE_NORTHING = 38744.572
+
+
+def haversine_m(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """Vectorized great-circle distance in meters between coordinates in degrees.
+
+    Inputs broadcast against each other, so a column of locations against a row
+    of facilities yields the full distance matrix.
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2.0) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geodesic_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Exact WGS84 geodesic distance in meters between two points.
+
+    The same Karney algorithm geopy's ``geodesic`` wraps, called directly.
+    """
+    return _Geodesic.WGS84.Inverse(lat1, lon1, lat2, lon2, _Geodesic.DISTANCE)["s12"]
+
+
+def _meridian_arc(lat: np.ndarray) -> np.ndarray:
+    e2, e4, e6 = WGS84_E2, WGS84_E2**2, WGS84_E2**3
+    return WGS84_A * (
+        (1 - e2 / 4 - 3 * e4 / 64 - 5 * e6 / 256) * lat
+        - (3 * e2 / 8 + 3 * e4 / 32 + 45 * e6 / 1024) * np.sin(2 * lat)
+        + (15 * e4 / 256 + 45 * e6 / 1024) * np.sin(4 * lat)
+        - (35 * e6 / 3072) * np.sin(6 * lat)
+    )
+
+
+def svy21_project(lats, lons) -> np.ndarray:
+    """Projects WGS84 coordinates in degrees to SVY21 (easting, northing) in meters.
+
+    Returns:
+        np.ndarray: (n, 2) easting and northing of every point.
+    """
+    lat = np.radians(np.atleast_1d(np.asarray(lats, dtype=float)))
+    lon = np.radians(np.atleast_1d(np.asarray(lons, dtype=float)))
+    ep2 = WGS84_E2 / (1 - WGS84_E2)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat**2)
+    t = np.tan(lat) ** 2
+    c = ep2 * cos_lat**2
+    a = (lon - math.radians(SVY21_ORIGIN_LON)) * cos_lat
+    easting = SVY21_SCALE * n * (
+        a
+        + (1 - t + c) * a**3 / 6
+        + (5 - 18 * t + t**2 + 72 * c - 58 * ep2) * a**5 / 120
+    )
+    northing = SVY21_SCALE * (
+        _meridian_arc(lat)
+        - _meridian_arc(np.radians(SVY21_ORIGIN_LAT))
+        + n * np.tan(lat) * (
+            a**2 / 2
+            + (5 - t + 9 * c + 4 * c**2) * a**4 / 24
+            + (61 - 58 * t + t**2 + 600 * c - 330 * ep2) * a**6 / 720
+        )
+    )
+    return np.column_stack([easting + SVY21_FALSE_EASTING, northing + SVY21_FALSE_NORTHING])
+
+
+# Radius of curvature at the SVY21 origin, for the projection's scale error
+_ORIGIN_RADIUS_SQUARED = (
+    WGS84_A**2
+    * (1 - WGS84_E2)
+    / (1 - WGS84_E2 * math.sin(math.radians(SVY21_ORIGIN_LAT)) ** 2) ** 2
+)
+
+
+class DistanceBackend:
+    """Measures distances between points held in a backend-specific form.
+
+    ``prepare`` converts coordinates once, e.g. projecting them, so tables
+    that are queried repeatedly can store them prepared. ``distances`` is
+    vectorized and broadcasts like haversine_m.
+    """
+
+    name = ""
+    # Whether ``distances`` is only a screen, to be refined with ``exact``
+    screens = False
+
+    def prepare(self, lats, lons) -> np.ndarray:
+        """(n, 2) representation of the points that ``distances`` takes."""
+        raise NotImplementedError
+
+    def distances(self, points_a: np.ndarray, points_b: np.ndarray) -> np.ndarray:
+        """Distances in meters between prepared points; leading axes broadcast."""
+        raise NotImplementedError
+
+    def exact(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """The distance ``distances`` approximates, for one pair."""
+        return float(
+            self.distances(self.prepare([lat1], [lon1])[0], self.prepare([lat2], [lon2])[0])
+        )
+
+
+class HaversineBackend(DistanceBackend):
+    name = "haversine"
+    # Haversine on a sphere is within ~0.6% of the WGS84 geodesic at Singapore's
+    # latitude, so a screen keeps every point within this factor of the closest
+    tolerance = 1.01
+
+    def prepare(self, lats, lons) -> np.ndarray:
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        return np.column_stack([lats, lons])
+
+    def distances(self, points_a: np.ndarray, points_b: np.ndarray) -> np.ndarray:
+        return haversine_m(points_a[..., 0], points_a[..., 1], points_b[..., 0], points_b[..., 1])
+
+
+class GeodesicBackend(HaversineBackend):
+    """Haversine for screening, the exact geodesic for the pairs that matter."""
+
+    name = "geodesic"
+    screens = True
+
+    def exact(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        return geodesic_m(lat1, lon1, lat2, lon2)
+
+
+class SVY21Backend(DistanceBackend):
+    name = "svy21"
+
+    def prepare(self, lats, lons) -> np.ndarray:
+        return svy21_project(lats, lons)
+
+    def distances(self, points_a: np.ndarray, points_b: np.ndarray) -> np.ndarray:
+        dx = points_a[..., 0] - points_b[..., 0]
+        dy = points_a[..., 1] - points_b[..., 1]
+        # Transverse Mercator stretches distances by 1 + x^2 / 2R^2 away from
+        # the central meridian; average it along the line (Simpson's rule)
+        x1 = points_a[..., 0] - SVY21_FALSE_EASTING
+        x2 = points_b[..., 0] - SVY21_FALSE_EASTING
+        scale = SVY21_SCALE * (1 + (x1**2 + x1 * x2 + x2**2) / (6 * _ORIGIN_RADIUS_SQUARED))
+        return np.hypot(dx, dy) / scale
+
+
+BACKENDS: Dict[str, DistanceBackend] = {
+    backend.name: backend for backend in (GeodesicBackend(), HaversineBackend(), SVY21Backend())
+}
+
+_default_backend = os.environ.get("HDB_DISTANCE_BACKEND", "geodesic")
+
+
+def get_backend(name: str = None) -> DistanceBackend:
+    """Returns the named backend, or the process default when ``name`` is None.
+
+    Raises:
+        ValueError: If ``name`` is not one of BACKENDS.
+    """
+    name = name if name is not None else _default_backend
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown distance backend {name!r}, expected one of {list(BACKENDS)}"
+        ) from None
+
+
+def set_default_backend(name: str) -> None:
+    """Makes ``name`` the backend used when none is passed.
+
+    Raises:
+        ValueError: If ``name`` is not one of BACKENDS.
+    """
+    global _default_backend
+    get_backend(name)
+    _default_backend = name
@@ -0,0 +1,239 @@
+"""Preloaded nearest-facility lookups over the facility tables in ``data/``"""
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.distance import DistanceBackend, get_backend
+from utils.resources import FileBackedResource
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# facility type -> (csv file, column holding the facility name)
+FACILITY_FILES = {
+    "schools": ("primary_schools.csv", "Primary Schools"),
+    "hawker_centres_markets": (
+        "hawker_centres_markets.csv",
+        "Name of Hawker Centre / Market",
+    ),
+    "shopping_malls": ("shopping_malls.csv", "Shopping Mall"),
+    "stations": ("stations.csv", "STN_NAM_DE"),
+}
+
+
+def _check_facilities(facilities: str) -> None:
+    if facilities not in FACILITY_FILES:
+        raise ValueError(
+            'Please provide a valid string for "facilities" from "schools", "hawker_centres_markets", "shopping_malls" or "stations"!'
+        )
+
+
+class FacilityTable:
+    """Names and coordinates of one facility type held as NumPy arrays."""
+
+    def __init__(self, names: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+        self.names = names
+        self.lat = lat
+        self.lon = lon
+        self._prepared = {}
+
+    @classmethod
+    def from_csv(cls, csv_path: str, reference_column: str) -> "FacilityTable":
+        df = pd.read_csv(csv_path)
+        return cls(
+            df[reference_column].to_numpy(dtype=object),
+            df["Latitude"].to_numpy(dtype=float),
+            df["Longitude"].to_numpy(dtype=float),
+        )
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def prepared(self, backend: DistanceBackend) -> np.ndarray:
+        """The facilities' coordinates in ``backend``'s form, converted on first use."""
+        if backend.name not in self._prepared:
+            self._prepared[backend.name] = backend.prepare(self.lat, self.lon)
+        return self._prepared[backend.name]
+
+    def nearest_many(
+        self, lats: np.ndarray, lons: np.ndarray, chunk_size: int = 4096, backend: str = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest facility for every location in one vectorized pass.
+
+        With a screening backend, every facility whose screened distance is
+        within the backend's tolerance of the closest is measured exactly.
+
+        Args:
+            lats (np.ndarray): Latitudes of the locations.
+            lons (np.ndarray): Longitudes of the locations.
+            chunk_size (int): Number of locations per distance matrix, bounding memory use.
+            backend (str): Distance backend, see utils.distance. Defaults to the process default.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The distance in meters to the nearest
+            facility and its row index in the table, one entry per location.
+        """
+        backend = get_backend(backend)
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        distances = np.full(len(lats), np.inf)
+        indices = np.full(len(lats), -1, dtype=np.intp)
+        if len(self) == 0:
+            return distances, indices
+
+        points = backend.prepare(lats, lons)
+        for start in range(0, len(lats), chunk_size):
+            stop = start + chunk_size
+            approx = backend.distances(points[start:stop, None], self.prepared(backend))
+            if not backend.screens:
+                nearest = approx.argmin(axis=1)
+                indices[start:stop] = nearest
+                distances[start:stop] = approx[np.arange(len(nearest)), nearest]
+                continue
+
+            cutoff = approx.min(axis=1, keepdims=True) * backend.tolerance + 1.0
+            for row, candidates in enumerate(approx <= cutoff):
+                for index in np.flatnonzero(candidates):
+                    distance = backend.exact(
+                        lats[start + row], lons[start + row], self.lat[index], self.lon[index]
+                    )
+                    if distance < distances[start + row]:
+                        distances[start + row] = distance
+                        indices[start + row] = index
+
+        return distances, indices
+
+    def count_within(
+        self,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        radii_m,
+        chunk_size: int = 4096,
+        backend: str = None,
+    ) -> np.ndarray:
+        """Counts facilities within each radius of every location.
+
+        Distances are computed once per location; with a screening backend,
+        only pairs whose screened distance is too close to a radius to decide
+        are measured exactly.
+
+        Args:
+            lats (np.ndarray): Latitudes of the locations.
+            lons (np.ndarray): Longitudes of the locations.
+            radii_m (array-like): Radii in meters.
+            chunk_size (int): Number of locations per distance matrix, bounding memory use.
+            backend (str): Distance backend, see utils.distance. Defaults to the process default.
+
+        Returns:
+            np.ndarray: (n_locations, n_radii) counts of facilities at a distance of
+            at most each radius.
+        """
+        backend = get_backend(backend)
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        radii_m = np.atleast_1d(np.asarray(radii_m, dtype=float))
+        counts = np.zeros((len(lats), len(radii_m)), dtype=np.int64)
+        if len(self) == 0:
+            return counts
+
+        points = backend.prepare(lats, lons)
+        for start in range(0, len(lats), chunk_size):
+            stop = start + chunk_size
+            distances = backend.distances(points[start:stop, None], self.prepared(backend))
+            if backend.screens:
+                undecided = (
+                    (distances[..., None] * backend.tolerance + 1.0 >= radii_m)
+                    & (distances[..., None] / backend.tolerance - 1.0 <= radii_m)
+                ).any(axis=-1)
+                for row, index in zip(*np.nonzero(undecided)):
+                    distances[row, index] = backend.exact(
+                        lats[start + row], lons[start + row], self.lat[index], self.lon[index]
+                    )
+            counts[start:stop] = (distances[..., None] <= radii_m).sum(axis=1)
+
+        return counts
+
+
+class FacilityIndex:
+    """Loads each facility table once and answers nearest-facility queries.
+
+    Tables are read from ``data_dir`` on first use of a facility type and kept in
+    memory, so repeated queries never touch the CSV files again.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self._tables: Dict[str, FacilityTable] = {}
+
+    def table(self, facilities: str) -> FacilityTable:
+        """Returns the preloaded table for a facility type, loading it on first use.
+
+        Raises:
+            ValueError: If an invalid string is provided for the "facilities" argument.
+        """
+        _check_facilities(facilities)
+        if facilities not in self._tables:
+            file_name, reference_column = FACILITY_FILES[facilities]
+            self._tables[facilities] = FacilityTable.from_csv(
+                os.path.join(self.data_dir, file_name), reference_column
+            )
+        return self._tables[facilities]
+
+    def load_all(self) -> "FacilityIndex":
+        """Eagerly loads every facility table."""
+        for facilities in FACILITY_FILES:
+            self.table(facilities)
+        return self
+
+    def nearest(
+        self,
+        location_latitude: float,
+        location_longitude: float,
+        facilities: str,
+        backend: str = None,
+    ):
+        """Finds the nearest facility to a given location.
+
+        Returns:
+            Tuple[float, str, float, float]: The minimum distance in meters, the nearest
+            facility name, latitude and longitude. An empty table gives
+            ``(inf, None, "", "")``, matching ``map_utils.get_nearest_facility``.
+        """
+        table = self.table(facilities)
+        distances, indices = table.nearest_many(
+            location_latitude, location_longitude, backend=backend
+        )
+        index = indices[0]
+        if index < 0:
+            return float("inf"), None, "", ""
+        return (
+            float(distances[0]),
+            table.names[index],
+            float(table.lat[index]),
+            float(table.lon[index]),
+        )
+
+    def count_within(
+        self, lats: np.ndarray, lons: np.ndarray, radii_m, facilities: str, backend: str = None
+    ) -> np.ndarray:
+        """Returns (n_locations, n_radii) counts of facilities within each radius."""
+        return self.table(facilities).count_within(lats, lons, radii_m, backend=backend)
+
+    def nearest_distances(
+        self, lats: np.ndarray, lons: np.ndarray, facilities: str, backend: str = None
+    ) -> np.ndarray:
+        """Returns the distance in meters to the nearest facility for every location."""
+        distances, _ = self.table(facilities).nearest_many(lats, lons, backend=backend)
+        return distances
+
+
+FACILITY_INDEX = FileBackedResource(
+    lambda: FacilityIndex().load_all(),
+    *(os.path.join(DATA_DIR, file_name) for file_name, _ in FACILITY_FILES.values()),
+)
+
+
+def get_facility_index() -> FacilityIndex:
+    """Returns the process-wide facility index, reloading it if a facility CSV changed."""
+    return FACILITY_INDEX.get()
@@ -0,0 +1,260 @@
+"""Precomputed location features for known HDB blocks and postal codes.
+
+The distances from a block to its nearest station, hawker centre, mall and
+the CBD never change between requests, so they are computed once for every
+block in the rental dataset and every postal code the geocoding cache has
+seen, and stored as .npy columns. Lookups are dictionary hits by rounded
+coordinates or, for locations whose coordinates differ from the stored ones,
+by postal code; unknown locations fall back to computing the features on
+the fly.
+
+The store records the distance backend it was measured with and is only
+used by processes with the same default backend. Rebuild it whenever the
+rental data, the facility CSVs or HDB_DISTANCE_BACKEND change:
+
+    python -m utils.feature_store [--rental PATH] [--output DIR]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.distance import get_backend
+from utils.facilities import DATA_DIR, FACILITY_FILES
+from utils.resources import FileBackedResource
+
+DEFAULT_STORE_DIR = os.path.join(DATA_DIR, "feature_store")
+DEFAULT_RENTAL_PATH = os.path.join(DATA_DIR, "rental_with_engineered_features_cleaned.csv")
+
+# ~1 cm, well below the geocoder's precision
+COORD_DECIMALS = 7
+
+logger = logging.getLogger(__name__)
+
+
+def facility_fingerprint(data_dir: str = DATA_DIR) -> str:
+    """Hash of the facility CSVs the stored distances were computed from."""
+    digest = hashlib.sha1()
+    for file_name, _ in sorted(FACILITY_FILES.values()):
+        with open(os.path.join(data_dir, file_name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _coord_key(lat: float, lon: float) -> tuple:
+    return round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS)
+
+
+def postal_key(postal) -> str:
+    """Six digit postal code string for a code read as text or a number, "" if missing."""
+    if postal is None or (isinstance(postal, (float, np.floating)) and np.isnan(postal)):
+        return ""
+    if isinstance(postal, (int, float, np.integer, np.floating)):
+        return f"{int(postal):06d}"
+    return str(postal).strip()
+
+
+def postal_column(postals: pd.Series) -> pd.Series:
+    """Vectorized postal_key over a column, keeping missing codes as ""."""
+    if pd.api.types.is_numeric_dtype(postals):
+        codes = postals.astype("Float64").astype("Int64").astype(str).str.zfill(6)
+        return codes.where(postals.notna(), "")
+    return postals.fillna("").astype(str).str.strip()
+
+
+class FeatureStore:
+    """Location features for a fixed set of points, indexed by postal code and coordinates.
+
+    Args:
+        columns (list): Names of the feature columns.
+        coords (np.ndarray): (n, 2) latitude and longitude of every point.
+        features (np.ndarray): (n, len(columns)) feature values.
+        postals (np.ndarray): Postal code of every point, "" where unknown.
+        fingerprint (str): facility_fingerprint() at build time.
+        backend (str): Name of the distance backend the features were measured with.
+    """
+
+    def __init__(self, columns, coords, features, postals, fingerprint: str, backend: str):
+        self.columns = list(columns)
+        self.coords = coords
+        self.features = features
+        self.postals = postals
+        self.fingerprint = fingerprint
+        self.backend = backend
+        self._by_coords = {_coord_key(lat, lon): row for row, (lat, lon) in enumerate(coords)}
+        self._by_postal = {postal: row for row, postal in enumerate(postals) if postal}
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @classmethod
+    def build(cls, lats, lons, postals, compute_features, columns) -> "FeatureStore":
+        """Computes features for every distinct point with the default distance backend.
+
+        Args:
+            lats (array-like): Latitudes of the points.
+            lons (array-like): Longitudes of the points.
+            postals (array-like): Postal code per point, "" where unknown.
+            compute_features (Callable): Maps (lats, lons) arrays to an (n, k) feature matrix.
+            columns (list): Names of the k feature columns.
+        """
+        points = pd.DataFrame(
+            {
+                "lat": np.asarray(lats, dtype=float),
+                "lon": np.asarray(lons, dtype=float),
+                "postal": np.asarray(postals, dtype=str),
+            }
+        ).dropna(subset=["lat", "lon"])
+        # one row per point, keeping a postal code where any source had one
+        points = points.sort_values("postal").drop_duplicates(["lat", "lon"], keep="last")
+        coords = points[["lat", "lon"]].to_numpy()
+        features = np.asarray(compute_features(coords[:, 0], coords[:, 1]), dtype=float)
+        return cls(
+            columns, coords, features, points["postal"].to_numpy(),
+            facility_fingerprint(), get_backend().name,
+        )
+
+    def save(self, store_dir: str = DEFAULT_STORE_DIR) -> None:
+        """Writes the store as .npy columns plus a small JSON manifest."""
+        os.makedirs(store_dir, exist_ok=True)
+        np.save(os.path.join(store_dir, "coords.npy"), self.coords)
+        np.save(os.path.join(store_dir, "features.npy"), self.features)
+        np.save(os.path.join(store_dir, "postals.npy"), self.postals.astype("U6"))
+        with open(os.path.join(store_dir, "manifest.json"), "w") as f:
+            json.dump(
+                {"columns": self.columns, "fingerprint": self.fingerprint, "backend": self.backend},
+                f,
+            )
+
+    @classmethod
+    def load(cls, store_dir: str = DEFAULT_STORE_DIR) -> "FeatureStore":
+        with open(os.path.join(store_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        return cls(
+            manifest["columns"],
+            np.load(os.path.join(store_dir, "coords.npy")),
+            np.load(os.path.join(store_dir, "features.npy")),
+            np.load(os.path.join(store_dir, "postals.npy")),
+            manifest["fingerprint"],
+            manifest["backend"],
+        )
+
+    def is_stale(self) -> bool:
+        """Whether the facility CSVs or the default distance backend changed since the build."""
+        return self.fingerprint != facility_fingerprint() or self.backend != get_backend().name
+
+    def by_postal(self, postal_code: str) -> Optional[np.ndarray]:
+        """Returns the feature row for a postal code, or None if it is not stored."""
+        row = self._by_postal.get(postal_key(postal_code))
+        return self.features[row] if row is not None else None
+
+    def rows_for(self, lats, lons, postals=None) -> np.ndarray:
+        """Returns the stored row of every location, -1 where it is unknown.
+
+        Args:
+            lats (array-like): Latitudes of the locations.
+            lons (array-like): Longitudes of the locations.
+            postals (Optional[array-like]): Postal code per location, "" or NaN where
+                unknown, looked up for locations whose coordinates are not stored.
+        """
+        rows = np.fromiter(
+            (
+                self._by_coords.get(_coord_key(lat, lon), -1)
+                for lat, lon in zip(np.atleast_1d(lats), np.atleast_1d(lons))
+            ),
+            dtype=np.intp,
+        )
+        if postals is not None:
+            postals = np.broadcast_to(np.asarray(postals, dtype=object), rows.shape)
+            for i in np.flatnonzero(rows < 0):
+                rows[i] = self._by_postal.get(postal_key(postals[i]), -1)
+        return rows
+
+
+def seen_postal_locations(cache_path: str) -> pd.DataFrame:
+    """Postal codes and coordinates from the geocoding cache's SQLite file."""
+    if not os.path.exists(cache_path):
+        return pd.DataFrame(columns=["lat", "lon", "postal"])
+    with sqlite3.connect(cache_path) as db:
+        rows = db.execute("SELECT result FROM geocode WHERE result != 'null'").fetchall()
+    results = [json.loads(row[0]) for row in rows]
+    return pd.DataFrame(
+        {
+            "lat": [float(result[0]) for result in results],
+            "lon": [float(result[1]) for result in results],
+            "postal": [str(result[2]) for result in results],
+        }
+    )
+
+
+def _load_current_store(store_dir: str) -> Optional[FeatureStore]:
+    if not os.path.exists(os.path.join(store_dir, "manifest.json")):
+        return None
+    store = FeatureStore.load(store_dir)
+    if store.is_stale():
+        logger.warning(
+            "Feature store in %s is out of date with the facility data or the "
+            "distance backend, run `python -m utils.feature_store` to rebuild it",
+            store_dir,
+        )
+        return None
+    return store
+
+
+FEATURE_STORE = FileBackedResource(
+    lambda: _load_current_store(DEFAULT_STORE_DIR),
+    *(
+        os.path.join(DEFAULT_STORE_DIR, name)
+        for name in ("manifest.json", "coords.npy", "features.npy", "postals.npy")
+    ),
+    *(os.path.join(DATA_DIR, file_name) for file_name, _ in FACILITY_FILES.values()),
+)
+
+
+def get_feature_store() -> Optional[FeatureStore]:
+    """Returns the process-wide feature store, or None if it is missing or stale."""
+    store = FEATURE_STORE.get()
+    # the default backend may have been changed since the store was loaded
+    if store is not None and store.backend != get_backend().name:
+        return None
+    return store
+
+
+def main(argv=None) -> None:
+    # features depends on this module, so it is only needed when building
+    from utils.features import LOCATION_FEATURE_COLUMNS, compute_location_features
+    from utils.geocode_cache import DEFAULT_CACHE_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rental", default=DEFAULT_RENTAL_PATH, help="rental dataset CSV")
+    parser.add_argument("--geocode-cache", default=DEFAULT_CACHE_PATH, help="geocoding cache")
+    parser.add_argument("--output", default=DEFAULT_STORE_DIR, help="store directory")
+    args = parser.parse_args(argv)
+
+    rental = pd.read_csv(args.rental)
+    postal_name = next((c for c in ("postal", "postal_code") if c in rental.columns), None)
+    rental = pd.DataFrame(
+        {
+            "lat": rental["lat"],
+            "lon": rental["lon"],
+            # missing postal codes stay "" and are left out of the postal index
+            "postal": postal_column(rental[postal_name]) if postal_name else "",
+        }
+    )
+    points = pd.concat([rental, seen_postal_locations(args.geocode_cache)], ignore_index=True)
+    store = FeatureStore.build(
+        points["lat"], points["lon"], points["postal"],
+        compute_location_features, LOCATION_FEATURE_COLUMNS,
+    )
+    store.save(args.output)
+    print(f"Stored features for {len(store)} locations in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
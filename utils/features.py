@@ -0,0 +1,229 @@
+"""Builds model input features for one or many rental locations"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import tracing
+from utils.facilities import get_facility_index
+from utils.feature_store import get_feature_store
+from utils.map_utils import distances_to_cbd
+
+FLAT_TYPE = ["1-ROOM", "2-ROOM", "3-ROOM", "4-ROOM", "5-ROOM", "EXECUTIVE"]
+
+DATA_START_DATE = datetime.strptime("2021-01", "%Y-%m")
+
+# Furthest rental start accepted from callers, in months from now
+MAX_MONTHS_AHEAD = 120
+
+# Column order expected by the finalized model
+FEATURE_COLUMNS = [
+    "rent_approval_date",
+    "flat_type",
+    "lat",
+    "lon",
+    "min_geodisic_distance_to_station",
+    "min_geodisic_distance_to_hawker_market",
+    "min_geodisic_distance_to_shopping_mall",
+    "geodesic_distance_to_cbd",
+]
+
+# Features that depend only on where the flat is
+LOCATION_FEATURE_COLUMNS = FEATURE_COLUMNS[4:]
+
+
+def months_since_data_start(future_rental_date: int, now: Optional[datetime] = None) -> int:
+    """Converts a rental start some months ahead into the model's month index.
+
+    Args:
+        future_rental_date (int): Number of months from now the rental starts.
+        now (Optional[datetime]): Reference date. Defaults to the current date.
+
+    Returns:
+        int: Months between January 2021 and the rental start date.
+    """
+    current_date = now if now is not None else datetime.now()
+    future_date = current_date + timedelta(days=(int(future_rental_date) * 30))
+    return (future_date.year - DATA_START_DATE.year) * 12 + (
+        future_date.month - DATA_START_DATE.month
+    )
+
+
+def flat_type_codes(flat_types) -> np.ndarray:
+    """Maps flat type names (e.g. "3-ROOM") or integer codes to integer codes.
+
+    Raises:
+        ValueError: If a flat type name is not one of FLAT_TYPE.
+    """
+    flat_types = np.atleast_1d(np.asarray(flat_types))
+    if flat_types.dtype.kind in "iu":
+        return flat_types.astype(np.int64)
+    codes = pd.Categorical(flat_types, categories=FLAT_TYPE).codes.astype(np.int64)
+    if (codes < 0).any():
+        unknown = sorted(set(map(str, flat_types[codes < 0])))
+        raise ValueError(f"Unknown flat type(s) {unknown}, expected one of {FLAT_TYPE}")
+    return codes
+
+
+def compute_location_features(lats, lons) -> np.ndarray:
+    """Computes LOCATION_FEATURE_COLUMNS for every location from the facility data.
+
+    Returns:
+        np.ndarray: An (n, 4) matrix of distances in meters.
+    """
+    index = get_facility_index()
+    return np.column_stack(
+        [
+            index.nearest_distances(lats, lons, "stations"),
+            index.nearest_distances(lats, lons, "hawker_centres_markets"),
+            index.nearest_distances(lats, lons, "shopping_malls"),
+            distances_to_cbd(lats, lons),
+        ]
+    )
+
+
+def location_features(lats, lons, postals=None) -> np.ndarray:
+    """Returns LOCATION_FEATURE_COLUMNS for every location.
+
+    Known blocks and postal codes are read from the precomputed feature store;
+    only locations missing from it are computed on the fly.
+
+    Args:
+        lats (array-like): Latitudes of the locations.
+        lons (array-like): Longitudes of the locations.
+        postals (Optional[array-like]): Postal code per location, "" where unknown.
+            Locations whose coordinates are not in the store are looked up by it.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    store = get_feature_store()
+    if store is None:
+        return compute_location_features(lats, lons)
+
+    rows = store.rows_for(lats, lons, postals)
+    known = rows >= 0
+    result = np.empty((len(lats), len(LOCATION_FEATURE_COLUMNS)))
+    result[known] = store.features[rows[known]]
+    if not known.all():
+        result[~known] = compute_location_features(lats[~known], lons[~known])
+    return result
+
+
+def build_prediction_input(
+    lats,
+    lons,
+    flat_types,
+    future_rental_dates,
+    now: Optional[datetime] = None,
+    postals=None,
+) -> pd.DataFrame:
+    """Builds the model input frame for many locations in one vectorized pass.
+
+    Args:
+        lats (array-like): Latitudes of the rental locations.
+        lons (array-like): Longitudes of the rental locations.
+        flat_types (array-like or scalar): Flat type codes (index into FLAT_TYPE) or names.
+        future_rental_dates (array-like or scalar): Months from now each rental starts.
+        now (Optional[datetime]): Reference date. Defaults to the current date.
+        postals (Optional[array-like]): Postal code per location, see location_features.
+
+    Returns:
+        pd.DataFrame: One row per location with FEATURE_COLUMNS, ready for model.predict.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    n_rows = len(lats)
+    current_date = now if now is not None else datetime.now()
+
+    # Only a handful of distinct horizons exist, so convert each once
+    horizons = np.broadcast_to(np.asarray(future_rental_dates, dtype=np.int64), n_rows)
+    unique_horizons, inverse = np.unique(horizons, return_inverse=True)
+    months = np.array(
+        [months_since_data_start(h, current_date) for h in unique_horizons],
+        dtype=np.int64,
+    )[inverse.reshape(-1)]
+
+    with tracing.span("features.location", rows=n_rows):
+        location = location_features(lats, lons, postals)
+    data = {
+        "rent_approval_date": months,
+        "flat_type": np.broadcast_to(flat_type_codes(flat_types), n_rows).copy(),
+        "lat": lats,
+        "lon": lons,
+    }
+    for column, values in zip(LOCATION_FEATURE_COLUMNS, location.T):
+        data[column] = values
+    return pd.DataFrame(data, columns=FEATURE_COLUMNS)
+
+
+def get_prediction_input(lat: float, long: float, flat_type: int, future_rental_date: int) -> pd.DataFrame:
+    """Builds the single-row model input for one location.
+
+    Thin wrapper over build_prediction_input, which scores many locations in
+    one pass and yields identical columns.
+    """
+    return build_prediction_input(lat, long, flat_type, future_rental_date)
+
+
+def build_sweep_input(
+    lat: float,
+    lon: float,
+    future_rental_dates,
+    now: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """Builds the model input for every flat type and rental start at one location.
+
+    The location features are looked up once and shared by every row.
+
+    Args:
+        lat (float): Latitude of the rental location.
+        lon (float): Longitude of the rental location.
+        future_rental_dates (array-like): Months from now each rental could start.
+        now (Optional[datetime]): Reference date. Defaults to the current date.
+
+    Returns:
+        pd.DataFrame: len(FLAT_TYPE) * len(future_rental_dates) rows with FEATURE_COLUMNS,
+        ordered by flat type and then rental start.
+    """
+    horizons = np.atleast_1d(np.asarray(future_rental_dates, dtype=np.int64))
+    current_date = now if now is not None else datetime.now()
+    months = np.array([months_since_data_start(h, current_date) for h in horizons], dtype=np.int64)
+    n_rows = len(FLAT_TYPE) * len(horizons)
+
+    with tracing.span("features.location", rows=1):
+        location = location_features([lat], [lon])[0]
+    data = {
+        "rent_approval_date": np.tile(months, len(FLAT_TYPE)),
+        "flat_type": np.repeat(np.arange(len(FLAT_TYPE), dtype=np.int64), len(horizons)),
+        "lat": np.full(n_rows, float(lat)),
+        "lon": np.full(n_rows, float(lon)),
+    }
+    for column, value in zip(LOCATION_FEATURE_COLUMNS, location):
+        data[column] = np.full(n_rows, value)
+    return pd.DataFrame(data, columns=FEATURE_COLUMNS)
+
+
+def build_prediction_input_frame(
+    listings: pd.DataFrame, now: Optional[datetime] = None
+) -> pd.DataFrame:
+    """Builds the model input frame from a DataFrame of listings.
+
+    Args:
+        listings (pd.DataFrame): Columns "lat", "lon", "flat_type" and "months_ahead",
+            and optionally "postal".
+        now (Optional[datetime]): Reference date. Defaults to the current date.
+
+    Returns:
+        pd.DataFrame: The feature frame, indexed like ``listings``.
+    """
+    features = build_prediction_input(
+        listings["lat"].to_numpy(),
+        listings["lon"].to_numpy(),
+        listings["flat_type"].to_numpy(),
+        listings["months_ahead"].to_numpy(),
+        now=now,
+        postals=listings["postal"].to_numpy(dtype=object) if "postal" in listings.columns else None,
+    )
+    features.index = listings.index
+    return features
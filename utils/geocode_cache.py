@@ -0,0 +1,157 @@
+"""Two-tier (in-memory LRU + SQLite) cache for OneMap geocoding results"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from utils.facilities import DATA_DIR
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "GEOCODE_CACHE_PATH", os.path.join(DATA_DIR, "geocode_cache.sqlite3")
+)
+DEFAULT_TTL = float(os.environ.get("GEOCODE_CACHE_TTL", 30 * 24 * 3600))
+DEFAULT_NEGATIVE_TTL = float(os.environ.get("GEOCODE_CACHE_NEGATIVE_TTL", 24 * 3600))
+DEFAULT_MAXSIZE = 1024
+
+_MISSING = object()
+
+
+def normalize_query(location: str) -> str:
+    """Normalizes a search string so "  210039" and "210039 " share a cache entry."""
+    return " ".join(str(location).upper().split())
+
+
+class GeocodeCache:
+    """Caches geocoding results in memory and in a SQLite file.
+
+    Lookups go to the in-memory LRU first and fall back to SQLite, promoting
+    disk hits into memory. A result of ``None`` records a query OneMap had no
+    match for, and is kept for ``negative_ttl`` seconds instead of ``ttl``.
+
+    Args:
+        path (Optional[str]): SQLite file to persist entries to, or None for memory only.
+        ttl (float): Seconds a found address stays valid.
+        negative_ttl (float): Seconds a "no match" result stays valid.
+        maxsize (int): Number of entries held in the in-memory tier.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        maxsize: int = DEFAULT_MAXSIZE,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path is not None:
+            # bulk scoring shares the file between processes: WAL lets readers
+            # run alongside a writer, and writers wait for each other
+            self._db = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode "
+                "(query TEXT PRIMARY KEY, result TEXT, stored_at REAL)"
+            )
+            self._db.commit()
+
+    def _expired(self, result, stored_at: float) -> bool:
+        ttl = self.ttl if result is not None else self.negative_ttl
+        return time.time() - stored_at > ttl
+
+    def _remember(self, key: str, result, stored_at: float) -> None:
+        self._memory[key] = (result, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, location: str) -> Tuple[bool, Optional[tuple]]:
+        """Looks up a location.
+
+        Returns:
+            Tuple[bool, Optional[tuple]]: Whether the query was cached, and the cached
+            result, which is None for a cached "no match".
+        """
+        key = normalize_query(location)
+        with self._lock:
+            entry = self._memory.get(key, _MISSING)
+            if entry is not _MISSING and not self._expired(*entry):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return True, entry[0]
+            self._memory.pop(key, None)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result, stored_at FROM geocode WHERE query = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    result = tuple(result) if result is not None else None
+                    if not self._expired(result, row[1]):
+                        self._remember(key, result, row[1])
+                        self.disk_hits += 1
+                        return True, result
+                    self._db.execute("DELETE FROM geocode WHERE query = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return False, None
+
+    def put(self, location: str, result: Optional[tuple]) -> None:
+        """Stores a result, or None to record that the location has no match."""
+        key = normalize_query(location)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, result, stored_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?)",
+                    (key, json.dumps(result), stored_at),
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Drops every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM geocode")
+                self._db.commit()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters."""
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+        }
+
+
+_GEOCODE_CACHE = None
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """Returns the process-wide geocoding cache, opening it on first use."""
+    global _GEOCODE_CACHE
+    if _GEOCODE_CACHE is None:
+        _GEOCODE_CACHE = GeocodeCache()
+    return _GEOCODE_CACHE
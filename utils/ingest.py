@@ -0,0 +1,149 @@
+"""Appends new rental approvals to the rental dataset without a full rebuild.
+
+New approvals arrive as a delta CSV in the shape of the published HDB data
+(rent_approval_date as "YYYY-MM", block, street_name, flat_type,
+monthly_rent, optionally lat/lon). Only the new rows are geocoded and get
+their engineered location features; they are then published as a new
+version of the memory-mapped rental store, and the rental CSV is replaced
+with a copy that has them appended. Running servers pick the new version up
+on their next lookup and extend their neighbour index and rent statistics
+with just the new rows.
+
+    python -m utils.ingest DELTA_CSV [--rental PATH] [--store DIR]
+"""
+import argparse
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from utils.features import DATA_START_DATE, LOCATION_FEATURE_COLUMNS, location_features
+from utils.map_utils import get_address_details
+from utils.rental_store import (
+    append_store,
+    read_manifest,
+    read_store,
+    source_version,
+    write_store,
+)
+from utils.resources import RENTAL_PATH, RENTAL_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def approval_month_index(dates: pd.Series) -> np.ndarray:
+    """Converts "YYYY-MM" approval dates to months since DATA_START_DATE, as the model uses."""
+    dates = pd.to_datetime(dates, format="%Y-%m")
+    return (
+        (dates.dt.year - DATA_START_DATE.year) * 12 + (dates.dt.month - DATA_START_DATE.month)
+    ).to_numpy()
+
+
+def _geocode(addresses: pd.Series) -> pd.DataFrame:
+    """Latitude, longitude and postal code of every distinct address, NaN where not found."""
+    found = {}
+    for address in addresses.dropna().unique():
+        lat, lon, postal, _, _ = get_address_details(address, logger=logger)
+        if lat == "":
+            logger.warning("Could not geocode %s, skipping its records", address)
+            found[address] = (np.nan, np.nan, np.nan)
+        else:
+            found[address] = (float(lat), float(lon), int(postal) if postal.isdigit() else np.nan)
+    return pd.DataFrame(
+        [found.get(address, (np.nan, np.nan, np.nan)) for address in addresses],
+        columns=["lat", "lon", "postal"],
+        index=addresses.index,
+    )
+
+
+def prepare_delta(delta: pd.DataFrame, existing: pd.DataFrame) -> pd.DataFrame:
+    """Fills in the columns the rental dataset has but the new records lack.
+
+    Args:
+        delta (pd.DataFrame): The new records.
+        existing (pd.DataFrame): The rental dataset, or a sample with its columns and dtypes.
+
+    Returns:
+        pd.DataFrame: The new records with the dataset's columns, in its order.
+    """
+    delta = delta.copy()
+    if "address" in existing.columns and "address" not in delta.columns:
+        delta["address"] = delta["block"].astype(str) + " " + delta["street_name"]
+
+    if "lat" not in delta.columns or "lon" not in delta.columns:
+        located = _geocode(delta["address"])
+        delta["lat"], delta["lon"] = located["lat"], located["lon"]
+        delta, located = delta[located["lat"].notna()], located[located["lat"].notna()]
+        for postal_column in ("postal", "postal_code"):
+            if postal_column in existing.columns and postal_column not in delta.columns:
+                delta[postal_column] = located["postal"]
+
+    if pd.api.types.is_numeric_dtype(existing["rent_approval_date"]) and not (
+        pd.api.types.is_numeric_dtype(delta["rent_approval_date"])
+    ):
+        delta["rent_approval_date"] = approval_month_index(delta["rent_approval_date"])
+
+    missing = [c for c in LOCATION_FEATURE_COLUMNS if c in existing.columns and c not in delta.columns]
+    if missing:
+        computed = pd.DataFrame(
+            location_features(delta["lat"], delta["lon"]),
+            columns=LOCATION_FEATURE_COLUMNS,
+            index=delta.index,
+        )
+        for column in missing:
+            delta[column] = computed[column]
+
+    extra = [c for c in delta.columns if c not in existing.columns]
+    if extra:
+        logger.warning("Dropping columns the rental dataset does not have: %s", extra)
+    return delta[[c for c in existing.columns if c in delta.columns]]
+
+
+def ingest(delta_path: str, rental_path: str = RENTAL_PATH, store_dir: str = RENTAL_STORE_DIR) -> int:
+    """Appends the records in ``delta_path`` to the rental CSV and publishes a new store version.
+
+    If the store is missing or out of date with the CSV, it is rebuilt from
+    the whole CSV instead of appended to.
+
+    Returns:
+        int: The number of records appended.
+    """
+    manifest = read_manifest(store_dir)
+    incremental = manifest is not None and manifest["source"] == source_version(rental_path)
+    existing = read_store(store_dir) if incremental else pd.read_csv(rental_path, nrows=1000)
+
+    delta = prepare_delta(pd.read_csv(delta_path), existing)
+    if delta.empty:
+        return 0
+    # servers must never see a half-written CSV, so the rows are appended to a
+    # copy, the store is published and only then the copy replaces the CSV
+    updated_path = rental_path + ".tmp"
+    shutil.copyfile(rental_path, updated_path)
+    delta.reindex(columns=existing.columns).to_csv(
+        updated_path, mode="a", header=False, index=False
+    )
+    # renaming keeps the modification time and size the store records
+    if incremental:
+        append_store(delta, store_dir, source_version(updated_path))
+    else:
+        write_store(pd.read_csv(updated_path), store_dir, source_version(updated_path))
+    os.replace(updated_path, rental_path)
+    return len(delta)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("delta", help="CSV of new rental approvals")
+    parser.add_argument("--rental", default=RENTAL_PATH, help="rental dataset CSV")
+    parser.add_argument("--store", default=RENTAL_STORE_DIR, help="rental store directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    appended = ingest(args.delta, args.rental, args.store)
+    print(f"Appended {appended} records to {args.rental} and {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Offline geocoder for HDB blocks already in the rental dataset.
+
+Most searches are for blocks that appear in the rental records with their
+coordinates, so those are answered from memory before going to OneMap.
+Every block is indexed by its normalised address ("123 ANG MO KIO AVE 3")
+and, when the dataset has one, its postal code. Street words are reduced to
+the abbreviations HDB uses, so "ANG MO KIO AVENUE 3" finds the same block.
+Partial addresses are matched by whole-word prefix against the sorted keys
+and answered only when they single out one block; postal codes must match
+exactly. Anything else goes to OneMap.
+"""
+import bisect
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Shortest partial query answered by prefix; shorter ones match too much
+MIN_PREFIX_LENGTH = 4
+
+# Street words as spelt out by OneMap and users, and as abbreviated by HDB
+ABBREVIATIONS = {
+    "AVENUE": "AVE",
+    "BUKIT": "BT",
+    "CENTRAL": "CTRL",
+    "CLOSE": "CL",
+    "CRESCENT": "CRES",
+    "DRIVE": "DR",
+    "GARDENS": "GDNS",
+    "HEIGHTS": "HTS",
+    "JALAN": "JLN",
+    "KAMPONG": "KG",
+    "LORONG": "LOR",
+    "NORTH": "NTH",
+    "PLACE": "PL",
+    "ROAD": "RD",
+    "SOUTH": "STH",
+    "STREET": "ST",
+    "TANJONG": "TG",
+    "TERRACE": "TER",
+    "UPPER": "UPP",
+}
+
+_BLOCK_PREFIX = re.compile(r"^(BLK|BLOCK)\s+")
+_SINGAPORE_SUFFIX = re.compile(r"\s+SINGAPORE(\s+\d{6})?$")
+
+Details = Tuple[str, str, str, str, str]
+
+
+def normalize_address(location: str) -> str:
+    """Upper-cases, drops "BLK" and "SINGAPORE" and abbreviates street words."""
+    text = " ".join(str(location).upper().replace(",", " ").split())
+    text = _SINGAPORE_SUFFIX.sub("", _BLOCK_PREFIX.sub("", text))
+    return " ".join(ABBREVIATIONS.get(word, word) for word in text.split())
+
+
+class LocalGeocoder:
+    """Exact and unique-prefix lookups over the blocks of a rental dataset.
+
+    Args:
+        addresses (List[str]): Address of every block, "BLOCK STREET".
+        lat (np.ndarray): Latitude of every block.
+        lon (np.ndarray): Longitude of every block.
+        postals (List[str]): Postal code of every block, "" where unknown.
+    """
+
+    def __init__(self, addresses: List[str], lat: np.ndarray, lon: np.ndarray, postals: List[str]):
+        self.details: List[Details] = [
+            (str(la), str(lo), postal, address, "")
+            for address, la, lo, postal in zip(addresses, lat.tolist(), lon.tolist(), postals)
+        ]
+        self._by_key: Dict[str, int] = {}
+        for block, (address, postal) in enumerate(zip(addresses, postals)):
+            self._by_key[normalize_address(address)] = block
+            if postal:
+                self._by_key[postal] = block
+        self._keys = sorted(self._by_key)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "LocalGeocoder":
+        """Indexes the latest coordinates of every address and postal code in a rental dataset."""
+        columns = {"address": df["address"], "lat": df["lat"], "lon": df["lon"]}
+        postal_column = next((c for c in ("postal", "postal_code") if c in df.columns), None)
+        if postal_column is not None:
+            columns["postal"] = df[postal_column]
+        blocks = pd.DataFrame(columns).dropna(subset=["address", "lat", "lon"])
+        # an address is indexed to its latest block, and every postal code is kept
+        blocks = blocks.drop_duplicates(list(blocks.columns.intersection(["address", "postal"])), keep="last")
+        if postal_column is not None:
+            postals = blocks["postal"]
+            if pd.api.types.is_numeric_dtype(postals):
+                postals = postals.astype("Float64").astype("Int64").astype(str).str.zfill(6)
+            blocks["postal"] = postals.astype(str).where(blocks["postal"].notna(), "")
+        return cls(
+            blocks["address"].astype(str).tolist(),
+            blocks["lat"].to_numpy(dtype=float),
+            blocks["lon"].to_numpy(dtype=float),
+            blocks["postal"].tolist() if "postal" in blocks.columns else [""] * len(blocks),
+        )
+
+    def __len__(self) -> int:
+        return len(self.details)
+
+    def lookup(self, location: str) -> Optional[Details]:
+        """Returns get_address_details-style details, or None if no single block matches."""
+        query = normalize_address(location)
+        block = self._by_key.get(query)
+        if block is None and len(query) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_left(self._keys, query)
+            matches = set()
+            while position < len(self._keys) and self._keys[position].startswith(query):
+                key = self._keys[position]
+                position += 1
+                # "TAMPINES ST 1" is not a partial "TAMPINES ST 11": only whole words match
+                if key[len(query)] != " ":
+                    continue
+                matches.add(self._by_key[key])
+                if len(matches) > 1:
+                    return None
+            block = matches.pop() if matches else None
+        return self.details[block] if block is not None else None
+
+
+_LOCAL_GEOCODER = None
+_LOCAL_GEOCODER_FRAME = None
+
+
+def get_local_geocoder(df: pd.DataFrame) -> LocalGeocoder:
+    """Returns the cached geocoder for ``df``, rebuilding it when a different frame is passed."""
+    global _LOCAL_GEOCODER, _LOCAL_GEOCODER_FRAME
+    if _LOCAL_GEOCODER is None or _LOCAL_GEOCODER_FRAME is not df:
+        _LOCAL_GEOCODER = LocalGeocoder.from_frame(df)
+        _LOCAL_GEOCODER_FRAME = df
+    return _LOCAL_GEOCODER
@@ -0,0 +1,219 @@
+"""Folium layers for drawing many rental records and predictions on the map at once"""
+import base64
+import struct
+import zlib
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.distance import haversine_m
+
+# Most neighbours drawn at once; the closest to the searched location are kept
+MAX_NEIGHBOUR_MARKERS = 500
+
+# ~10 cm, plenty for a marker and a third of the digits of a float's repr
+COORD_DECIMALS = 6
+
+ABOVE_COLOUR = "red"
+BELOW_COLOUR = "green"
+
+# Heatmap colours from the cheapest to the dearest cells, as RGB
+HEATMAP_COLOURS = np.array([[26, 152, 80], [255, 255, 191], [215, 48, 39]], dtype=float)
+HEATMAP_OPACITY = 0.6
+# Rents below and above these percentiles share the end colours, so a few
+# outlying cells do not wash out the rest of the map
+HEATMAP_PERCENTILES = (5, 95)
+# Smooth rasters compress as well at the fastest level, at a tenth of the time
+PNG_COMPRESSION_LEVEL = 1
+
+Bounds = Tuple[Tuple[float, float], Tuple[float, float]]
+
+
+def select_neighbours(
+    neighbours: pd.DataFrame,
+    lat_lon: tuple,
+    limit: int = MAX_NEIGHBOUR_MARKERS,
+    bounds: Optional[Bounds] = None,
+) -> pd.DataFrame:
+    """Keeps the neighbours worth drawing.
+
+    Args:
+        neighbours (pd.DataFrame): Rental records with "lat" and "lon" columns.
+        lat_lon (tuple): The searched location.
+        limit (int): Most records to keep; the closest to ``lat_lon`` win.
+        bounds (Optional[Bounds]): ((south, west), (north, east)) of the visible map.
+            Records outside it are dropped first.
+
+    Returns:
+        pd.DataFrame: At most ``limit`` records, in their original order.
+    """
+    lat = neighbours["lat"].to_numpy(dtype=float)
+    lon = neighbours["lon"].to_numpy(dtype=float)
+    keep = np.ones(len(neighbours), dtype=bool)
+    if bounds is not None:
+        (south, west), (north, east) = bounds
+        keep = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+    candidates = np.flatnonzero(keep)
+    if len(candidates) > limit:
+        distances = haversine_m(lat_lon[0], lat_lon[1], lat[candidates], lon[candidates])
+        candidates = np.sort(candidates[np.argpartition(distances, limit - 1)[:limit]])
+    return neighbours.iloc[candidates]
+
+
+def neighbours_geojson(neighbours: pd.DataFrame, predicted_rent: float) -> dict:
+    """A GeoJSON FeatureCollection of neighbours, coloured by rent against the prediction."""
+    lat = np.round(neighbours["lat"].to_numpy(dtype=float), COORD_DECIMALS)
+    lon = np.round(neighbours["lon"].to_numpy(dtype=float), COORD_DECIMALS)
+    rent = neighbours["monthly_rent"].to_numpy()
+    colour = np.where(rent > predicted_rent, ABOVE_COLOUR, BELOW_COLOUR)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(x), float(y)]},
+                "properties": {
+                    "address": str(address),
+                    "flat_type": str(flat_type),
+                    "lease_start": str(lease_start),
+                    "monthly_rent": f"${float(monthly_rent):,.0f}",
+                    "colour": str(c),
+                },
+            }
+            for y, x, address, flat_type, lease_start, monthly_rent, c in zip(
+                lat.tolist(),
+                lon.tolist(),
+                neighbours["address"].to_numpy(dtype=object),
+                neighbours["flat_type"].to_numpy(dtype=object),
+                neighbours["rent_approval_date"].to_numpy(dtype=object),
+                rent.tolist(),
+                colour.tolist(),
+            )
+        ],
+    }
+
+
+def neighbour_layer(
+    neighbours: pd.DataFrame,
+    lat_lon: tuple,
+    predicted_rent: float,
+    limit: int = MAX_NEIGHBOUR_MARKERS,
+    bounds: Optional[Bounds] = None,
+):
+    """Builds one folium GeoJson layer of circle markers for the neighbouring rentals.
+
+    A single layer serialises to a fraction of the HTML of one Marker, Icon and
+    Popup per record, and its size is bounded by ``limit``.
+
+    Args:
+        neighbours (pd.DataFrame): Records from map_utils.find_neighbours.
+        lat_lon (tuple): The searched location.
+        predicted_rent (float): Records renting above it are drawn red, the rest green.
+        limit (int): Most records to draw; the closest to ``lat_lon`` win.
+        bounds (Optional[Bounds]): Only draw records inside ((south, west), (north, east)).
+
+    Returns:
+        folium.GeoJson: The layer, to add to the map's feature group.
+    """
+    import folium
+    from folium.utilities import JsCode
+
+    shown = select_neighbours(neighbours, lat_lon, limit, bounds)
+    return folium.GeoJson(
+        neighbours_geojson(shown, predicted_rent),
+        name="Neighbours",
+        marker=folium.CircleMarker(radius=7, weight=1, fill=True, fill_opacity=0.8),
+        # styled in the browser: a Python style_function would embed the id of
+        # every feature in a lookup table and double the payload
+        on_each_feature=JsCode(
+            """function(feature, layer) {
+                layer.setStyle({color: feature.properties.colour, fillColor: feature.properties.colour});
+            }"""
+        ),
+        popup=folium.GeoJsonPopup(
+            fields=["address", "flat_type", "lease_start", "monthly_rent"],
+            aliases=["", "Type:", "Lease Start:", "Monthly Rental:"],
+        ),
+    )
+
+
+def heatmap_range(raster: np.ndarray) -> Tuple[float, float]:
+    """The rents mapped to the cheapest and dearest heatmap colours."""
+    low, high = np.nanpercentile(raster, HEATMAP_PERCENTILES)
+    return float(low), float(high)
+
+
+def heatmap_image(
+    raster: np.ndarray, rent_range: Optional[Tuple[float, float]] = None
+) -> np.ndarray:
+    """Colours a rent raster, southern row first, as an RGBA image, northern row first.
+
+    Args:
+        raster (np.ndarray): (n_rows, n_cols) rents, NaN for empty cells.
+        rent_range (Optional[Tuple[float, float]]): Rents given the end colours.
+            Defaults to heatmap_range(raster).
+
+    Returns:
+        np.ndarray: (n_rows, n_cols, 4) uint8 image; empty cells are transparent.
+    """
+    low, high = rent_range if rent_range is not None else heatmap_range(raster)
+    raster = np.asarray(raster, dtype=float)[::-1]
+    scaled = np.nan_to_num(np.clip((raster - low) / max(high - low, 1.0), 0.0, 1.0))
+    stops = np.linspace(0.0, 1.0, len(HEATMAP_COLOURS))
+    image = np.zeros(raster.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        image[..., channel] = np.interp(scaled, stops, HEATMAP_COLOURS[:, channel])
+    image[..., 3] = np.where(np.isnan(raster), 0, 255)
+    return image
+
+
+def png_data_url(image: np.ndarray) -> str:
+    """Encodes an (n_rows, n_cols, 4) uint8 RGBA image as a PNG data URL."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        checksum = struct.pack(">I", zlib.crc32(kind + data))
+        return struct.pack(">I", len(data)) + kind + data + checksum
+
+    n_rows, n_cols = image.shape[:2]
+    # every scanline starts with filter type 0, none
+    scanlines = np.zeros((n_rows, n_cols * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = image.reshape(n_rows, -1)
+    png = b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", struct.pack(">IIBBBBB", n_cols, n_rows, 8, 6, 0, 0, 0)),
+            chunk(b"IDAT", zlib.compress(scanlines.tobytes(), PNG_COMPRESSION_LEVEL)),
+            chunk(b"IEND", b""),
+        ]
+    )
+    return "data:image/png;base64," + base64.b64encode(png).decode()
+
+
+def rent_heatmap_layer(
+    raster: np.ndarray,
+    bounds: Bounds,
+    rent_range: Optional[Tuple[float, float]] = None,
+):
+    """Builds a folium image overlay of a rent_grid raster.
+
+    The raster is sent to the browser as one PNG, whatever the number of cells.
+
+    Args:
+        raster (np.ndarray): A RentGrid.raster, southern row first.
+        bounds (Bounds): RentGrid.bounds, ((south, west), (north, east)).
+        rent_range (Optional[Tuple[float, float]]): Rents given the end colours.
+            Defaults to heatmap_range(raster).
+
+    Returns:
+        folium.raster_layers.ImageOverlay: The layer, to add to the map's feature group.
+    """
+    from folium.raster_layers import ImageOverlay
+
+    # folium's own encoder compresses at the slowest level
+    return ImageOverlay(
+        png_data_url(heatmap_image(raster, rent_range)),
+        bounds=[list(bounds[0]), list(bounds[1])],
+        opacity=HEATMAP_OPACITY,
+        name="Predicted rent",
+    )
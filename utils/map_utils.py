@@ -1,40 +1,146 @@
 """Helper class that all things map related"""
-import logging
-import requests
 import numpy as np
 import pandas as pd
 import os
-from typing import Union, Tuple
 
-import geopandas as gpd
-from geopy.distance import geodesic
+from utils import tracing
+from utils.distance import get_backend
+from utils.facilities import DATA_DIR, FACILITY_FILES, get_facility_index
+from utils.geocode_cache import get_geocode_cache
+from utils.local_geocoder import get_local_geocoder
+from utils.neighbours import get_neighbour_index
+from utils.resources import FileBackedResource, get_rental_frame
+from utils.routing import get_route_fetcher
 
-from requests.exceptions import ConnectTimeout, ReadTimeout
+ONEMAP_URL = os.environ.get("ONEMAP_URL", "https://developers.onemap.sg")
+ONEMAP_SEARCH_URL = ONEMAP_URL + "/commonapi/search"
+ONEMAP_ROUTE_URL = ONEMAP_URL + "/privateapi/routingsvc/route"
 
-POSTAL_DISTRICT = pd.read_csv(
-    "./data/postal_district.csv", dtype={"postal_prefix": str}
-)
+# Raffles Place MRT station
+CBD_COORDS = (1.283933262, 103.8514631)
 
+POSTAL_DISTRICT_PATH = os.path.join(DATA_DIR, "postal_district.csv")
 
-def get_address_details(location: str, logger=None):  # -> tuple[float, float, str]:
-    """Calls OneMap API to retrieve the latitude, longitude, and postal code of a location.
+# Which lookup_address source answered a search
+SOURCE_LOCAL = "local"
+SOURCE_CACHE = "cache"
+SOURCE_ONEMAP = "onemap"
+
+
+class PostalTable:
+    """The postal prefix table compiled for O(1) and vectorized lookups."""
+
+    def __init__(self, postal_district: pd.DataFrame):
+        self.postal_district = postal_district
+        # Two digit postal prefix -> (zone, district)
+        self.lookup = {
+            prefix: (zone, int(district))
+            for prefix, zone, district in postal_district[
+                ["postal_prefix", "zone", "district"]
+            ].itertuples(index=False)
+        }
+        # The same table as 100 slots indexed by the numeric prefix, plus a
+        # final slot holding the value for unknown prefixes
+        self.zones = np.full(101, None, dtype=object)
+        self.districts = np.full(101, None, dtype=object)
+        for prefix, (zone, district) in self.lookup.items():
+            self.zones[int(prefix)] = zone
+            self.districts[int(prefix)] = district
+
+    @classmethod
+    def from_csv(cls, csv_path: str = POSTAL_DISTRICT_PATH) -> "PostalTable":
+        return cls(pd.read_csv(csv_path, dtype={"postal_prefix": str}))
+
+
+POSTAL_TABLE = FileBackedResource(PostalTable.from_csv, POSTAL_DISTRICT_PATH)
+
+
+def get_address_details(location: str, logger=None, cache=None):  # -> tuple[float, float, str]:
+    """Retrieves the latitude, longitude, and postal code of a location.
+
+    Blocks in the rental dataset are answered locally; anything else goes to
+    the OneMap API. See lookup_address.
 
     Args:
         location (str): The address or location to search for.
         logger (Optional): Logger object for logging. Defaults to None.
+        cache (Optional[GeocodeCache]): Cache to use. Defaults to the process-wide cache.
 
     Returns:
         tuple[float, float, str]: A tuple containing the latitude, longitude, and postal code.
-                                  If the details cannot be obtained, an empty string is returned.
+                                  If the details cannot be obtained, empty strings are returned.
 
     Raises:
         ConnectTimeout: If the connection times out while making the API request.
         ReadTimeout: If the read operation times out while receiving the API response.
     """
+    return lookup_address(location, logger=logger, cache=cache)[0]
+
+
+def _local_geocoder():
     try:
-        url = f"https://developers.onemap.sg/commonapi/search?searchVal={location}&returnGeom=Y&getAddrDetails=Y&pageNum=1"
-        req = requests.get(url, timeout=15.0)
-        resultsdict = eval(req.text)
+        return get_local_geocoder(get_rental_frame())
+    except OSError:
+        # no rental dataset on this machine, every search goes to OneMap
+        return None
+
+
+def lookup_address(location: str, logger=None, cache=None, local: bool = True):  # -> tuple[tuple, str]:
+    """Geocodes a location and reports which source answered.
+
+    Blocks in the rental dataset, searched by their exact postal code, their
+    address or an unambiguous whole-word prefix of the address, are answered
+    from the local index without touching the network. Other searches are served from the geocoding cache,
+    then the OneMap API. OneMap results, including searches with no match,
+    are cached by the normalized query.
+
+    Args:
+        location (str): The address or location to search for.
+        logger (Optional): Logger object for logging. Defaults to None.
+        cache (Optional[GeocodeCache]): Cache to use. Defaults to the process-wide cache.
+        local (bool): Whether to try the local index first.
+
+    Returns:
+        tuple[tuple, str]: The get_address_details tuple and the source that answered,
+                           SOURCE_LOCAL, SOURCE_CACHE or SOURCE_ONEMAP, or "" if the
+                           OneMap request timed out.
+
+    Raises:
+        ConnectTimeout: If the connection times out while making the API request.
+        ReadTimeout: If the read operation times out while receiving the API response.
+    """
+    if local:
+        with tracing.span("geocode.local") as span:
+            geocoder = _local_geocoder()
+            result = geocoder.lookup(location) if geocoder is not None else None
+            span.set(hit=result is not None)
+        if result is not None:
+            return result, SOURCE_LOCAL
+
+    cache = cache if cache is not None else get_geocode_cache()
+    with tracing.span("geocode.cache"):
+        cached, result = cache.get(location)
+    if cached:
+        return (result if result is not None else ("", "", "", "", "")), SOURCE_CACHE
+
+    # requests is only needed once a lookup misses the cache
+    import requests
+    from requests.exceptions import ConnectTimeout, ReadTimeout
+
+    try:
+        with tracing.span("onemap.search") as span:
+            req = requests.get(
+                ONEMAP_SEARCH_URL,
+                params={
+                    "searchVal": location,
+                    "returnGeom": "Y",
+                    "getAddrDetails": "Y",
+                    "pageNum": 1,
+                },
+                timeout=15.0,
+            )
+            span.set(status=req.status_code)
+        resultsdict = req.json()
 
         if len(resultsdict["results"]) > 0:
             lat = resultsdict["results"][0]["LATITUDE"]
@@ -46,8 +152,11 @@ def get_address_details(location: str, logger=None):  # -> tuple[float, float, s
                 + resultsdict["results"][0]["ROAD_NAME"]
             )
             buildingname = resultsdict["results"][0]["BUILDING"]
-            print(resultsdict["results"][0])
-            return lat, long, postal, address, buildingname
+            cache.put(location, (lat, long, postal, address, buildingname))
+            return (lat, long, postal, address, buildingname), SOURCE_ONEMAP
+
+        cache.put(location, None)
+        return ("", "", "", "", ""), SOURCE_ONEMAP
 
     except ConnectTimeout:
         if logger != None:
@@ -57,7 +166,7 @@ def get_address_details(location: str, logger=None):  # -> tuple[float, float, s
         if logger != None:
             logger.info("Request has read timed out")
 
-    return "", "", "", ""
+    return ("", "", "", "", ""), ""
 
 
 def get_district_and_zone(postal_code: str):  # -> tuple[str, str]:
@@ -68,20 +177,45 @@ def get_district_and_zone(postal_code: str):  # -> tuple[str, str]:
 
     Returns:
         tuple[str, str]: A tuple containing the zone and district of the postal code.
-                        If the information is not available, an empty string is returned.
+                        If the information is not available, including postal codes
+                        with an unknown prefix, empty strings are returned.
     """
     if len(postal_code) > 2:
-        postal_id = postal_code[:2]
-        result = POSTAL_DISTRICT.loc[
-            POSTAL_DISTRICT["postal_prefix"] == postal_id, ["zone", "district"]
-        ]
-        return result.iloc[0, 0], result.iloc[0, 1]
+        return POSTAL_TABLE.get().lookup.get(postal_code[:2], ("", ""))
 
     return "", ""
 
 
+def get_districts_and_zones(postal_codes: pd.Series) -> pd.DataFrame:
+    """Retrieve the zone and district for a whole Series of postal codes at once.
+
+    Args:
+        postal_codes (pd.Series): Postal codes as strings.
+
+    Returns:
+        pd.DataFrame: "zone" and "district" columns indexed like postal_codes. Codes
+                      that are too short, not numeric or have an unknown prefix get
+                      a missing zone and district.
+    """
+    codes = postal_codes.fillna("").to_numpy(dtype=str)
+    # casting to a 2-character dtype keeps just the prefix, whose code points
+    # give the digits directly
+    digits = codes.astype("U2").view(np.uint32).reshape(-1, 2).astype(np.int64) - ord("0")
+    valid = (np.char.str_len(codes) > 2) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    slots = np.where(valid, digits[:, 0] * 10 + digits[:, 1], -1)
+    table = POSTAL_TABLE.get()
+    # slot -1 is the trailing "unknown" entry of each table
+    return pd.DataFrame(
+        {
+            "zone": table.zones[slots],
+            "district": pd.array(table.districts[slots], dtype="Int64"),
+        },
+        index=postal_codes.index,
+    )
+
+
 def get_nearest_facility(
-    location_latitude: float, location_longitude: float, facilities: str
+    location_latitude: float, location_longitude: float, facilities: str, backend: str = None
 ):  # -> Tuple[Union[float, str], str, float, float]:
     """Finds the nearest facility to a given location.
 
@@ -89,6 +223,7 @@ def get_nearest_facility(
         location_latitude (float): The latitude of the location.
         location_longitude (float): The longitude of the location.
         facilities (str): The type of facility to search for. Valid strings accepted are "schools", "hawker_centres_markets", "shopping_malls" or "stations".
+        backend (str): Distance backend, see utils.distance. Defaults to the process default.
 
     Returns:
         Tuple[Union[float, str], str, float, float]: A tuple containing the minimum distance, nearest facility name, latitude, and longitude. If no facility is found, empty strings are returned for distance, facility name, latitude, and longitude.
@@ -96,51 +231,14 @@ def get_nearest_facility(
     Raises:
         ValueError: If an invalid string is provided for the "facilities" argument.
     """
-    min_distance, nearest_facility, nearest_facility_lat, nearest_facility_long = (
-        "",
-        "",
-        "",
-        "",
-    )
-    location_coords = (location_latitude, location_longitude)
-
-    if facilities == "schools":
-        file_name = "primary_schools.csv"
-        reference_column = "Primary Schools"
-    elif facilities == "hawker_centres_markets":
-        file_name = "hawker_centres_markets.csv"
-        reference_column = "Name of Hawker Centre / Market"
-    elif facilities == "shopping_malls":
-        file_name = "shopping_malls.csv"
-        reference_column = "Shopping Mall"
-    elif facilities == "stations":
-        file_name = "stations.csv"
-        reference_column = "STN_NAM_DE"
-    else:
-        raise ValueError(
-            'Please provide a valid string for "facilities" from "schools", "hawker_centres_markets", "shopping_malls" or "stations"!'
+    with tracing.span("facility.nearest", facilities=facilities):
+        return get_facility_index().nearest(
+            location_latitude, location_longitude, facilities, backend
         )
 
-    csv_path = os.path.join(os.path.dirname(__file__), "..", "data", file_name)
-    df = pd.read_csv(csv_path)
-    min_distance = float("inf")
-    nearest_facility = None
-
-    for _, facility in df.iterrows():
-        facility_coords = (facility["Latitude"], facility["Longitude"])
-
-        distance = geodesic(location_coords, facility_coords).meters
-        if distance < min_distance:
-            min_distance = distance
-            nearest_facility = facility[reference_column]
-            nearest_facility_lat = facility["Latitude"]
-            nearest_facility_long = facility["Longitude"]
-
-    return min_distance, nearest_facility, nearest_facility_lat, nearest_facility_long
-
 
 def count_primary_schools_within_distance(
-    location_latitude: float, location_longitude: float, distance_km: float
+    location_latitude: float, location_longitude: float, distance_km: float, backend: str = None
 ):  # -> int:
     """Counts the number of primary schools within a certain distance from a location.
 
@@ -148,45 +246,95 @@ def count_primary_schools_within_distance(
         location_latitude (float): The latitude of the location to search for.
         location_longitude (float): The longitude of the location to search for.
         distance_km (float): The maximum distance in kilometers to consider for counting.
+        backend (str): Distance backend, see utils.distance. Defaults to the process default.
 
     Returns:
         int: The count of primary schools within the specified distance.
     """
-    count = 0
-    csv_path = os.path.join(
-        os.path.dirname(__file__), "..", "..", "data", "primary_schools.csv"
+    counts = get_facility_index().count_within(
+        location_latitude, location_longitude, [distance_km * 1000], "schools", backend
     )
-    df = pd.read_csv(csv_path)
+    return int(counts[0, 0])
 
-    location_coords = (location_latitude, location_longitude)
 
-    for _, school in df.iterrows():
-        distance = geodesic(
-            location_coords, (school["Latitude"], school["Longitude"])
-        ).kilometers
+def count_facilities_within_distances(
+    location_latitudes,
+    location_longitudes,
+    distances_km: list,
+    facilities: list = None,
+    backend: str = None,
+) -> pd.DataFrame:
+    """Counts every facility type within several distances of one or many locations.
+
+    Each location's distances to the facilities are computed once and compared
+    against all the requested distances, so extra radii come almost for free.
+
+    Args:
+        location_latitudes (float or array-like): The latitude(s) of the locations.
+        location_longitudes (float or array-like): The longitude(s) of the locations.
+        distances_km (list): The maximum distances in kilometers to count within.
+        facilities (list): Facility types to count. Defaults to "schools",
+            "hawker_centres_markets", "shopping_malls" and "stations".
+        backend (str): Distance backend, see utils.distance. Defaults to the process default.
 
-        if distance <= distance_km:
-            count += 1
+    Returns:
+        pd.DataFrame: One row per location and one column per facility type and
+                      distance, named like "schools_within_1km".
 
-    return count
+    Raises:
+        ValueError: If an invalid string is provided in "facilities".
+    """
+    index = get_facility_index()
+    facilities = facilities if facilities is not None else list(FACILITY_FILES)
+    radii_m = np.asarray(distances_km, dtype=float) * 1000
+    columns = {}
+    for facility in facilities:
+        counts = index.count_within(
+            location_latitudes, location_longitudes, radii_m, facility, backend
+        )
+        for distance_km, column in zip(distances_km, counts.T):
+            columns[f"{facility}_within_{distance_km:g}km"] = column
+    return pd.DataFrame(columns)
 
 
 def calculate_distance_to_cbd(
-    location_latitude: float, location_longitude: float
+    location_latitude: float, location_longitude: float, backend: str = None
 ):  # -> float:
     """Calculates the distance between a location and the Central Business District (CBD) which is predefined by the location of Raffles MRT station.
 
     Args:
         location_latitude (float): The latitude of the location to calculate the distance from.
         location_longitude (float): The longitude of the location to calculate the distance from.
+        backend (str): Distance backend, see utils.distance. Defaults to the process default.
 
     Returns:
         float: The distance in meters between the location and the CBD (represented by Raffles Place MRT station).
     """
-    location_coords = (location_latitude, location_longitude)
-    cbd_coords = (1.283933262, 103.8514631)
-    distance = geodesic(location_coords, cbd_coords).meters
-    return distance
+    return float(distances_to_cbd(location_latitude, location_longitude, backend)[0])
+
+
+def distances_to_cbd(location_latitudes, location_longitudes, backend: str = None) -> np.ndarray:
+    """Calculates the distance to the CBD for many locations at once.
+
+    Args:
+        location_latitudes (array-like): The latitudes of the locations.
+        location_longitudes (array-like): The longitudes of the locations.
+        backend (str): Distance backend, see utils.distance. Defaults to the process default.
+
+    Returns:
+        np.ndarray: The distances in meters, matching calculate_distance_to_cbd element-wise.
+    """
+    backend = get_backend(backend)
+    lats = np.atleast_1d(np.asarray(location_latitudes, dtype=float))
+    lons = np.atleast_1d(np.asarray(location_longitudes, dtype=float))
+    if backend.screens:
+        return np.fromiter(
+            (backend.exact(lat, lon, *CBD_COORDS) for lat, lon in zip(lats, lons)),
+            dtype=float,
+            count=len(lats),
+        )
+    cbd = backend.prepare([CBD_COORDS[0]], [CBD_COORDS[1]])[0]
+    return backend.distances(backend.prepare(lats, lons), cbd)
 
 
 def getwalkingdetails(
@@ -201,26 +349,34 @@ def getwalkingdetails(
 
     Returns:
         tuple: A tuple containing the total distance (in meters), total time (in seconds),
-               and the geometry of the walking route.
+               and the geometry of the walking route. Routes are memoized by rounded coordinates.
     """
-    req = requests.get(
-        "https://developers.onemap.sg/privateapi/routingsvc/route?start="
-        + start_coordinates
-        + "&end="
-        + end_coordinates
-        + "&routeType=walk&token="
-        + token
+    return get_route_fetcher().fetch(
+        ONEMAP_ROUTE_URL, start_coordinates, end_coordinates, token
     )
-    resultsdict = eval(req.text)
-    return (
-        resultsdict["route_summary"]["total_distance"],
-        resultsdict["route_summary"]["total_time"],
-        resultsdict["route_geometry"],
+
+
+def getwalkingdetails_many(
+    coordinate_pairs: list, token: str, timeout: float = None, logger=None
+) -> list:
+    """Get walking details for several start/end pairs concurrently.
+
+    Args:
+        coordinate_pairs (list): (start_coordinates, end_coordinates) string pairs.
+        token (str): The API token for accessing the routing service.
+        timeout (float): Seconds to wait for all routes. Defaults to the per-route timeout.
+        logger (Optional): Logger object for logging failed routes. Defaults to None.
+
+    Returns:
+        list: One getwalkingdetails tuple per pair, or None for a route that failed or timed out.
+    """
+    return get_route_fetcher().fetch_many(
+        ONEMAP_ROUTE_URL, coordinate_pairs, token, timeout=timeout, logger=logger
     )
 
 
 def find_neighbours(
-    lat_lon: tuple, flat_type: str, radius: int, df: pd.DataFrame
+    lat_lon: tuple, flat_type: str, radius: int, df: pd.DataFrame, backend: str = None
 ) -> pd.DataFrame:
     """Returns a DataFrame of building names within a specified radius (in meters) of a given latitude-longitude pair.
 
@@ -229,36 +385,19 @@ def find_neighbours(
         flat_type (str): The desired type of flat.
         radius (int): The radius (in meters) within which to search for nearby buildings.
         df (pd.DataFrame): The DataFrame containing the building information.
+        backend (str): Distance backend, see utils.distance. Defaults to the process default.
 
     Returns:
         pd.DataFrame: A DataFrame with the buildings within the specified radius and matching the flat type.
+                      Only the latest record per address is kept, newest first.
     """
-    df = df.copy()
-    # Initialize an empty list to store the building names
-    indices = []
-    buildings = []
-    # Loop through the rows of the dataframe with the same flat type
-    dfslice = df[df["flat_type"] == flat_type].reset_index(drop=True)
-
-    for index, row in dfslice[::-1].iterrows():
-        if row["address"] not in buildings:
-            # Get the lat-lon pair of the current row
-            point = (row["lat"], row["lon"])
-            # Calculate the distance between the input point and the current point
-            distance = geodesic(lat_lon, point).meters  # km, <=1
-
-            # print(distance)
-            # If the distance is less than or equal to 1km, append the building name to the list
-            if distance <= radius:
-                indices.append(index)
-                buildings.append(row["address"])
-    # Return the dataframe slice of the same flat types in the neighbourhood
-    return dfslice.loc[indices]
+    with tracing.span("find_neighbours", flat_type=flat_type):
+        return get_neighbour_index(df).query(lat_lon, flat_type, radius, backend)
 
 
 if __name__ == "__main__":
     zone, district = get_district_and_zone("210039")
-    lat, long, postal = get_address_details("210039")
+    lat, long, postal, _, _ = get_address_details("210039")
     min_geodisic_distance_to_station, _, _, _ = get_nearest_facility(
         lat, long, "stations"
     )
@@ -268,8 +407,9 @@ if __name__ == "__main__":
     min_geodisic_distance_to_hawker_market, _, _, _ = get_nearest_facility(
         lat, long, "hawker_centres_markets"
     )
-    pri_sch_1km = count_primary_schools_within_distance(lat, long, 1)
-    pri_sch_2km = count_primary_schools_within_distance(lat, long, 2)
+    density = count_facilities_within_distances(lat, long, [1, 2])
+    pri_sch_1km = density.loc[0, "schools_within_1km"]
+    pri_sch_2km = density.loc[0, "schools_within_2km"]
     geodesic_distance_to_cbd = calculate_distance_to_cbd(lat, long)
 
     print(zone)
@@ -0,0 +1,175 @@
+"""Spatial index over the rental dataset for neighbour radius queries"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from utils.distance import EARTH_RADIUS_M, HaversineBackend, get_backend
+from utils.rental_store import extends
+
+# The tree measures haversine distances, so it is searched slightly wider and
+# candidates are then re-measured with the distance backend to keep the
+# radius cut-off exact for that backend.
+_RADIUS_TOLERANCE = HaversineBackend.tolerance
+
+
+class _FlatTypeIndex:
+    """BallTree over the latest record of every block for one flat type.
+
+    Only the last row for each (address, lat, lon) can ever be returned by a
+    neighbour query, so earlier rows are dropped up front and the tree size
+    follows the number of blocks rather than the length of the rental history.
+    """
+
+    def __init__(self, rows: np.ndarray, addresses: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+        # rows are positions into the full frame; the position within ``rows``
+        # is the index label find_neighbours has always returned
+        self.rows = rows
+        self._build(np.arange(len(rows)), addresses, lat, lon)
+
+    def _build(self, positions: np.ndarray, addresses: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+        blocks = pd.DataFrame({"address": addresses, "lat": lat, "lon": lon})
+        keep = ~blocks.duplicated(keep="last").to_numpy() & ~np.isnan(lat) & ~np.isnan(lon)
+        self.positions = positions[keep]
+        self.addresses = addresses[keep]
+        self.lat = lat[keep]
+        self.lon = lon[keep]
+        # block coordinates in each distance backend's form, converted on first use
+        self._prepared = {}
+        # scikit-learn takes over a second to import, so only pay for it
+        # once a neighbour query is made
+        from sklearn.neighbors import BallTree
+
+        self.tree = (
+            BallTree(np.radians(np.column_stack([self.lat, self.lon])), metric="haversine")
+            if len(self.positions)
+            else None
+        )
+
+    def extended(
+        self, rows: np.ndarray, addresses: np.ndarray, lat: np.ndarray, lon: np.ndarray
+    ) -> "_FlatTypeIndex":
+        """A new index with appended records, built from the kept blocks and the new rows only.
+
+        An earlier record that was dropped is superseded by a later one that is
+        kept, so the kept blocks plus the new rows select the same records as
+        rebuilding from the full history.
+        """
+        index = object.__new__(_FlatTypeIndex)
+        index.rows = np.concatenate([self.rows, rows])
+        index._build(
+            np.concatenate([self.positions, len(self.rows) + np.arange(len(rows))]),
+            np.concatenate([self.addresses, addresses]),
+            np.concatenate([self.lat, lat]),
+            np.concatenate([self.lon, lon]),
+        )
+        return index
+
+    def query(self, lat_lon: tuple, radius: float, backend: str = None) -> np.ndarray:
+        """Returns slice positions of the latest in-radius record per address, newest first."""
+        if self.tree is None:
+            return np.empty(0, dtype=np.intp)
+        backend = get_backend(backend)
+        lat, lon = float(lat_lon[0]), float(lat_lon[1])
+        candidates = self.tree.query_radius(
+            np.radians([[lat, lon]]), r=radius * _RADIUS_TOLERANCE / EARTH_RADIUS_M
+        )[0]
+        if backend.screens:
+            within = np.array(
+                [
+                    candidate
+                    for candidate in candidates
+                    if backend.exact(lat, lon, self.lat[candidate], self.lon[candidate]) <= radius
+                ],
+                dtype=np.intp,
+            )
+        else:
+            if backend.name not in self._prepared:
+                self._prepared[backend.name] = backend.prepare(self.lat, self.lon)
+            distances = backend.distances(
+                backend.prepare([lat], [lon])[0], self._prepared[backend.name][candidates]
+            )
+            within = candidates[distances <= radius]
+        if not len(within):
+            return np.empty(0, dtype=np.intp)
+
+        order = np.argsort(self.positions[within])[::-1]
+        within = within[order]
+        # an address seen at several coordinates keeps only its newest record
+        _, first = np.unique(self.addresses[within], return_index=True)
+        return self.positions[within[np.sort(first)]]
+
+
+class NeighbourIndex:
+    """Per flat type spatial indexes over a rental DataFrame.
+
+    Each flat type's index is built on its first query and reused afterwards,
+    so a radius query costs a tree search plus work proportional to the
+    number of blocks returned.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._indexes: Dict[str, _FlatTypeIndex] = {}
+
+    def _columns(self, rows: np.ndarray) -> tuple:
+        return (
+            self.df["address"].iloc[rows].to_numpy(dtype=object),
+            self.df["lat"].iloc[rows].to_numpy(dtype=float),
+            self.df["lon"].iloc[rows].to_numpy(dtype=float),
+        )
+
+    def _index(self, flat_type: str) -> _FlatTypeIndex:
+        if flat_type not in self._indexes:
+            # compares category codes rather than strings when the frame comes
+            # from the memory-mapped rental store
+            rows = np.flatnonzero((self.df["flat_type"] == flat_type).to_numpy())
+            self._indexes[flat_type] = _FlatTypeIndex(rows, *self._columns(rows))
+        return self._indexes[flat_type]
+
+    def extended(self, df: pd.DataFrame) -> "NeighbourIndex":
+        """A new index over ``df``, which must be this index's frame with rows appended.
+
+        Flat types already indexed are extended with just the new rows.
+        """
+        index = NeighbourIndex(df)
+        start = len(self.df)
+        new_flat_types = df["flat_type"].iloc[start:]
+        for flat_type, flat_index in self._indexes.items():
+            rows = start + np.flatnonzero((new_flat_types == flat_type).to_numpy())
+            index._indexes[flat_type] = flat_index.extended(rows, *index._columns(rows))
+        return index
+
+    def query(
+        self, lat_lon: tuple, flat_type: str, radius: float, backend: str = None
+    ) -> pd.DataFrame:
+        """Returns the latest record of every building of ``flat_type`` within ``radius`` meters.
+
+        The result matches map_utils.find_neighbours: rows are indexed by their
+        position among the flat type's records and ordered newest first.
+        Distances are measured with ``backend``, see utils.distance.
+        """
+        index = self._index(flat_type)
+        positions = index.query(lat_lon, radius, backend)
+        result = self.df.iloc[index.rows[positions]]
+        result.index = pd.Index(positions)
+        return result
+
+
+_NEIGHBOUR_INDEX = None
+
+
+def get_neighbour_index(df: pd.DataFrame) -> NeighbourIndex:
+    """Returns the cached index for ``df``, rebuilding it when a different frame is passed.
+
+    A frame appended to the cached one extends the cached index instead.
+    """
+    global _NEIGHBOUR_INDEX
+    if _NEIGHBOUR_INDEX is None:
+        _NEIGHBOUR_INDEX = NeighbourIndex(df)
+    elif _NEIGHBOUR_INDEX.df is not df:
+        if extends(df, _NEIGHBOUR_INDEX.df):
+            _NEIGHBOUR_INDEX = _NEIGHBOUR_INDEX.extended(df)
+        else:
+            _NEIGHBOUR_INDEX = NeighbourIndex(df)
+    return _NEIGHBOUR_INDEX
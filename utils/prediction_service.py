@@ -0,0 +1,254 @@
+"""Headless rent prediction service with request micro-batching.
+
+Concurrent requests are queued and scored together: the batching thread
+waits for the first request, keeps collecting until the batch is full or the
+wait time runs out, builds all feature rows in one pass and calls
+model.predict once for the whole batch. If a batch fails, its listings are
+scored one at a time so only the bad ones fail.
+
+    python -m utils.prediction_service [--port 8502] [--max-batch-size 64] [--max-wait-ms 5]
+
+    curl -X POST localhost:8502/predict \\
+        -d '{"lat": 1.35, "lon": 103.82, "flat_type": "3-ROOM", "months_ahead": 0}'
+"""
+import argparse
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Sequence
+
+from utils import facilities, features, resources, tracing
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT = 0.005
+REQUEST_TIMEOUT = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+def validate_listing(listing: dict) -> dict:
+    """Checks one request body and returns the listing in canonical form.
+
+    Raises:
+        ValueError: If a field is missing or invalid.
+    """
+    try:
+        lat, lon = float(listing["lat"]), float(listing["lon"])
+        flat_type = int(features.flat_type_codes(listing["flat_type"])[0])
+        months_ahead = listing.get("months_ahead", 0)
+    except KeyError as e:
+        raise ValueError(f"Missing field {e}") from None
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError(str(e)) from None
+    # json.loads accepts NaN and Infinity, which the model rejects
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        raise ValueError("lat and lon must be finite numbers")
+    # bool is an int subclass, and floats such as 1e300 or Infinity overflow the date maths
+    if isinstance(months_ahead, bool) or not isinstance(months_ahead, int):
+        raise ValueError("months_ahead must be an integer")
+    if not 0 <= months_ahead <= features.MAX_MONTHS_AHEAD:
+        raise ValueError(f"months_ahead must be between 0 and {features.MAX_MONTHS_AHEAD}")
+    if not 0 <= flat_type < len(features.FLAT_TYPE):
+        raise ValueError(f"flat_type code must be below {len(features.FLAT_TYPE)}")
+    return {"lat": lat, "lon": lon, "flat_type": flat_type, "months_ahead": months_ahead}
+
+
+def predict_listings(listings: List[dict]) -> Sequence[float]:
+    """Scores validated listings with one feature pass and one model.predict call."""
+    inference_input = features.build_prediction_input(
+        [listing["lat"] for listing in listings],
+        [listing["lon"] for listing in listings],
+        [listing["flat_type"] for listing in listings],
+        [listing["months_ahead"] for listing in listings],
+    )
+    with tracing.span("model.predict", rows=len(listings)):
+        return resources.get_model().predict(inference_input)
+
+
+class MicroBatcher:
+    """Groups items submitted from many threads into batches for one callable.
+
+    Args:
+        predict_batch (Callable): Maps a list of items to a sequence of results.
+        max_batch_size (int): Most items scored together.
+        max_wait (float): Seconds to wait for more items after the first one arrives.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[list], Sequence],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """Queues an item and returns a Future for its result."""
+        if self._closed.is_set():
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            entries = self._collect()
+            batch = [entry for entry in entries if entry is not None]
+            if batch:
+                self._score(batch)
+            # close() queues None behind any remaining items
+            if len(batch) < len(entries):
+                return
+
+    def _score(self, batch: list) -> None:
+        items = [item for item, _ in batch]
+        try:
+            with tracing.span("service.batch", size=len(items)):
+                results = self.predict_batch(items)
+        except Exception as e:
+            logger.exception("Batch of %d items failed", len(items))
+            if len(batch) > 1:
+                results = None
+            else:
+                batch[0][1].set_exception(e)
+                results = ()
+        if results is None:
+            # one bad item must not fail the others batched with it, so score them singly
+            for entry in batch:
+                self._score([entry])
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        self.batches += 1
+        self.items += len(items)
+
+    def close(self) -> None:
+        """Stops the batching thread once queued items are scored."""
+        self._closed.set()
+        self._queue.put(None)
+        self._thread.join()
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """Serves POST /predict with one listing per request, GET /health and GET /metrics."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = tracing.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != "/health":
+            self._send_json(404, {"error": "Not found"})
+            return
+        batcher = self.server.batcher
+        self._send_json(200, {"batches": batcher.batches, "predictions": batcher.items})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            listing = validate_listing(json.loads(self.rfile.read(length)))
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            prediction = self.server.batcher.submit(listing).result(timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"monthly_rent": float(prediction)})
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8502,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_wait: float = DEFAULT_MAX_WAIT,
+    predict_batch: Callable[[list], Sequence] = predict_listings,
+) -> ThreadingHTTPServer:
+    """Creates the HTTP server and its micro-batcher; call serve_forever() to start.
+
+    The batcher is reachable as ``server.batcher`` and should be closed after
+    the server shuts down.
+    """
+    server = ThreadingHTTPServer((host, port), PredictionRequestHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(predict_batch, max_batch_size, max_wait)
+    return server
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # load before accepting traffic so the first batch does not pay for it
+    resources.get_model()
+    facilities.get_facility_index()
+
+    server = make_server(
+        args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000
+    )
+    logger.info("Serving predictions on http://%s:%d/predict", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""Precomputed rent predictions on a regular grid over Singapore.
+
+An offline job lays cells of about CELL_SIZE_M over the island, computes the
+facility and CBD distance features for every cell in one vectorized pass and
+scores each flat type and rental month with one batched model.predict. The
+predictions are stored as a float32 raster per flat type and month, so the
+app can draw a rent heatmap and approximate a prediction anywhere by
+bilinear interpolation without computing any features. Cells further than
+MAX_BLOCK_DISTANCE_M from every block in the rental dataset, mostly sea,
+forest and industrial land, are left empty.
+
+Rasters are stored per model month, not per number of months ahead, so
+rebuild the grid monthly and whenever the model or the facility CSVs change:
+
+    python -m utils.rent_grid [--cell-size 100] [--months-ahead 0 3 6] [--output DIR]
+
+The grid records the distance backend its features were measured with and is
+only used by processes with the same HDB_DISTANCE_BACKEND. Running both with
+HDB_DISTANCE_BACKEND=svy21 builds the grid many times faster, with distances
+identical to the geodesic's for any practical purpose.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.distance import EARTH_RADIUS_M, get_backend
+from utils.facilities import DATA_DIR, FACILITY_FILES
+from utils.feature_store import facility_fingerprint
+from utils.features import (
+    FEATURE_COLUMNS,
+    FLAT_TYPE,
+    LOCATION_FEATURE_COLUMNS,
+    compute_location_features,
+    flat_type_codes,
+    months_since_data_start,
+)
+from utils.resources import MODEL_PATH, FileBackedResource
+
+DEFAULT_GRID_DIR = os.path.join(DATA_DIR, "rent_grid")
+
+CELL_SIZE_M = 100
+# (south, west), (north, east) of the area covered, all of mainland Singapore
+BOUNDS = ((1.20, 103.60), (1.48, 104.05))
+MAX_BLOCK_DISTANCE_M = 1000
+DEFAULT_MONTHS_AHEAD = (0, 3, 6)
+
+logger = logging.getLogger(__name__)
+
+_FLAT_TYPE_CODES = {name: code for code, name in enumerate(FLAT_TYPE)}
+
+
+def model_fingerprint(model_path: str = MODEL_PATH) -> str:
+    """Hash of the model file the predictions were made with."""
+    digest = hashlib.sha1()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_fingerprints(model_path: str = MODEL_PATH) -> dict:
+    """What a grid built now would depend on: facility data, model and distance backend."""
+    return {
+        "facilities": facility_fingerprint(),
+        "model": model_fingerprint(model_path),
+        "distance_backend": get_backend().name,
+    }
+
+
+class RentGrid:
+    """Predicted rents for every flat type and month on a regular lat/lon grid.
+
+    Cell (row, col) is centred on (south + (row + 0.5) * lat_step,
+    west + (col + 0.5) * lon_step).
+
+    Args:
+        rents (np.ndarray): (len(FLAT_TYPE), len(months), n_rows, n_cols) float32
+            predicted monthly rent, NaN for empty cells.
+        south (float): Latitude of the grid's southern edge.
+        west (float): Longitude of the grid's western edge.
+        lat_step (float): Cell height in degrees.
+        lon_step (float): Cell width in degrees.
+        months (Sequence[int]): Model month index of every raster, see
+            features.months_since_data_start.
+        fingerprints (dict): current_fingerprints() at build time.
+    """
+
+    def __init__(
+        self,
+        rents: np.ndarray,
+        south: float,
+        west: float,
+        lat_step: float,
+        lon_step: float,
+        months: Sequence[int],
+        fingerprints: dict,
+    ):
+        self.rents = rents
+        self.south = south
+        self.west = west
+        self.lat_step = lat_step
+        self.lon_step = lon_step
+        self.months = [int(month) for month in months]
+        self.fingerprints = fingerprints
+        self._month_slots = {month: slot for slot, month in enumerate(self.months)}
+
+    @property
+    def shape(self) -> tuple:
+        """(n_rows, n_cols) of every raster."""
+        return self.rents.shape[2:]
+
+    @property
+    def bounds(self) -> tuple:
+        """((south, west), (north, east)) of the outer cell edges."""
+        n_rows, n_cols = self.shape
+        return (
+            (self.south, self.west),
+            (self.south + n_rows * self.lat_step, self.west + n_cols * self.lon_step),
+        )
+
+    def cell_centres(self) -> tuple:
+        """Latitudes of the rows and longitudes of the columns, south and west first."""
+        n_rows, n_cols = self.shape
+        return (
+            self.south + (np.arange(n_rows) + 0.5) * self.lat_step,
+            self.west + (np.arange(n_cols) + 0.5) * self.lon_step,
+        )
+
+    @classmethod
+    def build(
+        cls,
+        model,
+        block_lats,
+        block_lons,
+        months: Sequence[int],
+        bounds: tuple = BOUNDS,
+        cell_size_m: float = CELL_SIZE_M,
+        max_block_distance_m: float = MAX_BLOCK_DISTANCE_M,
+        model_path: str = MODEL_PATH,
+    ) -> "RentGrid":
+        """Predicts the rent of every flat type and month at every cell near a block.
+
+        Args:
+            model: The rent prediction model.
+            block_lats (array-like): Latitudes of the blocks in the rental dataset.
+            block_lons (array-like): Longitudes of the blocks in the rental dataset.
+            months (Sequence[int]): Model month indices to predict.
+            bounds (tuple): ((south, west), (north, east)) to cover.
+            cell_size_m (float): Approximate cell width and height in meters.
+            max_block_distance_m (float): Cells further than this from every block are empty.
+            model_path (str): File ``model`` was loaded from; a different file makes
+                the grid stale.
+        """
+        # scikit-learn is slow to import and only needed when building
+        from sklearn.neighbors import BallTree
+
+        (south, west), (north, east) = bounds
+        lat_step = math.degrees(cell_size_m / EARTH_RADIUS_M)
+        lon_step = lat_step / math.cos(math.radians((south + north) / 2))
+        n_rows = int(math.ceil((north - south) / lat_step))
+        n_cols = int(math.ceil((east - west) / lon_step))
+        grid = cls(
+            np.full((len(FLAT_TYPE), len(months), n_rows, n_cols), np.nan, dtype=np.float32),
+            south, west, lat_step, lon_step, months,
+            current_fingerprints(model_path),
+        )
+
+        row_lats, col_lons = grid.cell_centres()
+        lats = np.repeat(row_lats, n_cols)
+        lons = np.tile(col_lons, n_rows)
+        blocks = np.column_stack([block_lats, block_lons]).astype(float)
+        blocks = np.unique(blocks[~np.isnan(blocks).any(axis=1)], axis=0)
+        distances, _ = BallTree(np.radians(blocks), metric="haversine").query(
+            np.radians(np.column_stack([lats, lons])), k=1
+        )
+        cells = np.flatnonzero(distances[:, 0] * EARTH_RADIUS_M <= max_block_distance_m)
+        logger.info("Computing features for %d of %d cells", len(cells), n_rows * n_cols)
+
+        start = time.perf_counter()
+        inference_input = pd.DataFrame(
+            compute_location_features(lats[cells], lons[cells]), columns=LOCATION_FEATURE_COLUMNS
+        )
+        logger.info("Features computed in %.1f s", time.perf_counter() - start)
+        inference_input["lat"] = lats[cells]
+        inference_input["lon"] = lons[cells]
+        for flat_type in range(len(FLAT_TYPE)):
+            for slot, month in enumerate(grid.months):
+                inference_input["rent_approval_date"] = month
+                inference_input["flat_type"] = flat_type
+                grid.rents[flat_type, slot].flat[cells] = model.predict(
+                    inference_input[FEATURE_COLUMNS]
+                )
+        return grid
+
+    def save(self, grid_dir: str = DEFAULT_GRID_DIR) -> None:
+        """Writes the rasters as one .npy array plus a small JSON manifest."""
+        os.makedirs(grid_dir, exist_ok=True)
+        np.save(os.path.join(grid_dir, "rents.npy"), self.rents)
+        with open(os.path.join(grid_dir, "manifest.json"), "w") as f:
+            json.dump(
+                {
+                    "south": self.south,
+                    "west": self.west,
+                    "lat_step": self.lat_step,
+                    "lon_step": self.lon_step,
+                    "months": self.months,
+                    "fingerprints": self.fingerprints,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, grid_dir: str = DEFAULT_GRID_DIR) -> "RentGrid":
+        """Reads a saved grid, memory-mapping the rasters."""
+        with open(os.path.join(grid_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        return cls(
+            np.load(os.path.join(grid_dir, "rents.npy"), mmap_mode="r"),
+            manifest["south"],
+            manifest["west"],
+            manifest["lat_step"],
+            manifest["lon_step"],
+            manifest["months"],
+            manifest["fingerprints"],
+        )
+
+    def is_stale(self) -> bool:
+        """Whether the model, the facility CSVs or the distance backend changed since the build."""
+        return self.fingerprints != current_fingerprints()
+
+    def month_slot(self, future_rental_date: int, now: Optional[datetime] = None) -> Optional[int]:
+        """Index of the raster for a rental starting some months from now, None if not stored."""
+        return self._month_slots.get(months_since_data_start(future_rental_date, now))
+
+    def raster(self, flat_type, future_rental_date: int, now: Optional[datetime] = None):
+        """The (n_rows, n_cols) raster for a flat type and rental start, southern row first.
+
+        Returns:
+            Optional[np.ndarray]: The raster, or None if the grid does not cover the month.
+        """
+        slot = self.month_slot(future_rental_date, now)
+        if slot is None:
+            return None
+        # flat_type_codes takes a pandas round trip, too slow for one name
+        code = _FLAT_TYPE_CODES.get(flat_type)
+        return self.rents[code if code is not None else int(flat_type_codes(flat_type)[0]), slot]
+
+    def interpolate(
+        self, lats, lons, flat_type, future_rental_date: int, now: Optional[datetime] = None
+    ) -> np.ndarray:
+        """Approximates predicted rents by bilinear interpolation between cell centres.
+
+        Empty cells are left out and the remaining weights renormalised.
+
+        Args:
+            lats (array-like): Latitudes of the locations.
+            lons (array-like): Longitudes of the locations.
+            flat_type (str or int): Flat type name or code.
+            future_rental_date (int): Months from now the rental starts.
+            now (Optional[datetime]): Reference date. Defaults to the current date.
+
+        Returns:
+            np.ndarray: The approximate rent per location, NaN outside the grid, away
+            from every block or for a month the grid does not cover.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        raster = self.raster(flat_type, future_rental_date, now)
+        if raster is None:
+            return np.full(len(lats), np.nan)
+
+        n_rows, n_cols = self.shape
+        y = (lats - self.south) / self.lat_step - 0.5
+        x = (lons - self.west) / self.lon_step - 0.5
+        inside = (y >= -0.5) & (y <= n_rows - 0.5) & (x >= -0.5) & (x <= n_cols - 0.5)
+        y = np.clip(y, 0, n_rows - 1)
+        x = np.clip(x, 0, n_cols - 1)
+        row = np.minimum(np.floor(y).astype(np.intp), n_rows - 2)
+        col = np.minimum(np.floor(x).astype(np.intp), n_cols - 2)
+        dy, dx = y - row, x - col
+
+        total = np.zeros(len(lats))
+        weights = np.zeros(len(lats))
+        for row_offset, col_offset, weight in (
+            (0, 0, (1 - dy) * (1 - dx)),
+            (0, 1, (1 - dy) * dx),
+            (1, 0, dy * (1 - dx)),
+            (1, 1, dy * dx),
+        ):
+            values = raster[row + row_offset, col + col_offset].astype(float)
+            known = ~np.isnan(values) & (weight > 0)
+            total[known] += values[known] * weight[known]
+            weights[known] += weight[known]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(inside & (weights > 0), total / weights, np.nan)
+
+    def approximate(
+        self,
+        lat: float,
+        lon: float,
+        flat_type,
+        future_rental_date: int,
+        now: Optional[datetime] = None,
+    ) -> float:
+        """interpolate() for a single location, without NumPy's per-call overhead.
+
+        Returns:
+            float: The approximate rent, NaN where interpolate() gives NaN.
+        """
+        raster = self.raster(flat_type, future_rental_date, now)
+        n_rows, n_cols = self.shape
+        y = (lat - self.south) / self.lat_step - 0.5
+        x = (lon - self.west) / self.lon_step - 0.5
+        if raster is None or not (-0.5 <= y <= n_rows - 0.5 and -0.5 <= x <= n_cols - 0.5):
+            return math.nan
+        y = min(max(y, 0.0), n_rows - 1.0)
+        x = min(max(x, 0.0), n_cols - 1.0)
+        row = min(int(y), n_rows - 2)
+        col = min(int(x), n_cols - 2)
+        dy, dx = y - row, x - col
+        corners = raster[row : row + 2, col : col + 2].tolist()
+        (south_west, south_east), (north_west, north_east) = corners
+        total = weights = 0.0
+        for value, weight in (
+            (south_west, (1 - dy) * (1 - dx)),
+            (south_east, (1 - dy) * dx),
+            (north_west, dy * (1 - dx)),
+            (north_east, dy * dx),
+        ):
+            if weight > 0 and not math.isnan(value):
+                total += value * weight
+                weights += weight
+        return total / weights if weights > 0 else math.nan
+
+
+def _load_current_grid(grid_dir: str) -> Optional[RentGrid]:
+    if not os.path.exists(os.path.join(grid_dir, "manifest.json")):
+        return None
+    grid = RentGrid.load(grid_dir)
+    if grid.is_stale():
+        logger.warning(
+            "Rent grid in %s is out of date with the model, facility data or "
+            "distance backend, run `python -m utils.rent_grid` to rebuild it",
+            grid_dir,
+        )
+        return None
+    return grid
+
+
+RENT_GRID = FileBackedResource(
+    lambda: _load_current_grid(DEFAULT_GRID_DIR),
+    os.path.join(DEFAULT_GRID_DIR, "manifest.json"),
+    os.path.join(DEFAULT_GRID_DIR, "rents.npy"),
+    MODEL_PATH,
+    *(os.path.join(DATA_DIR, file_name) for file_name, _ in FACILITY_FILES.values()),
+)
+
+
+def get_rent_grid() -> Optional[RentGrid]:
+    """Returns the process-wide rent grid, or None if it is missing or stale."""
+    grid = RENT_GRID.get()
+    # the default backend may have been changed since the grid was loaded
+    if grid is not None and grid.fingerprints["distance_backend"] != get_backend().name:
+        return None
+    return grid
+
+
+def main(argv=None) -> None:
+    from utils import resources
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cell-size", type=float, default=CELL_SIZE_M, help="meters")
+    parser.add_argument(
+        "--months-ahead", type=int, nargs="+", default=list(DEFAULT_MONTHS_AHEAD),
+        help="rental starts to predict, in months from now",
+    )
+    parser.add_argument(
+        "--max-block-distance", type=float, default=MAX_BLOCK_DISTANCE_M,
+        help="meters from the nearest block beyond which cells are left empty",
+    )
+    parser.add_argument("--output", default=DEFAULT_GRID_DIR, help="grid directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    rental = resources.get_rental_frame()
+    months = sorted({months_since_data_start(months_ahead) for months_ahead in args.months_ahead})
+    grid = RentGrid.build(
+        resources.get_model(),
+        rental["lat"].to_numpy(),
+        rental["lon"].to_numpy(),
+        months,
+        cell_size_m=args.cell_size,
+        max_block_distance_m=args.max_block_distance,
+    )
+    grid.save(args.output)
+    n_rows, n_cols = grid.shape
+    print(f"Stored a {n_rows} x {n_cols} grid for months {grid.months} in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
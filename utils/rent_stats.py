@@ -0,0 +1,293 @@
+"""Precomputed monthly rent statistics per flat type, area and approval month.
+
+The advice page shows a +/- band around the predicted rent. Rather than
+filtering the whole rental dataset and calling describe() on every click,
+the rents are summarised once per (flat type, zone, district, approval month)
+group and rolled up to the coarser levels in LEVELS, so a lookup is a
+dictionary hit.
+
+Each group keeps mergeable accumulators: count, mean and sum of squared
+deviations (combined with Chan et al.'s parallel form of Welford's
+algorithm), the minimum and maximum, and a fixed-width rent histogram for
+quantiles. Newly appended records are folded in with update() without
+revisiting the old ones.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.rental_store import extends
+
+# Quantiles are read off a histogram of rents in RENT_BIN dollar steps; the
+# last bin also holds every rent above RENT_BIN * RENT_BINS
+RENT_BIN = 50
+RENT_BINS = 200
+
+# Grouping levels kept for lookups, finest first
+LEVELS = (
+    ("flat_type", "zone", "district", "month"),
+    ("flat_type", "district", "month"),
+    ("flat_type", "district"),
+    ("flat_type", "zone"),
+    ("flat_type", "month"),
+    ("flat_type",),
+)
+
+
+class RentAggregate:
+    """Mergeable summary of a group of monthly rents.
+
+    Args:
+        count (int): Number of rents.
+        mean (float): Their mean.
+        m2 (float): Sum of squared deviations from the mean.
+        minimum (float): Smallest rent.
+        maximum (float): Largest rent.
+        histogram (np.ndarray): RENT_BINS counts of rents per RENT_BIN dollar bin.
+    """
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum", "histogram")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=np.inf, maximum=-np.inf, histogram=None):
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.histogram = (
+            np.zeros(RENT_BINS, dtype=np.int64) if histogram is None else histogram
+        )
+
+    @classmethod
+    def from_values(cls, rents) -> "RentAggregate":
+        """Summarises an array of rents."""
+        rents = np.asarray(rents, dtype=float)
+        rents = rents[~np.isnan(rents)]
+        if not len(rents):
+            return cls()
+        mean = rents.mean()
+        return cls(
+            len(rents),
+            mean,
+            ((rents - mean) ** 2).sum(),
+            rents.min(),
+            rents.max(),
+            np.bincount(rent_bins(rents), minlength=RENT_BINS),
+        )
+
+    def merge(self, other: "RentAggregate") -> "RentAggregate":
+        """Folds ``other`` into this aggregate in place and returns it."""
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.histogram = self.histogram + other.histogram
+        return self
+
+    def copy(self) -> "RentAggregate":
+        return RentAggregate(
+            self.count, self.mean, self.m2, self.minimum, self.maximum, self.histogram.copy()
+        )
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation, as pandas' describe() reports it."""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float("nan")
+
+    def quantile(self, q: float) -> float:
+        """Approximate q-th quantile, interpolated within a RENT_BIN dollar bin."""
+        if self.count == 0:
+            return float("nan")
+        cumulative = np.cumsum(self.histogram)
+        target = q * self.count
+        bin_index = int(np.searchsorted(cumulative, target))
+        below = cumulative[bin_index - 1] if bin_index else 0
+        inside = self.histogram[bin_index]
+        fraction = (target - below) / inside if inside else 0.0
+        value = (bin_index + fraction) * RENT_BIN
+        return float(min(max(value, self.minimum), self.maximum))
+
+    def to_dict(self) -> dict:
+        """The summary describe() would give, with approximate quartiles."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.minimum,
+            "25%": self.quantile(0.25),
+            "50%": self.quantile(0.5),
+            "75%": self.quantile(0.75),
+            "max": self.maximum,
+        }
+
+
+def rent_bins(rents: np.ndarray) -> np.ndarray:
+    """Histogram bin of every rent."""
+    return np.clip((rents // RENT_BIN).astype(np.intp), 0, RENT_BINS - 1)
+
+
+def group_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """The grouping columns of LEVELS[0] for every rental record.
+
+    Zone and district come from "zone"/"district" columns when the dataset has
+    them, otherwise from a "postal" or "postal_code" column; records without
+    either get an empty zone and district 0.
+    """
+    if "zone" in df.columns and "district" in df.columns:
+        zone, district = df["zone"], df["district"]
+    else:
+        postal_column = next((c for c in ("postal", "postal_code") if c in df.columns), None)
+        if postal_column is not None:
+            # map_utils imports the whole app stack, so it is only loaded when needed
+            from utils.map_utils import POSTAL_TABLE, get_districts_and_zones
+
+            postals = df[postal_column]
+            if pd.api.types.is_numeric_dtype(postals):
+                # the first two of the six digits index the prefix table directly,
+                # with slot -1 holding the value for unknown prefixes
+                postals = postals.to_numpy(dtype=float)
+                slots = np.where(np.isnan(postals), -1, postals // 10000).astype(np.intp)
+                slots[(slots < 0) | (slots > 99)] = -1
+                table = POSTAL_TABLE.get()
+                zone, district = table.zones[slots], table.districts[slots]
+            else:
+                areas = get_districts_and_zones(postals.astype(str))
+                zone, district = areas["zone"], areas["district"]
+        else:
+            zone = pd.Series("", index=df.index)
+            district = pd.Series(0, index=df.index)
+    return pd.DataFrame(
+        {
+            "flat_type": np.asarray(df["flat_type"], dtype=object),
+            "zone": np.asarray(pd.Series(zone).astype(object).fillna(""), dtype=object),
+            "district": pd.Series(district).fillna(0).to_numpy(dtype=np.int64),
+            "month": np.asarray(df["rent_approval_date"], dtype=object),
+        }
+    )
+
+
+def _aggregate(df: pd.DataFrame) -> Dict[tuple, RentAggregate]:
+    """RentAggregates of the rental records, keyed by LEVELS[0] group."""
+    rents = df["monthly_rent"].to_numpy(dtype=float)
+    keys = group_columns(df)
+    valid = ~np.isnan(rents)
+    keys, rents = keys[valid], rents[valid]
+    if not len(rents):
+        return {}
+
+    groups = keys.groupby(list(LEVELS[0]), sort=False, dropna=False).ngroup().to_numpy()
+    n_groups = groups.max() + 1
+    count = np.bincount(groups, minlength=n_groups)
+    mean = np.bincount(groups, weights=rents, minlength=n_groups) / count
+    m2 = np.bincount(groups, weights=(rents - mean[groups]) ** 2, minlength=n_groups)
+    minimum = np.full(n_groups, np.inf)
+    np.minimum.at(minimum, groups, rents)
+    maximum = np.full(n_groups, -np.inf)
+    np.maximum.at(maximum, groups, rents)
+    histograms = np.bincount(
+        groups * RENT_BINS + rent_bins(rents), minlength=n_groups * RENT_BINS
+    ).reshape(n_groups, RENT_BINS)
+
+    # group numbers run from 0, so the first row of each is in group order
+    _, first = np.unique(groups, return_index=True)
+    group_keys = keys.iloc[first].itertuples(index=False, name=None)
+    return {
+        key: RentAggregate(count[g], mean[g], m2[g], minimum[g], maximum[g], histograms[g])
+        for g, key in enumerate(group_keys)
+    }
+
+
+class RentStatistics:
+    """Rent aggregates for every group of every level in LEVELS.
+
+    Build it with from_frame() and fold later records in with update().
+    """
+
+    def __init__(self):
+        self.levels: Dict[Tuple[str, ...], Dict[tuple, RentAggregate]] = {
+            level: {} for level in LEVELS
+        }
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "RentStatistics":
+        """Summarises a rental dataset."""
+        stats = cls()
+        stats.update(df)
+        return stats
+
+    def copy(self) -> "RentStatistics":
+        stats = RentStatistics()
+        stats.levels = {
+            level: {key: aggregate.copy() for key, aggregate in groups.items()}
+            for level, groups in self.levels.items()
+        }
+        return stats
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Folds newly appended rental records into every level."""
+        finest = _aggregate(df)
+        positions = {
+            level: [LEVELS[0].index(column) for column in level] for level in LEVELS
+        }
+        for key, aggregate in finest.items():
+            for level, groups in self.levels.items():
+                level_key = tuple(key[i] for i in positions[level])
+                existing = groups.get(level_key)
+                if existing is None:
+                    groups[level_key] = aggregate.copy()
+                else:
+                    existing.merge(aggregate)
+
+    def lookup(
+        self,
+        flat_type: str,
+        zone: Optional[str] = None,
+        district: Optional[int] = None,
+        month=None,
+    ) -> Optional[RentAggregate]:
+        """Returns the aggregate for a flat type, optionally narrowed to an area and month.
+
+        Args:
+            flat_type (str): Flat type, as in features.FLAT_TYPE.
+            zone (Optional[str]): Zone from map_utils.get_district_and_zone.
+            district (Optional[int]): District from map_utils.get_district_and_zone.
+            month: A rent_approval_date value from the rental dataset.
+
+        Returns:
+            Optional[RentAggregate]: None if no record matches.
+
+        Raises:
+            ValueError: If no level groups by the given combination of fields.
+        """
+        fields = {"flat_type": flat_type, "zone": zone, "district": district, "month": month}
+        level = tuple(name for name in LEVELS[0] if fields[name] is not None)
+        if level not in self.levels:
+            raise ValueError(f"Rent statistics are not kept by {', '.join(level)}")
+        return self.levels[level].get(tuple(fields[name] for name in level))
+
+
+_RENT_STATISTICS = None
+_RENT_STATISTICS_FRAME = None
+
+
+def get_rent_statistics(df: pd.DataFrame) -> RentStatistics:
+    """Returns the cached statistics for ``df``, rebuilding them when a different frame is passed.
+
+    A frame appended to the cached one only folds in the new rows.
+    """
+    global _RENT_STATISTICS, _RENT_STATISTICS_FRAME
+    if _RENT_STATISTICS is None or _RENT_STATISTICS_FRAME is not df:
+        if _RENT_STATISTICS is not None and extends(df, _RENT_STATISTICS_FRAME):
+            # the cached statistics may still be in use, so they are not updated in place
+            stats = _RENT_STATISTICS.copy()
+            stats.update(df.iloc[len(_RENT_STATISTICS_FRAME):])
+        else:
+            stats = RentStatistics.from_frame(df)
+        _RENT_STATISTICS, _RENT_STATISTICS_FRAME = stats, df
+    return _RENT_STATISTICS
@@ -0,0 +1,284 @@
+"""Compact, memory-mapped columnar copy of the rental dataset.
+
+Parsing the rental CSV gives every server process its own pandas copy with
+object-dtype strings, one Python str per cell. The store written here keeps
+each column as a .npy file instead: string columns as small integer category
+codes plus their distinct values and numbers as they were. Coordinates stay
+float64, exactly as parsed from the CSV, since the feature store and the
+local geocoder match blocks by them. Loading memory-maps the files, so it is
+near-instant and all worker processes share one page-cache copy of the data.
+
+Each write goes to a new version directory and is published by atomically
+replacing manifest.json, which names the current version. Running servers
+notice the new manifest and swap to the new version on their next lookup.
+
+Rebuild the store whenever the rental CSV changes:
+
+    python -m utils.rental_store [--rental PATH] [--output DIR]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.resources import RENTAL_PATH, RENTAL_STORE_DIR
+
+MANIFEST = "manifest.json"
+
+# Superseded versions kept on disk for processes that still map them
+KEEP_VERSIONS = 2
+
+logger = logging.getLogger(__name__)
+
+
+def source_version(csv_path: str) -> Optional[list]:
+    """Modification time and size of the CSV a store is converted from."""
+    try:
+        stat = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _codes_dtype(n_categories: int) -> np.dtype:
+    # -1 marks a missing value, so the dtype must hold n_categories - 1 and -1
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _save(path: str, values: np.ndarray) -> None:
+    np.save(path, values)
+
+
+def _new_version(store_dir: str) -> str:
+    version = f"v{time.time_ns()}"
+    os.makedirs(os.path.join(store_dir, version))
+    return version
+
+
+def read_manifest(store_dir: str = RENTAL_STORE_DIR) -> Optional[dict]:
+    """The published manifest of a store, or None if there is no store."""
+    try:
+        with open(os.path.join(store_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _publish(store_dir: str, manifest: dict) -> None:
+    # replacing the manifest switches readers to the new version in one step;
+    # the previous versions stay on disk for processes still mapping them
+    with open(os.path.join(store_dir, MANIFEST + ".tmp"), "w") as f:
+        json.dump(manifest, f)
+    os.replace(os.path.join(store_dir, MANIFEST + ".tmp"), os.path.join(store_dir, MANIFEST))
+
+    older = sorted(
+        name
+        for name in os.listdir(store_dir)
+        if name.startswith("v") and name != manifest["version"]
+        and os.path.isdir(os.path.join(store_dir, name))
+    )
+    for name in older[: max(len(older) - KEEP_VERSIONS, 0)]:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def write_store(df: pd.DataFrame, store_dir: str = RENTAL_STORE_DIR, source: Optional[list] = None) -> None:
+    """Writes ``df`` as a new store version, one .npy file per column, and publishes it.
+
+    Args:
+        df (pd.DataFrame): The rental dataset.
+        store_dir (str): Directory to write the store into.
+        source (Optional[list]): source_version() of the CSV ``df`` was read from.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    version = _new_version(store_dir)
+    columns = []
+    for position, name in enumerate(df.columns):
+        values = df[name]
+        path = os.path.join(store_dir, version, f"{position:03d}")
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            _save(path + ".npy", values.to_numpy())
+            kind = "numeric"
+        else:
+            categorical = values.astype("category").cat
+            categories = categorical.categories.astype(str).to_numpy(dtype=str)
+            codes = categorical.codes.to_numpy().astype(_codes_dtype(len(categories)))
+            _save(path + ".npy", codes)
+            _save(path + ".categories.npy", categories)
+            kind = "categorical"
+        columns.append({"name": name, "file": f"{position:03d}", "kind": kind})
+
+    _publish(
+        store_dir,
+        {"version": version, "columns": columns, "rows": len(df), "source": source},
+    )
+
+
+def append_store(delta: pd.DataFrame, store_dir: str = RENTAL_STORE_DIR, source: Optional[list] = None) -> dict:
+    """Publishes a new store version holding the current rows followed by ``delta``.
+
+    The existing columns are copied as stored, without parsing, and string
+    values not seen before are added after the existing categories so every
+    existing code keeps its meaning. The manifest records the version
+    appended to and its row count, so caches built on that version can be
+    extended with just the new rows.
+
+    Args:
+        delta (pd.DataFrame): New records. Columns missing from it are left empty.
+        store_dir (str): Directory of an existing store.
+        source (Optional[list]): source_version() of the CSV the new rows were appended to.
+
+    Returns:
+        dict: The published manifest.
+
+    Raises:
+        ValueError: If ``delta`` has a column the store does not, or leaves an
+            integer column empty.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        raise ValueError(f"No rental store in {store_dir}")
+    names = [column["name"] for column in manifest["columns"]]
+    unknown = sorted(set(delta.columns) - set(names))
+    if unknown:
+        raise ValueError(f"Columns {unknown} are not in the rental store, expected some of {names}")
+
+    current = os.path.join(store_dir, manifest["version"])
+    version = _new_version(store_dir)
+    for column in manifest["columns"]:
+        old = np.load(os.path.join(current, column["file"] + ".npy"), mmap_mode="r")
+        new = delta[column["name"]] if column["name"] in delta.columns else pd.Series(
+            np.nan, index=delta.index
+        )
+        path = os.path.join(store_dir, version, column["file"])
+        if column["kind"] == "categorical":
+            categories = np.load(os.path.join(current, column["file"] + ".categories.npy"))
+            new = new.astype(object).where(new.notna())
+            strings = new.dropna().astype(str)
+            unseen = pd.unique(strings[~strings.isin(categories)].to_numpy())
+            categories = np.concatenate([categories, np.asarray(unseen, dtype=str)]).astype(str)
+            codes = np.full(len(new), -1, dtype=np.int64)
+            codes[new.notna().to_numpy()] = pd.Index(categories).get_indexer(strings)
+            dtype = _codes_dtype(len(categories))
+            _save(path + ".npy", np.concatenate([old.astype(dtype), codes.astype(dtype)]))
+            _save(path + ".categories.npy", categories)
+        else:
+            if old.dtype.kind in "iu" and new.isna().any():
+                raise ValueError(f"Column {column['name']} is stored as integers but has missing values")
+            _save(path + ".npy", np.concatenate([old, new.to_numpy(dtype=old.dtype)]))
+
+    manifest = {
+        "version": version,
+        "columns": manifest["columns"],
+        "rows": manifest["rows"] + len(delta),
+        "source": source,
+        "base_version": manifest["version"],
+        "base_rows": manifest["rows"],
+        # the CSV as it was before the new rows, see load_rental_frame
+        "base_source": manifest["source"],
+    }
+    _publish(store_dir, manifest)
+    return manifest
+
+
+# Last frame read from each store directory, returned again while its version is current
+_READ_FRAMES = {}
+
+
+def read_store(store_dir: str = RENTAL_STORE_DIR) -> pd.DataFrame:
+    """Memory-maps the published version of a store as a read-only DataFrame.
+
+    String columns come back as pandas categoricals and numbers as in the CSV;
+    comparisons, filters and describe() behave as on the CSV-loaded frame.
+    The frame's attrs carry the store "version" and, for an appended version,
+    the "base_version" and "base_rows" it extends. Reading a version again
+    returns the same frame, so indexes cached for it stay valid.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No rental store in {store_dir}")
+    previous = _READ_FRAMES.get(store_dir)
+    if previous is not None and previous.attrs.get("version") == manifest["version"]:
+        return previous
+    version_dir = os.path.join(store_dir, manifest["version"])
+    data = {}
+    for column in manifest["columns"]:
+        values = np.load(os.path.join(version_dir, column["file"] + ".npy"), mmap_mode="r")
+        if column["kind"] == "categorical":
+            categories = np.load(os.path.join(version_dir, column["file"] + ".categories.npy"))
+            # validate=False keeps the memory-mapped codes instead of copying them
+            values = pd.Categorical.from_codes(
+                values, dtype=pd.CategoricalDtype(pd.Index(categories, dtype=object)), validate=False
+            )
+        data[column["name"]] = values
+    df = pd.DataFrame(data, copy=False)
+    df.attrs = {
+        key: manifest[key] for key in ("version", "base_version", "base_rows") if key in manifest
+    }
+    _READ_FRAMES[store_dir] = df
+    return df
+
+
+def extends(df: pd.DataFrame, previous: pd.DataFrame) -> bool:
+    """Whether ``df`` is a rental store version appended to the one ``previous`` was read from."""
+    base = df.attrs.get("base_version")
+    return (
+        base is not None
+        and base == previous.attrs.get("version")
+        and df.attrs.get("base_rows") == len(previous)
+    )
+
+
+def store_source(store_dir: str = RENTAL_STORE_DIR) -> Optional[list]:
+    """The source_version() recorded in a store, or None if there is no store."""
+    manifest = read_manifest(store_dir)
+    return manifest["source"] if manifest is not None else None
+
+
+def load_rental_frame(csv_path: str = RENTAL_PATH, store_dir: str = RENTAL_STORE_DIR) -> pd.DataFrame:
+    """Loads the rental dataset from the store, or from the CSV if the store is missing or stale.
+
+    An appended store version is also current while the CSV is still as it
+    was before the append: ingestion publishes the store before replacing
+    the CSV.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is not None:
+        current = source_version(csv_path)
+        if current is None or current in (manifest["source"], manifest.get("base_source")):
+            return read_store(store_dir)
+        logger.warning(
+            "Rental store in %s is out of date with %s, "
+            "run `python -m utils.rental_store` to rebuild it",
+            store_dir,
+            csv_path,
+        )
+    return pd.read_csv(csv_path)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rental", default=RENTAL_PATH, help="rental dataset CSV")
+    parser.add_argument("--output", default=RENTAL_STORE_DIR, help="store directory")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.rental)
+    write_store(df, args.output, source_version(args.rental))
+    stored = read_store(args.output)
+    print(
+        f"Stored {len(stored)} rows in {args.output}: "
+        f"{df.memory_usage(deep=True).sum() / 2**20:.1f} MiB in pandas, "
+        f"{stored.memory_usage(deep=True).sum() / 2**20:.1f} MiB as stored"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Process-wide cache of the model, datasets and indexes the app depends on.
+
+Modules stay imported for the life of a server process, while Streamlit
+re-executes the app script on every interaction and for every session. Each
+resource here is loaded once per process, shared by all sessions, and
+reloaded only when one of the files it was built from changes on disk.
+"""
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODEL_PATH = os.environ.get(
+    "HDB_MODEL_PATH", os.path.join(ROOT_DIR, "model", "finalized_model.pkl")
+)
+RENTAL_PATH = os.environ.get(
+    "HDB_RENTAL_PATH",
+    os.path.join(ROOT_DIR, "data", "rental_with_engineered_features_cleaned.csv"),
+)
+# Memory-mapped copy of the rental CSV written by `python -m utils.rental_store`
+RENTAL_STORE_DIR = os.environ.get(
+    "HDB_RENTAL_STORE", os.path.join(ROOT_DIR, "data", "rental_store")
+)
+
+# Seconds between checks of the files' modification times
+DEFAULT_CHECK_INTERVAL = 2.0
+
+
+def _file_version(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileBackedResource:
+    """A value built from files, loaded on first use and rebuilt when they change.
+
+    Args:
+        loader (Callable): Builds the value; called with no arguments.
+        paths (str): Files the value is built from.
+        check_interval (float): Minimum seconds between modification time checks,
+            so hot paths do not stat the files on every call.
+    """
+
+    def __init__(self, loader: Callable, *paths: str, check_interval: float = DEFAULT_CHECK_INTERVAL):
+        self.loader = loader
+        self.paths = paths
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._versions = None
+        self._checked_at = float("-inf")
+        self.loads = 0
+
+    def _current_versions(self) -> tuple:
+        return tuple(_file_version(path) for path in self.paths)
+
+    def get(self):
+        """Returns the value, loading or reloading it if needed."""
+        now = time.monotonic()
+        if self._versions is not None and now - self._checked_at < self.check_interval:
+            return self._value
+
+        with self._lock:
+            versions = self._current_versions()
+            if versions != self._versions:
+                self._value = self.loader()
+                self._versions = versions
+                self.loads += 1
+            self._checked_at = now
+            return self._value
+
+    def invalidate(self) -> None:
+        """Forces the next get() to reload the value."""
+        with self._lock:
+            self._value = None
+            self._versions = None
+
+
+def _load_model():
+    import joblib
+
+    return joblib.load(MODEL_PATH)
+
+
+def _load_rental_frame():
+    # rental_store depends on this module
+    from utils.rental_store import load_rental_frame
+
+    return load_rental_frame(RENTAL_PATH, RENTAL_STORE_DIR)
+
+
+MODEL = FileBackedResource(_load_model, MODEL_PATH)
+RENTAL_FRAME = FileBackedResource(
+    _load_rental_frame, RENTAL_PATH, os.path.join(RENTAL_STORE_DIR, "manifest.json")
+)
+
+
+def get_model():
+    """Returns the finalized rent prediction model."""
+    return MODEL.get()
+
+
+def get_rental_frame():
+    """Returns the rental dataset. Callers share it and must not modify it."""
+    return RENTAL_FRAME.get()
+
+
+def invalidate_all() -> None:
+    """Drops every cached resource so each reloads on next use."""
+    # imported here because these modules depend on this one
+    from utils import facilities, feature_store, map_utils, rent_grid
+
+    for resource in (
+        MODEL,
+        RENTAL_FRAME,
+        facilities.FACILITY_INDEX,
+        feature_store.FEATURE_STORE,
+        map_utils.POSTAL_TABLE,
+        rent_grid.RENT_GRID,
+    ):
+        resource.invalidate()
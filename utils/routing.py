@@ -0,0 +1,159 @@
+"""Pooled, concurrent and memoized fetching of OneMap walking routes"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence, Tuple
+
+from utils import tracing
+
+# ~1 m at Singapore's latitude, close enough to reuse a route
+COORD_DECIMALS = 5
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAXSIZE = 4096
+
+Route = Tuple[float, float, str]
+
+
+def route_key(start_coordinates: str, end_coordinates: str) -> tuple:
+    """Cache key for a route given "lat,lon" start and end strings."""
+    return tuple(
+        round(float(value), COORD_DECIMALS)
+        for coordinates in (start_coordinates, end_coordinates)
+        for value in coordinates.split(",")
+    )
+
+
+class RouteFetcher:
+    """Fetches walking routes over one pooled Session and remembers the results.
+
+    Args:
+        max_workers (int): Number of routes requested at the same time.
+        timeout (float): Seconds to wait for any single route.
+        maxsize (int): Number of routes kept in the memo.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        maxsize: int = DEFAULT_MAXSIZE,
+    ):
+        # imported here so importing map_utils does not pay for requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="route"
+        )
+        self._routes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key: tuple) -> Optional[Route]:
+        with self._lock:
+            route = self._routes.get(key)
+            if route is not None:
+                self._routes.move_to_end(key)
+            return route
+
+    def _remember(self, key: tuple, route: Route) -> None:
+        with self._lock:
+            self._routes[key] = route
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+
+    def fetch(self, url: str, start_coordinates: str, end_coordinates: str, token: str) -> Route:
+        """Fetches one walking route, returning the memoized copy if there is one.
+
+        Returns:
+            Route: The total distance (in meters), total time (in seconds) and route geometry.
+
+        Raises:
+            requests.RequestException: If the request fails or times out.
+        """
+        key = route_key(start_coordinates, end_coordinates)
+        route = self._cached(key)
+        if route is not None:
+            return route
+
+        with tracing.span("onemap.route") as span:
+            req = self.session.get(
+                url,
+                params={
+                    "start": start_coordinates,
+                    "end": end_coordinates,
+                    "routeType": "walk",
+                    "token": token,
+                },
+                timeout=self.timeout,
+            )
+            span.set(status=req.status_code)
+        req.raise_for_status()
+        resultsdict = req.json()
+        route = (
+            resultsdict["route_summary"]["total_distance"],
+            resultsdict["route_summary"]["total_time"],
+            resultsdict["route_geometry"],
+        )
+        self._remember(key, route)
+        return route
+
+    def fetch_many(
+        self,
+        url: str,
+        pairs: Sequence[Tuple[str, str]],
+        token: str,
+        timeout: Optional[float] = None,
+        logger=None,
+    ) -> List[Optional[Route]]:
+        """Fetches several walking routes concurrently.
+
+        Args:
+            url (str): The routing service endpoint.
+            pairs (Sequence[Tuple[str, str]]): (start, end) "lat,lon" coordinate strings.
+            token (str): The API token for accessing the routing service.
+            timeout (Optional[float]): Seconds to wait for the whole batch. Defaults to
+                the per-route timeout.
+            logger (Optional): Logger object for logging failed routes. Defaults to None.
+
+        Returns:
+            List[Optional[Route]]: One entry per pair, None where the route failed or
+            did not arrive in time.
+        """
+        futures = [
+            self._executor.submit(self.fetch, url, start, end, token) for start, end in pairs
+        ]
+        wait(futures, timeout=timeout if timeout is not None else self.timeout)
+
+        routes = []
+        for (start, end), future in zip(pairs, futures):
+            if future.done() and future.exception() is None:
+                routes.append(future.result())
+                continue
+            if logger is not None:
+                reason = future.exception() if future.done() else "timed out"
+                logger.info(f"Route from {start} to {end} unavailable: {reason}")
+            routes.append(None)
+        return routes
+
+    def clear(self) -> None:
+        """Forgets every memoized route."""
+        with self._lock:
+            self._routes.clear()
+
+
+_ROUTE_FETCHER = None
+
+
+def get_route_fetcher() -> RouteFetcher:
+    """Returns the process-wide route fetcher, creating it on first use."""
+    global _ROUTE_FETCHER
+    if _ROUTE_FETCHER is None:
+        _ROUTE_FETCHER = RouteFetcher()
+    return _ROUTE_FETCHER
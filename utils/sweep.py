@@ -0,0 +1,110 @@
+"""What-if rent predictions for every flat type and rental start at a location.
+
+Changing the flat type or rental start on the advice page used to rebuild
+the features and call model.predict for a single row each time. A sweep
+scores all len(FLAT_TYPE) x len(rental starts) combinations for a location
+in one batched predict and caches the table, so switching options is a
+lookup and the comparison table comes for free.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils import tracing
+from utils.features import FLAT_TYPE, build_sweep_input, months_since_data_start
+
+# ~1 m at Singapore's latitude, the same location for any purpose here
+COORD_DECIMALS = 5
+DEFAULT_MAXSIZE = 1024
+
+
+class SweepCache:
+    """LRU cache of sweep tables keyed by rounded location and rental start months.
+
+    The month index is part of the key, so entries computed in an earlier
+    month are not reused. The cache empties itself when a different model
+    object is passed, e.g. after the model file is reloaded.
+
+    Args:
+        maxsize (int): Number of locations kept.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._tables = OrderedDict()
+        self._model = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def predict(
+        self,
+        model,
+        lat: float,
+        lon: float,
+        future_rental_dates: Sequence[int],
+        now: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        """Predicted rents for every flat type and rental start at a location.
+
+        Args:
+            model: The rent prediction model.
+            lat (float): Latitude of the rental location.
+            lon (float): Longitude of the rental location.
+            future_rental_dates (Sequence[int]): Months from now each rental could start.
+            now (Optional[datetime]): Reference date. Defaults to the current date.
+
+        Returns:
+            pd.DataFrame: Predicted monthly rent indexed by FLAT_TYPE, one column per
+            entry of ``future_rental_dates``. Callers share it and must not modify it.
+        """
+        current_date = now if now is not None else datetime.now()
+        horizons = tuple(int(h) for h in future_rental_dates)
+        key = (
+            round(float(lat), COORD_DECIMALS),
+            round(float(lon), COORD_DECIMALS),
+            horizons,
+            tuple(months_since_data_start(h, current_date) for h in horizons),
+        )
+        with self._lock:
+            if model is not self._model:
+                self._tables.clear()
+                self._model = model
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+
+        with tracing.span("sweep.predict", rows=len(FLAT_TYPE) * len(horizons)):
+            predictions = model.predict(build_sweep_input(lat, lon, horizons, current_date))
+        table = pd.DataFrame(
+            np.asarray(predictions, dtype=float).reshape(len(FLAT_TYPE), len(horizons)),
+            index=pd.Index(FLAT_TYPE, name="flat_type"),
+            columns=pd.Index(horizons, name="months_ahead"),
+        )
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        return table
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables.clear()
+
+
+_SWEEP_CACHE = None
+
+
+def get_sweep_cache() -> SweepCache:
+    """Returns the process-wide sweep cache, creating it on first use."""
+    global _SWEEP_CACHE
+    if _SWEEP_CACHE is None:
+        _SWEEP_CACHE = SweepCache()
+    return _SWEEP_CACHE
@@ -0,0 +1,182 @@
+"""Lightweight timed spans with structured logs and in-process latency histograms.
+
+Tracing is off unless the HDB_TRACE environment variable is set (to anything
+but "", "0" or "false"). When off, span() hands back a shared no-op context
+manager, so instrumented code pays one function call per span.
+
+    with tracing.span("onemap.search", query=location):
+        ...
+
+Every finished span is logged as one JSON line on the "hdb.tracing" logger
+and added to a per-name histogram, which snapshot() returns as a dict and
+prometheus_text() renders for scraping. The span logs are at INFO, which
+logging drops by default; processes that do not set up logging themselves,
+like the Streamlit app, call configure_logging() to see them.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("HDB_TRACE", "").lower() not in ("", "0", "false")
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+logger = logging.getLogger("hdb.tracing")
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in milliseconds."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float) -> None:
+        self.bucket_counts[bisect.bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if self.count == 0:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS_MS, self.bucket_counts):
+            seen += count
+            if seen >= target:
+                return float(bound)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max_ms,
+        }
+
+
+_histograms = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _record(name: str, duration_ms: float) -> None:
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(duration_ms)
+
+
+class _Span:
+    __slots__ = ("name", "attributes", "start", "parent")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        _local.stack.pop()
+        _record(self.name, duration_ms)
+        record = {"span": self.name, "duration_ms": round(duration_ms, 3)}
+        if self.parent is not None:
+            record["parent"] = self.parent
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.attributes)
+        logger.info(json.dumps(record, default=str))
+        return False
+
+    def set(self, **attributes) -> None:
+        """Adds attributes to the span's log record."""
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """Returns a context manager timing the enclosed block as ``name``."""
+    if not ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, attributes)
+
+
+def configure_logging() -> None:
+    """Makes the span logs visible: INFO level, on stderr unless logging is already set up."""
+    logger.setLevel(logging.INFO)
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+
+
+def enable(enabled: bool = True) -> None:
+    """Turns tracing on or off at runtime, setting up the span logs when turned on."""
+    global ENABLED
+    ENABLED = enabled
+    if enabled:
+        configure_logging()
+
+
+def reset() -> None:
+    """Clears all histograms."""
+    with _lock:
+        _histograms.clear()
+
+
+def snapshot() -> dict:
+    """Returns a summary of every histogram, keyed by span name."""
+    with _lock:
+        return {name: histogram.to_dict() for name, histogram in sorted(_histograms.items())}
+
+
+def prometheus_text() -> str:
+    """Renders the histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP hdb_span_duration_ms Latency of traced spans in milliseconds.",
+        "# TYPE hdb_span_duration_ms histogram",
+    ]
+    with _lock:
+        for name, histogram in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS_MS + ("+Inf",), histogram.bucket_counts):
+                cumulative += count
+                lines.append(
+                    f'hdb_span_duration_ms_bucket{{span="{name}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'hdb_span_duration_ms_sum{{span="{name}"}} {histogram.sum_ms}')
+            lines.append(f'hdb_span_duration_ms_count{{span="{name}"}} {histogram.count}')
+    return "\n".join(lines) + "\n"